@@ -0,0 +1,93 @@
+"""
+Compare git backends on concurrent clone and push of a local repository.
+
+Each backend exports the repository by the same steps as :class:`exporter.logic.TaskExportProject`,
+repositories are closed only after all exports finished, like with the tasks of a batch.
+Open file descriptors and child processes are counted at that moment, which works on Linux only.
+
+Usage::
+
+    $ python benchmarks/git_backends.py [CONCURRENCY] [COMMITS]
+"""
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+
+from exporter.gitbackend import GIT_BACKENDS
+
+
+def git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.name=Benchmark', '-c', 'user.email=benchmark@example.com'] + list(args),
+                   cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def make_origin(path, commits):
+    path.mkdir()
+    git(path, 'init', '-q')
+    for i in range(commits):
+        (path / f'file_{i % 10}.txt').write_text(f'version {i}\n' * 100)
+        git(path, 'add', '.')
+        git(path, 'commit', '-q', '-m', f'commit {i}')
+    return path
+
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+
+def child_processes():
+    """Count running and zombie children started by any thread"""
+    return sum(len(children.read_text().split()) for children in pathlib.Path('/proc/self/task').glob('*/children'))
+
+
+def export(backend, origin, base_dir, i):
+    target = base_dir / f'target_{i}.git'
+    git(base_dir, 'init', '-q', '--bare', str(target))
+    repo = backend.clone(str(origin), base_dir / f'clone_{i}')
+    backend.count_objects(repo)
+    if backend.commit_count(repo) >= 1:
+        backend.push(repo, f'github_{i}', str(target))
+    return repo
+
+
+def measure(backend, origin, base_dir, concurrency):
+    """
+    Return wall time, peak of Python memory and open file descriptors and child processes left by the exports
+    before closing them
+    """
+    base_dir.mkdir()
+    fds = open_fds()
+    tracemalloc.start()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        repos = list(executor.map(lambda i: export(backend, origin, base_dir, i), range(concurrency)))
+    duration = time.monotonic() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    left_fds, left_children = open_fds() - fds, child_processes()
+    for repo in repos:
+        backend.close(repo)
+    return duration, peak, left_fds, left_children
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    commits = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        origin = make_origin(tmp / 'origin', commits)
+        print(f'{concurrency} concurrent exports of repository with {commits} commits')
+        for name, backend in GIT_BACKENDS.items():
+            duration, peak, fds, children = measure(backend, origin, tmp / name, concurrency)
+            print(f'{name:10}: {duration:6.2f} s, peak memory {peak / 1024:8.0f} KiB, '
+                  f'open file descriptors {fds:4}, child processes {children:4}')
+
+
+if __name__ == '__main__':
+    main()
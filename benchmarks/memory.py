@@ -0,0 +1,65 @@
+"""
+Measure memory retained per exported project.
+
+Projects are streamed through the same code which :class:`exporter.logic.Exporter` uses to prepare tasks.
+Tasks are released the same way as after a finished batch, but nothing is exported.
+
+A released task still takes about 220 B, one slot per attribute needed for the report and rollback.
+Tasks which created a GitHub repository keep also their GitHub client (about 90 B) to delete it in rollback,
+no repository is created here, so such tasks retain that much more than measured.
+
+Usage::
+
+    $ python benchmarks/memory.py [PROJECT_COUNT] [BATCH_SIZE]
+"""
+import gc
+import io
+import sys
+import tracemalloc
+
+import enlighten  # noqa: F401  imported lazily by the first progress bar, its import is not per project
+
+from exporter.config import ProjectLoader, ProjectNormalizer
+from exporter.logic import Exporter, GitHubClient, GitLabClient
+
+
+def projects_file(count):
+    return io.StringIO(''.join(f'gitlab_project_{i} -> github_project_{i} private\n' for i in range(count)))
+
+
+def measure(count, batch_size, release):
+    """Return bytes retained per project after all batches have been prepared, including project names"""
+    source = ProjectLoader.load(projects_file(count))
+    projects = ProjectNormalizer.iter_normalized(source, 'private')
+    gitlab, github = GitLabClient('XXX'), GitHubClient('YYY')
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    runned_tasks = []
+    for tasks in Exporter._prepare_batched_tasks(gitlab=gitlab, github=github, projects=projects, tmp_dir='tmp',
+                                                 conflict_policy='skip', debug=False, suppress_exceptions=True,
+                                                 batch_size=batch_size):
+        runned_tasks += tasks
+        for task in tasks:
+            if release:
+                task.release()
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    names = sum(sys.getsizeof(f'gitlab_project_{i}') + sys.getsizeof(f'github_project_{i}')
+                for i in range(count)) / count
+    print(f'{count} projects, batch size {batch_size}, project names take {names:.0f} B/project')
+    for release in (True, False):
+        retained = measure(count, batch_size, release=release)
+        print(f'finished tasks, {"released" if release else "not released":12}: '
+              f'{retained:8.0f} B/project, overhead without names {retained - names:8.0f} B/project')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+Simulate exports of many projects to see how scheduling, progress bars and reporting scale.
+
+The real :class:`exporter.logic.Exporter` runs batches of real tasks, their progress bars are rendered by enlighten
+to a terminal which discards the output and results are printed by :class:`exporter.logic.ExporterPrinter`.
+GitHub and GitLab clients and git operations are fakes which only sleep for a random latency and fail at given rate.
+
+For each project count it reports
+
+* count of exported projects, the rest failed by simulated errors
+* scheduler overhead, wall time minus the time the slowest fake operations of each batch slept
+* memory allocated by Python at the peak and retained by finished tasks when results are printed
+* peak and mean count of threads
+* time spent rendering progress bars or panel and printing results
+
+Usage::
+
+    $ python benchmarks/simulate.py --projects 1000 10000 50000 --batch-size 50 --distribution lognormal \
+          --progress panel
+"""
+import argparse
+import contextlib
+import gc
+import io
+import math
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import enlighten
+
+from exporter.config import ProjectLoader, ProjectNormalizer
+from exporter.exceptions import GitCommandFailedError
+from exporter.logic import Exporter, ExporterPrinter, TaskProgressBarPool, TaskStatus
+from exporter.progress import ProgressPanel
+
+DISTRIBUTIONS = ('fixed', 'exponential', 'lognormal')
+
+
+class Latency:
+    """Random latency of fake operations with given mean in seconds"""
+
+    SIGMA = 1.0  # of lognormal distribution, most operations are fast with a long tail of slow ones
+
+    def __init__(self, mean, distribution, rng):
+        self.mean = mean
+        self.distribution = distribution
+        self.rng = rng
+
+    def sample(self):
+        if self.mean <= 0 or self.distribution == 'fixed':
+            return max(self.mean, 0.0)
+        if self.distribution == 'exponential':
+            return self.rng.expovariate(1 / self.mean)
+        return self.rng.lognormvariate(math.log(self.mean) - self.SIGMA ** 2 / 2, self.SIGMA)
+
+
+class Simulation:
+    """Latencies and failures of fake operations and time slept by each thread of the running batch"""
+
+    def __init__(self, api_latency, git_latency, failure_rate, rng):
+        self.api_latency = api_latency
+        self.git_latency = git_latency
+        self.failure_rate = failure_rate
+        self.rng = rng
+        self.slept = {}  # thread ident -> seconds slept by fake operations
+        self._lock = threading.Lock()
+
+    def operation(self, latency, error):
+        """Sleep for sampled latency and raise ``error`` at failure rate"""
+        with self._lock:  # random.Random is not safe to share between threads
+            duration = latency.sample()
+            failed = self.rng.random() < self.failure_rate
+        time.sleep(duration)
+        ident = threading.get_ident()
+        self.slept[ident] = self.slept.get(ident, 0.0) + duration
+        if failed:
+            raise error
+
+    def api(self):
+        self.operation(self.api_latency, RuntimeError('simulated API error'))
+
+    def git(self, command):
+        self.operation(self.git_latency, GitCommandFailedError(command, 128, 'simulated git error'))
+
+
+class FakeGitLab:
+    token = 'gitlab-token'
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+
+    def clone(self):
+        return self
+
+    def search_owned_projects(self, search):
+        self.simulation.api()
+        return [{'path_with_namespace': search, 'http_url_to_repo': f'https://gitlab.example.com/{search}.git',
+                 'owner': {'username': 'owner'}, 'statistics': {'repository_size': 1024, 'lfs_objects_size': 0},
+                 'lfs_enabled': False}]
+
+
+class FakeGitHub:
+    token = 'github-token'
+    login = 'owner'
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+
+    def clone(self):
+        return self
+
+    def close(self):
+        pass
+
+    def repo_exists(self, repo_name, owner):
+        self.simulation.api()
+        return False
+
+    def create_repo(self, repo_name, data=None, is_private=None):
+        self.simulation.api()
+
+    def delete_repo(self, repo_name, owner):
+        self.simulation.api()
+
+
+class FakeGitBackend:
+    NAME = 'simulated'
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+
+    def clone(self, url, path, progress=None):
+        self.simulation.git('clone')
+        return path
+
+    def lfs_fetch(self, repo, progress=None):
+        self.simulation.git('lfs')
+
+    def push(self, repo, remote_name, url, progress=None, update=False):
+        self.simulation.git('push')
+
+    def git_dir(self, repo):
+        return repo
+
+    def count_objects(self, repo):
+        return 'size: 0\nsize-pack: 1'
+
+    def commit_count(self, repo):
+        return 1
+
+    def close(self, repo):
+        pass
+
+
+class DiscardingTerminal(io.TextIOBase):
+    """Terminal for enlighten, rendering goes through all the code but the output is dropped"""
+
+    def write(self, s):
+        return len(s)
+
+    def isatty(self):
+        return True
+
+
+class NullLogger:
+    """Logger of results which drops them, the real one writes a log file"""
+
+    def info(self, msg):
+        pass
+
+
+class CountingReportSink:
+    """Report sink counting exported projects, so failing fakes are noticed"""
+
+    def __init__(self):
+        self.exported = 0
+
+    def write(self, task, event='run'):
+        if TaskStatus.SUCCESS in task.status:
+            self.exported += 1
+
+    def write_not_runned(self, project):
+        pass
+
+    def close(self):
+        pass
+
+
+class BatchRecorder:
+    """Fixed batch size reporting duration of each batch, in place of :class:`exporter.adaptive.AdaptiveConcurrency`"""
+
+    def __init__(self, batch_size, simulation):
+        self.batch_size = batch_size
+        self.simulation = simulation
+        self.duration = 0.0  # seconds of all batches
+        self.ideal = 0.0  # seconds of all batches if there was no overhead, the slowest task decides
+
+    def next_size(self):
+        return self.batch_size
+
+    def observe(self, tasks, duration):
+        self.duration += duration
+        self.ideal += max(self.simulation.slept.values(), default=0.0)
+        self.simulation.slept.clear()
+
+
+class Sampler:
+    """Sample count of threads in the background"""
+
+    INTERVAL = 0.01
+
+    def __init__(self):
+        self.threads = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.INTERVAL):
+            self.threads.append(threading.active_count() - 1)  # without the sampler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextlib.contextmanager
+def timed(cls, name, totals):
+    """Add time spent in method ``name`` of ``cls`` to ``totals[name]`` while in context"""
+    method = getattr(cls, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            totals[name] += time.perf_counter() - start
+
+    setattr(cls, name, wrapper)
+    try:
+        yield
+    finally:
+        setattr(cls, name, method)
+
+
+@contextlib.contextmanager
+def retained_memory(result):
+    """Save memory traced when results are printed, all finished tasks are alive at that moment"""
+    report = ExporterPrinter.report
+
+    def wrapper(self, *args, **kwargs):
+        gc.collect()
+        result['retained'] = tracemalloc.get_traced_memory()[0]
+        return report(self, *args, **kwargs)
+
+    ExporterPrinter.report = wrapper
+    try:
+        yield
+    finally:
+        ExporterPrinter.report = report
+
+
+def synthetic_projects(count):
+    source = io.StringIO(''.join(f'group/project_{i} -> project_{i} private\n' for i in range(count)))
+    return ProjectNormalizer.iter_normalized(ProjectLoader.load(source), 'private')
+
+
+def simulate(count, args):
+    """Export ``count`` synthetic projects and return dictionary of measurements"""
+    rng = random.Random(args.seed)
+    simulation = Simulation(Latency(args.api_latency, args.distribution, rng),
+                            Latency(args.git_latency, args.distribution, rng), args.failure_rate, rng)
+    report_sink = CountingReportSink()
+    recorder = BatchRecorder(args.batch_size, simulation)
+    totals = {'refresh': 0.0, 'report': 0.0}
+    result = {}
+    get_manager = enlighten.get_manager
+    enlighten.get_manager = lambda **kwargs: get_manager(stream=DiscardingTerminal(), **kwargs)
+    try:
+        exporter = Exporter(gitlab=FakeGitLab(simulation), github=FakeGitHub(simulation), logger=NullLogger(),
+                            debug=False, report_sink=report_sink, git_backend=FakeGitBackend(simulation),
+                            progress=ProgressPanel(total=count) if args.progress == 'panel' else None)
+        with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull), timed(TaskProgressBarPool, 'refresh', totals), \
+                timed(ProgressPanel, 'refresh', totals), timed(ExporterPrinter, 'report', totals), \
+                retained_memory(result):
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            start = time.monotonic()
+            with Sampler() as sampler:
+                exporter.run(projects=synthetic_projects(count), conflict_policy='skip',
+                             tmp_dir=os.path.join(tmp_dir, 'export'), task_timeout=30.0,
+                             batch_size=args.batch_size, dry_run=False, concurrency=recorder)
+            wall = time.monotonic() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        enlighten.get_manager = get_manager
+    return {
+        'exported': report_sink.exported,
+        'wall': wall,
+        'overhead': wall - recorder.ideal,
+        'batch_overhead': recorder.duration - recorder.ideal,
+        'peak_memory': peak - before,
+        'retained_memory': result.get('retained', before) - before,
+        'peak_threads': max(sampler.threads, default=0),
+        'mean_threads': statistics.mean(sampler.threads) if sampler.threads else 0,
+        'render': totals['refresh'],
+        'report': totals['report'],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--projects', type=int, nargs='+', default=[1000, 5000, 20000],
+                        help='project counts to simulate')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='lognormal',
+                        help='distribution of latencies of fake operations')
+    parser.add_argument('--api-latency', type=float, default=0.002, help='mean seconds of fake API request')
+    parser.add_argument('--git-latency', type=float, default=0.01, help='mean seconds of fake git command')
+    parser.add_argument('--failure-rate', type=float, default=0.001, help='probability that fake operation fails')
+    parser.add_argument('--progress', choices=('bars', 'panel'), default='bars',
+                        help='progress bar of each task or one panel of all tasks')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f'{args.progress} progress, batch size {args.batch_size}, {args.distribution} latencies: '
+          f'API {args.api_latency * 1000:.1f} ms, git {args.git_latency * 1000:.1f} ms, failure rate {args.failure_rate}')
+    print(f'{"projects":>9} {"exported":>9} {"wall s":>8} {"overhead ms/project":>20} {"in batches":>11} '
+          f'{"peak KiB":>9} {"retained B/project":>19} {"threads peak/mean":>18} {"render s":>9} {"report s":>9}')
+    for count in args.projects:
+        r = simulate(count, args)
+        print(f'{count:9} {r["exported"]:9} {r["wall"]:8.2f} {r["overhead"] / count * 1000:20.3f} '
+              f'{r["batch_overhead"] / count * 1000:11.3f} {r["peak_memory"] / 1024:9.0f} '
+              f'{r["retained_memory"] / count:19.0f} {r["peak_threads"]:>8}/{r["mean_threads"]:<9.1f} '
+              f'{r["render"]:9.2f} {r["report"]:9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Compare throughput of exports of small repositories with clones on disk and in memory.
+
+Each export clones a local repository and pushes it to a bare repository by the same steps as
+:class:`exporter.logic.TaskExportProject` and removes the clone. Origin and target repositories are kept in the
+system temporary directory, only clones are placed to the measured directory. With memory placement each clone
+is placed by :class:`exporter.staging.MemoryStaging`, clones which do not fit to the budget go to the disk
+directory, so the count of spilled clones is reported too.
+
+Usage::
+
+    $ python benchmarks/staging.py --disk-dir tmp --memory-dir /dev/shm --repositories 200 --concurrency 10
+"""
+import argparse
+import pathlib
+import shutil
+import subprocess
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from exporter.gitbackend import GIT_BACKENDS
+from exporter.staging import DISK_STAGING, MemoryStaging
+
+
+def git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.name=Benchmark', '-c', 'user.email=benchmark@example.com'] + list(args),
+                   cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def make_origin(path, commits, files):
+    """Make repository with many small files, checkout of their working tree dominates the clone"""
+    path.mkdir()
+    git(path, 'init', '-q')
+    for i in range(commits):
+        for j in range(files):
+            (path / f'file_{j}.txt').write_text(f'version {i} of file {j}\n' * 20)
+        git(path, 'add', '.')
+        git(path, 'commit', '-q', '-m', f'commit {i}')
+    return path
+
+
+def repository_size(path):
+    return sum(f.stat().st_size for f in (path / '.git').rglob('*') if f.is_file())
+
+
+def export(backend, staging, origin, size, disk_dir, targets, i):
+    """Export origin like one task and return whether its clone was placed in memory"""
+    directory, reserved = staging.place(size)
+    path = (directory or disk_dir) / f'clone_{i}'
+    try:
+        repo = backend.clone(str(origin), path)
+        backend.count_objects(repo)
+        backend.push(repo, f'github_{i}', str(targets / f'target_{i}.git'))
+        backend.close(repo)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+        staging.release(reserved)
+    return directory is not None
+
+
+def measure(backend, staging, origin, disk_dir, targets, args):
+    """Return repositories exported per second and count of them placed in memory"""
+    size = repository_size(origin)
+    for i in range(args.repositories):
+        git(targets, 'init', '-q', '--bare', f'target_{i}.git')
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        placed = list(executor.map(lambda i: export(backend, staging, origin, size, disk_dir, targets, i),
+                                   range(args.repositories)))
+    duration = time.monotonic() - start
+    shutil.rmtree(targets)
+    targets.mkdir()
+    return args.repositories / duration, sum(placed)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--disk-dir', default='tmp', help='directory on disk used as --tmp-dir of exports')
+    parser.add_argument('--memory-dir', default='/dev/shm', help='memory backed directory')
+    parser.add_argument('--memory-budget', type=int, default=512, help='MiB of memory used by clones at once')
+    parser.add_argument('--repositories', type=int, default=200, help='count of exported repositories')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--commits', type=int, default=10)
+    parser.add_argument('--files', type=int, default=200, help='count of files in the working tree')
+    parser.add_argument('--git-backend', choices=list(GIT_BACKENDS), default='subprocess')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    backend = GIT_BACKENDS[args.git_backend]
+    pathlib.Path(args.disk_dir).mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory(dir=args.disk_dir) as disk_dir:
+        tmp, disk_dir = pathlib.Path(tmp), pathlib.Path(disk_dir)
+        origin = make_origin(tmp / 'origin', args.commits, args.files)
+        targets = tmp / 'targets'
+        targets.mkdir()
+        size = repository_size(origin)
+        print(f'{args.repositories} exports of repository of {size / 1024:.0f} KiB with {args.files} files, '
+              f'concurrency {args.concurrency}, {args.git_backend} backend')
+        rate, _ = measure(backend, DISK_STAGING, origin, disk_dir, targets, args)
+        print(f'disk   {args.disk_dir:>12}: {rate:8.1f} repos/s')
+        staging = MemoryStaging(args.memory_dir, threshold=size, budget=args.memory_budget * 1024 * 1024)
+        try:
+            rate, in_memory = measure(backend, staging, origin, disk_dir, targets, args)
+        finally:
+            staging.close()
+        print(f'memory {args.memory_dir:>12}: {rate:8.1f} repos/s, {args.repositories - in_memory} spilled to disk')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import logging
+import re
+import statistics
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+GIT_OVERLOAD = re.compile(r'returned error: (?:429|50[0234])\b')  # HTTP errors reported by git
+
+
+def overloaded(r):
+    """Return true if response tells that the server is overloaded or the client makes too many requests"""
+    return r.status_code in OVERLOAD_STATUSES or (
+        r.status_code == 403 and (r.headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in r.headers))
+
+
+class OverloadCounter:
+    """Count of responses of all HTTP sessions telling that the server is overloaded, see :func:`overloaded`"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, r, *args, **kwargs):
+        """Response hook of :class:`requests.Session`"""
+        if overloaded(r):
+            with self._lock:
+                self.count += 1
+        return r
+
+
+OVERLOADS = OverloadCounter()
+
+
+class AdaptiveConcurrency:
+    """
+    Count of simultaneously running exports adapted after each batch by additive increase and multiplicative
+    decrease.
+
+    Concurrency starts at :attr:`minimum` and grows by :attr:`STEP` while throughput of the batches keeps improving.
+    It is multiplied by :attr:`BACKOFF` when servers answered that they are overloaded during the batch
+    (HTTP 429, 5xx or GitHub secondary rate limit, seen by API clients or git) or when the median duration
+    of API stages rose :attr:`LATENCY_TOLERANCE` times above the lowest median seen. It never leaves
+    :attr:`minimum` and :attr:`maximum`.
+    """
+
+    STEP = 1
+    BACKOFF = 0.5
+    LATENCY_TOLERANCE = 2.0
+    MIN_LATENCY_RISE = 0.5  # seconds, smaller rise of latency is considered noise
+    API_STAGES = ('resolve', 'create')  # stages whose duration does not depend on repository size
+
+    def __init__(self, minimum, maximum, overloads=OVERLOADS):
+        """
+        :param minimum: lowest and initial concurrency
+        :param maximum: highest concurrency
+        :param overloads: :class:`OverloadCounter` of API responses
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.overloads = overloads
+        self.size = minimum
+        self.history = []  # (seconds since start, concurrency, bytes per second) of finished batches
+        self._start = time.monotonic()
+        self._seen_overloads = overloads.count
+        self._throughput = None  # bytes per second of the previous batch
+        self._baseline_latency = None
+
+    def next_size(self):
+        """Return size of the next batch"""
+        return self.size
+
+    def observe(self, tasks, duration):
+        """
+        Adapt concurrency to results of finished batch
+
+        :param tasks: finished :class:`exporter.logic.TaskExportProject` of the batch, not released yet
+        :param duration: seconds the batch took
+        """
+        throughput = sum(task.size for task in tasks) / max(duration, 1e-6)
+        overloads = self.overloads.count - self._seen_overloads
+        self._seen_overloads = self.overloads.count
+        overloads += sum(1 for task in tasks if self._git_overloaded(task))
+        latency = self._latency(tasks)
+
+        previous = self.size
+        if overloads:
+            reason = f'{overloads} overloaded responses'
+            self.size = max(self.minimum, int(self.size * self.BACKOFF))
+        elif self._latency_rose(latency):
+            reason = f'API latency rose to {latency:.2f} s from {self._baseline_latency:.2f} s'
+            self.size = max(self.minimum, int(self.size * self.BACKOFF))
+        elif self._throughput is None or throughput > self._throughput:
+            reason = 'throughput improved'
+            self.size = min(self.maximum, self.size + self.STEP)
+        else:
+            reason = 'throughput did not improve'
+        if latency is not None:
+            self._baseline_latency = min(latency, self._baseline_latency or latency)
+        self._throughput = throughput
+        self.history.append((time.monotonic() - self._start, previous, throughput))
+        log.info('Concurrency %d -> %d after batch of %d tasks in %.1f s, %.0f B/s: %s',
+                 previous, self.size, len(tasks), duration, throughput, reason)
+
+    @staticmethod
+    def _git_overloaded(task):
+        exception = task.exception
+        return exception is not None and GIT_OVERLOAD.search(str(exception)) is not None
+
+    def _latency(self, tasks):
+        durations = [d for task in tasks for stage, d in task.durations.items() if stage in self.API_STAGES]
+        return statistics.median(durations) if durations else None
+
+    def _latency_rose(self, latency):
+        baseline = self._baseline_latency
+        return latency is not None and baseline is not None and latency > baseline * self.LATENCY_TOLERANCE \
+            and latency - baseline > self.MIN_LATENCY_RISE
@@ -0,0 +1,288 @@
+import base64
+import binascii
+import contextlib
+import logging
+import secrets
+import socket
+import socketserver
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+from .helpers import NULL_BUDGET, TokenBucket, format_bytes
+
+log = logging.getLogger(__name__)
+
+
+class Transfer:
+    """Bytes relayed by :class:`ThrottlingProxy` for one git command, with their current rate"""
+
+    INTERVAL = 1.0  # seconds between reports of the rate
+
+    def __init__(self, key, url, listener=None):
+        """
+        :param key: user name in Proxy-Authorization header of connections of the transfer
+        :param url: proxy URL which git uses for the transfer
+        :param listener: function called with bytes per second once per :attr:`INTERVAL` while data flows
+        """
+        self.key = key
+        self.url = url
+        self.listener = listener
+        self.downloaded = 0
+        self.uploaded = 0
+        self.rate = 0.0
+        self._window = 0
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def count(self, downloaded=0, uploaded=0):
+        with self._lock:
+            self.downloaded += downloaded
+            self.uploaded += uploaded
+            self._window += downloaded + uploaded
+            now = time.monotonic()
+            if now - self._window_start < self.INTERVAL:
+                return
+            self.rate = self._window / (now - self._window_start)
+            self._window, self._window_start = 0, now
+            rate = self.rate
+        if self.listener is not None:
+            self.listener(rate)
+
+
+class ProxyHandler(socketserver.BaseRequestHandler):
+    """
+    Relay one connection of git to the requested server.
+
+    ``CONNECT`` requests are tunnelled. Other requests are forwarded without proxy headers and the server is asked
+    to close the connection after the response, so every request of the client comes through :func:`handle`.
+    Data in both directions waits for the download and upload buckets of the server.
+    """
+
+    CHUNK = 16 * 1024
+    MAX_HEAD = 64 * 1024
+
+    def handle(self):
+        client = self.request
+        head, rest = self._read_head(client)
+        if head is None:
+            return
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            self._respond(400, 'Bad Request')
+            return
+        transfer = self.server.transfers.get(self._key(lines))
+        if transfer is None:
+            self._respond(407, 'Proxy Authentication Required')
+            return
+        try:
+            if method == 'CONNECT':
+                host, port = target.rsplit(':', 1)
+                upstream = socket.create_connection((host.strip('[]'), int(port)))
+                client.sendall(b'HTTP/1.1 200 Connection established\r\n\r\n')
+            else:
+                url = urlsplit(target)
+                upstream = socket.create_connection((url.hostname, url.port or 80))
+                rest = self._forwarded_head(method, url, version, lines) + rest
+        except (OSError, ValueError) as e:
+            log.debug('%s: connection to %s failed: %s', transfer.key, target, e)
+            self._respond(502, 'Bad Gateway')
+            return
+        with upstream:
+            self._relay(client, upstream, rest, transfer)
+
+    def _read_head(self, client):
+        """Return head of the request and data received after it, ``None`` head if there is no valid head"""
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = client.recv(self.CHUNK)
+            if not chunk or len(data) > self.MAX_HEAD:
+                return None, b''
+            data += chunk
+        head, rest = data.split(b'\r\n\r\n', 1)
+        return head + b'\r\n\r\n', rest
+
+    @staticmethod
+    def _forwarded_head(method, url, version, lines):
+        """Return head of request sent to the server, with path instead of full URL and without proxy headers"""
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        headers = [line for line in lines[1:] if line and line.partition(':')[0].strip().lower() not in (
+            'proxy-authorization', 'proxy-connection', 'connection', 'keep-alive')]
+        return '\r\n'.join([f'{method} {path} {version}'] + headers + ['Connection: close', '', '']).encode('latin-1')
+
+    @staticmethod
+    def _key(lines):
+        """Return user name of basic Proxy-Authorization header"""
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() != 'proxy-authorization':
+                continue
+            scheme, _, credentials = value.strip().partition(' ')
+            if scheme.lower() != 'basic':
+                return None
+            try:
+                return base64.b64decode(credentials).decode().partition(':')[0]
+            except (binascii.Error, UnicodeDecodeError):
+                return None
+        return None
+
+    def _respond(self, code, reason):
+        authenticate = 'Proxy-Authenticate: Basic realm="exporter"\r\n' if code == 407 else ''
+        self.request.sendall(f'HTTP/1.1 {code} {reason}\r\n{authenticate}Content-Length: 0\r\n'
+                             f'Connection: close\r\n\r\n'.encode())
+
+    def _relay(self, client, upstream, initial, transfer):
+        server = self.server
+        if initial:
+            server.upload.acquire(len(initial))
+            transfer.count(uploaded=len(initial))
+            upstream.sendall(initial)
+        download = threading.Thread(target=self._pipe, daemon=True, args=(
+            upstream, client, server.download, lambda n: transfer.count(downloaded=n)))
+        download.start()
+        self._pipe(client, upstream, server.upload, lambda n: transfer.count(uploaded=n))
+        download.join()
+
+    def _pipe(self, source, target, bucket, count):
+        """Copy data from ``source`` to ``target`` until end of data, errors close both directions"""
+        try:
+            while True:
+                data = source.recv(self.CHUNK)
+                if not data:
+                    break
+                bucket.acquire(len(data))
+                count(len(data))
+                target.sendall(data)
+            with contextlib.suppress(OSError):
+                target.shutdown(socket.SHUT_WR)
+        except OSError:
+            for s in (source, target):
+                with contextlib.suppress(OSError):
+                    s.shutdown(socket.SHUT_RDWR)
+
+
+class ThrottlingProxy(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    HTTP proxy relaying git transfers, so all of them together stay under the download and upload caps.
+
+    HTTPS is tunnelled, so the proxy sees only encrypted data and credentials in URLs stay between git and
+    the server. Every git command gets its own proxy URL by :func:`transfer`, connections with an unknown
+    URL are refused, so other local users can't use the proxy.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, download=None, upload=None, host='127.0.0.1', port=0):
+        """
+        :param download: maximum bytes per second received from servers, ``None`` does not limit them
+        :param upload: maximum bytes per second sent to servers, ``None`` does not limit them
+        :param port: ``0`` selects a free port
+        """
+        super().__init__((host, port), ProxyHandler)
+        self.download = TokenBucket(download, download) if download else NULL_BUDGET
+        self.upload = TokenBucket(upload, upload) if upload else NULL_BUDGET
+        self.transfers = {}  # key -> :class:`Transfer`
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @contextlib.contextmanager
+    def transfer(self, listener=None):
+        """
+        Register new :class:`Transfer`, whose URL must be used as HTTP proxy of the git command
+
+        :param listener: function called with current rate of the transfer in bytes per second
+        """
+        key = secrets.token_hex(8)
+        transfer = Transfer(key, f'http://{key}:x@{self.server_address[0]}:{self.port}', listener)
+        self.transfers[key] = transfer
+        try:
+            yield transfer
+        finally:
+            del self.transfers[key]
+
+    def start(self):
+        """Relay connections in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='bandwidth-proxy', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class RateProgress:
+    """Progress function of a transfer adding its current rate to progress messages of the git backend"""
+
+    __slots__ = ('progress', 'message', 'rate')
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.message = None
+        self.rate = None
+
+    def __call__(self, message):
+        self.message = message
+        self._report()
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self._report()
+
+    def _report(self):
+        if self.progress is None:
+            return
+        rate = f'{format_bytes(self.rate)}/s' if self.rate is not None else None
+        self.progress(', '.join(part for part in (self.message, rate) if part))
+
+
+class ThrottledGitBackend:
+    """Git backend sending transfers of another backend through :class:`ThrottlingProxy`"""
+
+    def __init__(self, backend, proxy):
+        self.backend = backend
+        self.proxy = proxy
+
+    @contextlib.contextmanager
+    def _transfer(self, progress):
+        """Yield proxy URL of new transfer and progress function reporting also its rate"""
+        progress = RateProgress(progress)
+        with self.proxy.transfer(progress.set_rate) as transfer:
+            yield transfer.url, progress
+
+    def clone(self, url, path, progress=None):
+        with self._transfer(progress) as (proxy, progress):
+            return self.backend.clone(url, path, progress=progress, proxy=proxy)
+
+    def lfs_fetch(self, repo, progress=None):
+        with self._transfer(progress) as (proxy, progress):
+            self.backend.lfs_fetch(repo, progress=progress, proxy=proxy)
+
+    def push(self, repo, remote_name, url, progress=None, update=False):
+        with self._transfer(progress) as (proxy, progress):
+            self.backend.push(repo, remote_name, url, progress=progress, proxy=proxy, update=update)
+
+    def ls_remote(self, url):
+        with self._transfer(None) as (proxy, _):
+            return self.backend.ls_remote(url, proxy=proxy)
+
+    def git_dir(self, repo):
+        return self.backend.git_dir(repo)
+
+    def count_objects(self, repo):
+        return self.backend.count_objects(repo)
+
+    def commit_count(self, repo):
+        return self.backend.commit_count(repo)
+
+    def close(self, repo):
+        self.backend.close(repo)
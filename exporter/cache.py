@@ -0,0 +1,157 @@
+import collections
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .adaptive import OVERLOADS
+
+
+class HttpCache:
+    """
+    Persistent cache of GET responses validated by ``ETag`` and ``Last-Modified`` headers.
+
+    Each entry is a file named by hash of the URL and the credentials of the request,
+    so responses are never shared between different tokens and tokens are not stored.
+    Least recently used entries are removed when the cache exceeds :attr:`max_bytes`.
+    """
+
+    MAX_BYTES = 64 * 1024 * 1024
+    AUTH_HEADERS = ('Authorization', 'Private-Token')
+    BODY_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')  # not valid for decoded body
+
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0  # responses served from the cache after ``304 Not Modified``
+        self.misses = 0  # GET requests which were not answered from the cache
+        self._lock = threading.Lock()
+        self._sizes = collections.OrderedDict()  # entry name -> size, least recently used first
+        entries = sorted((p for p in self.directory.iterdir() if p.is_file()), key=lambda p: p.stat().st_mtime)
+        for p in entries:
+            self._sizes[p.name] = p.stat().st_size
+        self._total = sum(self._sizes.values())
+
+    def key(self, request):
+        """Return entry name of :class:`requests.PreparedRequest`"""
+        h = hashlib.sha256()
+        for header in self.AUTH_HEADERS:
+            h.update(f'{header}: {request.headers.get(header, "")}\n'.encode())
+        h.update(request.url.encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """Return metadata and body of the entry or ``None``"""
+        try:
+            with open(self.directory / key, 'rb') as f:
+                meta, body = f.read().split(b'\n', 1)
+            os.utime(self.directory / key)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+        return json.loads(meta), body
+
+    def put(self, key, response):
+        """Store response if it can be validated later"""
+        meta = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in self.BODY_HEADERS},
+        }
+        if not meta['etag'] and not meta['last_modified']:
+            return
+        data = json.dumps(meta).encode() + b'\n' + response.content
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self.directory / key)
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            evicted = []
+            while self._total > self.max_bytes:
+                name, size = self._sizes.popitem(last=False)
+                self._total -= size
+                evicted.append(name)
+        for name in evicted:
+            try:
+                os.remove(self.directory / name)
+            except OSError:
+                pass
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+class CachingAdapter(HTTPAdapter):
+    """Transport adapter making GET requests conditional and answering ``304 Not Modified`` from :class:`HttpCache`"""
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            meta, _ = entry
+            if meta['etag']:
+                request.headers['If-None-Match'] = meta['etag']
+            if meta['last_modified']:
+                request.headers['If-Modified-Since'] = meta['last_modified']
+        r = super().send(request, **kwargs)
+        if r.status_code == 304 and entry is not None:
+            self.cache.count(hit=True)
+            return self._cached_response(request, r, *entry)
+        self.cache.count(hit=False)
+        if r.status_code == 200:
+            self.cache.put(key, r)
+        return r
+
+    def _cached_response(self, request, not_modified, meta, body):
+        r = requests.Response()
+        r.status_code = 200
+        r.reason = 'OK'
+        r.headers = CaseInsensitiveDict(meta['headers'])
+        r.headers.update((k, v) for k, v in not_modified.headers.items()  # fresh rate limit headers
+                         if k.lower() not in self.cache.BODY_HEADERS)
+        r._content = body
+        r.url = request.url
+        r.request = request
+        r.connection = self
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        not_modified.close()
+        return r
+
+
+def make_session(cache=None, adapter=None):
+    """
+    Return new HTTP session answering GET requests from ``cache`` when possible
+
+    :param adapter: transport adapter shared by many sessions, it is used instead of creating new one
+    """
+    session = requests.Session()
+    session.hooks['response'].append(OVERLOADS.record)  # observed by adaptive concurrency
+    if adapter is None and cache is not None:
+        adapter = CachingAdapter(cache)
+    if adapter is not None:
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    return session
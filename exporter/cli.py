@@ -1,12 +1,18 @@
 import click
 import configparser
+import os
+import threading
 
-from requests import HTTPError
-
-from .helpers import rndstr
+# Modules using GitPython, requests or enlighten are imported by commands which need them,
+# so --help, --version and validation of options stay fast.
+from .helpers import ensure_tmp_dir, format_bytes, rndstr
 from .logger import ExporterLogger
-from .logic import Exporter, GitLabClient, GitHubClient
-from .config import ConfigLoader, ProjectLoader, ProjectNormalizer
+from .process import StageDeadlines
+from .config import ConfigLoader, ProjectLoader, ProjectNormalizer, TenantLoader
+
+PURGE_WORKERS = 8  # maximum count of simultaneously deleted GitHub repositories
+BANDWIDTH_DIRECTIONS = ('download', 'upload')
+SIZE_SUFFIXES = ('K', 'M', 'G')  # multiples of 1024 bytes
 
 
 def load_all_gitlab_projects(gitlab):
@@ -27,10 +33,29 @@ def load_config_file(ctx, param, value):
         raise click.BadParameter(e)
 
 
+def load_tenants_file(ctx, param, value):
+    try:
+        cfg = configparser.ConfigParser()
+        cfg.read_file(value)
+        return TenantLoader.load(cfg, base_dir=os.path.dirname(os.path.abspath(value.name)))
+    except Exception as e:
+        raise click.BadParameter(e)
+
+
+def load_plan_file(ctx, param, value):
+    from .plan import Plan
+    try:
+        return Plan.load(value)
+    except Exception as e:
+        raise click.BadParameter(e)
+
+
 def load_projects_file(ctx, param, value):
     try:
         if value is not None:
-            return ProjectLoader.load(value)
+            source = ProjectLoader.load(value)
+            ctx.call_on_close(source.close)
+            return source
         return None
     except Exception as e:
         raise click.BadParameter(e)
@@ -38,26 +63,52 @@ def load_projects_file(ctx, param, value):
 
 def delete_all_github_repos(ctx, param, value):
     if value:
+        from requests import HTTPError
+        from .logic import GitHubClient, GitHubPurger
         try:
             token = click.prompt('Enter GitHub token with admin access', hide_input=True)
             github = GitHubClient(token)
-            repos = github.get_all_repos()
-            if len(repos) == 0:
+            names = sorted(repo['full_name'] for repo in github.iter_repos())
+            if len(names) == 0:
                 print(f'There are no repositories to delete for login {github.login}.')
                 return
-            print(f'{len(repos)} repositories with login {github.login} will be deleted:'
-                  f' {list(map(lambda x: x.get("name"), repos))}')
+            print(f'{len(names)} repositories with login {github.login} will be deleted: {names}')
             if click.confirm('Do you really want to continue?'):
-                for repo in repos:
-                    repo_name, owner = repo['name'], repo['owner']['login']
-                    github.delete_repo(repo_name, owner)
-                    print(f'Repository {repo_name} deleted.')
+                purger = GitHubPurger(github, workers=PURGE_WORKERS)
+                total = purger.run(only=set(names))
+                print_purge_summary(github.login, total, purger.deleted, purger.failed)
         except HTTPError as e:
             print(e)
         finally:
             ctx.exit()
 
 
+def print_plan(plan):
+    colors = {'export': 'green', 'overwrite': 'yellow', 'update': 'cyan', 'skip': 'blue', 'error': 'red'}
+    for p in plan.projects:
+        action = p.action(plan.conflict_policy)
+        click.secho(f'{p.name_gitlab}->{p.name_github}', bold=True, nl=False)
+        click.secho(' => ', bold=True, nl=False)
+        click.secho(action.upper(), fg=colors[action], bold=True, nl=False)
+        click.secho(f' {p.error}' if p.error else f' {format_bytes(p.size)}')
+    counts = ', '.join(f'{count} {action}' for action, count in sorted(plan.actions().items()))
+    print(f'Projects: {counts}')
+    print(f'Transfer: {format_bytes(plan.total_bytes)}, disk: {format_bytes(plan.disk_bytes)}', end='')
+    seconds = plan.transfer_seconds
+    print(f', time at {format_bytes(plan.min_rate)}/s: {seconds:.0f} s' if seconds is not None else '')
+
+
+def print_purge_summary(login, total, deleted, failed):
+    if total == 0:
+        print(f'There are no repositories to delete for login {login}.')
+        return
+    print(f'Deleted {len(deleted)} of {total} repositories for login {login}.')
+    if failed:
+        click.secho(f'Failed to delete {len(failed)} repositories:', fg='red', bold=True)
+        for name, e in sorted(failed, key=lambda x: x[0]):
+            print(f'  {name}: {e}')
+
+
 def validate_timeout(ctx, param, value):
     valid = True
     try:
@@ -73,16 +124,21 @@ def validate_timeout(ctx, param, value):
 
 
 def make_unique_projects(projects, random_suffix_length):
-    """Add random suffix to given project names"""
+    """Lazily add random suffix to given project names"""
     for p in projects:
-        p[1] = p[1] + '_' + rndstr(random_suffix_length)
+        yield [p[0], p[1] + '_' + rndstr(random_suffix_length)] + p[2:]
 
 
-def normalize_projects(projects, visibility):
+def project_count(projects):
+    """Return count of projects if it is known without reading them, ``None`` otherwise"""
     try:
-        ProjectNormalizer.normalize(projects, visibility)
-    except Exception as e:
-        raise click.BadParameter(e)
+        return len(projects)
+    except TypeError:
+        return None
+
+
+def normalize_projects(projects, visibility):
+    return ProjectNormalizer.iter_normalized(projects, visibility)
 
 
 class Mutex(click.Option):
@@ -115,59 +171,584 @@ def validate_batch_size(ctx, param, value):
     return value
 
 
-@click.command(name='exporter')
+def validate_optional_batch_size(ctx, param, value):
+    if value is None:
+        return None
+    return validate_batch_size(ctx, param, value)
+
+
+def make_concurrency(adaptive, min_batch_size, batch_size):
+    """Return :class:`exporter.adaptive.AdaptiveConcurrency` between the batch sizes, ``None`` if not adaptive"""
+    if not adaptive:
+        return None
+    if min_batch_size > batch_size:
+        raise click.BadParameter(f'Must not exceed batch size {batch_size}.', param_hint="'--min-batch-size'")
+    from .adaptive import AdaptiveConcurrency
+    return AdaptiveConcurrency(min_batch_size, batch_size)
+
+
+def make_progress(progress, total=None):
+    """Return :class:`exporter.progress.ProgressPanel` of ``total`` projects, ``None`` for bar of each task"""
+    if progress != 'panel':
+        return None
+    from .progress import ProgressPanel
+    return ProgressPanel(total=total)
+
+
+def make_verify_slots(verify, verify_workers):
+    """Return semaphore shared by verifications of all pushed repositories, ``None`` if they are not verified"""
+    return threading.BoundedSemaphore(verify_workers) if verify else None
+
+
+def parse_stage_timeouts(ctx, param, value):
+    """Parse ``STAGE=SECONDS`` pairs to dictionary"""
+    timeouts = {}
+    for item in value:
+        stage, _, seconds = item.partition('=')
+        if stage not in StageDeadlines.STAGES:
+            raise click.BadParameter(f'Unknown stage {stage!r}, use one of {", ".join(StageDeadlines.STAGES)}.')
+        try:
+            timeouts[stage] = float(seconds)
+        except ValueError:
+            raise click.BadParameter(f'Invalid timeout {seconds!r} of stage {stage}.')
+        if timeouts[stage] < 0:
+            raise click.BadParameter(f'Invalid timeout {seconds!r} of stage {stage}.')
+    return timeouts
+
+
+def parse_bytes(value):
+    """Return bytes of number with optional K, M or G suffix, ``None`` if it is not a number"""
+    suffix = value[-1:].upper()
+    multiplier = 1024 ** (SIZE_SUFFIXES.index(suffix) + 1) if suffix in SIZE_SUFFIXES else 1
+    try:
+        return float(value[:-1] if multiplier > 1 else value) * multiplier
+    except ValueError:
+        return None
+
+
+def parse_size(ctx, param, value):
+    size = parse_bytes(value)
+    if size is None or size < 0:
+        raise click.BadParameter(f'Invalid size {value!r}.')
+    return int(size)
+
+
+def parse_max_bandwidth(ctx, param, value):
+    """Parse ``[DIRECTION=]RATE`` items to dictionary of direction and bytes per second"""
+    limits = {}
+    for item in value:
+        direction, _, rate = item.rpartition('=')
+        if direction and direction not in BANDWIDTH_DIRECTIONS:
+            raise click.BadParameter(f'Unknown direction {direction!r}, use one of {", ".join(BANDWIDTH_DIRECTIONS)}.')
+        limit = parse_bytes(rate)
+        if limit is None or limit <= 0:
+            raise click.BadParameter(f'Invalid bandwidth {rate!r}.')
+        limits.update(dict.fromkeys((direction,) if direction else BANDWIDTH_DIRECTIONS, limit))
+    return limits
+
+
+def make_staging(memory_dir, memory_threshold, memory_budget):
+    """
+    Return :class:`exporter.staging.MemoryStaging` placing small clones to ``memory_dir``, all clones are placed
+    to the temporary directory if it is not given. Its directory is removed when the command ends.
+    """
+    from .staging import DISK_STAGING, MemoryStaging
+    if memory_dir is None:
+        return DISK_STAGING
+    staging = MemoryStaging(memory_dir, memory_threshold, memory_budget)
+    click.get_current_context().call_on_close(staging.close)
+    return staging
+
+
+def make_git_backend(name, max_bandwidth):
+    """
+    Return git backend of given name, its transfers go through a throttling proxy if bandwidth is limited.
+    The proxy is stopped when the command ends.
+    """
+    from .gitbackend import GIT_BACKENDS
+    backend = GIT_BACKENDS[name]
+    if not max_bandwidth:
+        return backend
+    from .bandwidth import ThrottledGitBackend, ThrottlingProxy
+    proxy = ThrottlingProxy(download=max_bandwidth.get('download'), upload=max_bandwidth.get('upload'))
+    proxy.start()
+    click.get_current_context().call_on_close(proxy.stop)
+    return ThrottledGitBackend(backend, proxy)
+
+
+def validate_min_transfer_rate(ctx, param, value):
+    if value < 0:
+        raise click.BadParameter('Invalid transfer rate.')
+    return value
+
+
+def validate_interval(ctx, param, value):
+    if value != 0 and value < 1:
+        raise click.BadParameter('Invalid interval.')
+    return value
+
+
+def validate_log_max_bytes(ctx, param, value):
+    if value < 0:
+        raise click.BadParameter('Invalid log size.')
+    return value
+
+
+def make_clients(config, github_api='rest', gitlab_api='rest', cache_dir=None):
+    """Return GitLab and GitHub clients using given API and sharing HTTP cache"""
+    from .cache import HttpCache
+    from .logic import GitHubClient, GitHubGraphQLClient, GitHubTokenPool, GitLabClient, GitLabGraphQLClient
+    cache = HttpCache(cache_dir) if cache_dir else None
+    gitlab_client = GitLabGraphQLClient if gitlab_api == 'graphql' else GitLabClient
+    github_client = GitHubGraphQLClient if github_api == 'graphql' else GitHubClient
+    pool = GitHubTokenPool([config.github_token] + config.github_read_tokens) if config.github_read_tokens else None
+    return (gitlab_client(token=config.gitlab_token, cache=cache),
+            github_client(token=config.github_token, cache=cache, pool=pool))
+
+
+class DefaultCommandGroup(click.Group):
+    """
+    Group running :attr:`default_command` when the first argument is not a command,
+    so ``exporter -c config -p projects`` keeps working as ``exporter export -c config -p projects``.
+    """
+
+    default_command = 'export'
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] not in ('--help', '--version')):
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+@click.group(name='exporter', cls=DefaultCommandGroup)
 @click.version_option(version='1.0.0')
+def main():
+    """Tool for exporting projects from FIT CTU GitLab to GitHub"""
+
+
+@main.command(name='export')
 @click.option('-c', '--config', type=click.File(mode='r'), callback=load_config_file,
               help='File containing GitHub and GitLab tokens.', required=True)
 @click.option('--export-all', is_flag=True, default=False,
               help='Export all GitLab projects associated with given token.')
 @click.option('-p', '--projects', type=click.File(mode='r', lazy=True), callback=load_projects_file,
-              cls=Mutex, help='Project names to export. See Documentation for format.', not_required_if=['export-all'])
+              cls=Mutex, help='Project names to export, "-" reads them from stdin. See Documentation for format.', not_required_if=['export-all'])
 @click.option('--purge-gh', default=False, show_default=False, is_flag=True,
               is_eager=True, expose_value=False, callback=delete_all_github_repos,
               help='Prompt for GitHub token with admin access, delete all repos and exit. Dangerous!')
 @click.option('--debug', default=False, is_flag=True,
               help='Run application in debug mode. Application is unstable in this mode.')
-@click.option('--conflict-policy', type=click.Choice(['skip', 'overwrite']),
+@click.option('--conflict-policy', type=click.Choice(['skip', 'overwrite', 'update']),
               default='skip', help='[skip] skip export for project names which already exists on GitHib.'
-                                   '[overwrite] overwrite any GitHub project which already exists.')
+                                   '[overwrite] overwrite any GitHub project which already exists.'
+                                   '[update] push branches and tags into existing GitHub project, keeping its '
+                                   'issues and settings.')
 @click.option('--tmp-dir', type=click.Path(), help='Temporary directory to store data during export.',
               default='tmp', show_default=True)
 @click.option('--task-timeout', help='Timeout for unresponding export task.',
               default=30.0, callback=validate_timeout, show_default=True)
+@click.option('--rollback-timeout', help='Timeout for undoing all exports after interruption or error.',
+              default=30.0, callback=validate_timeout, show_default=True)
 @click.option('--unique', is_flag=True, default=False,
               help='Prevent GitHub name conflicts by appending random string at the end of exported project name.')
 @click.option('--visibility', default='private', show_default=True, type=click.Choice(['public', 'private']),
               help='Visibility of the exported project on GitHub')
 @click.option('--batch-size', default=10, show_default=True, callback=validate_batch_size,
               help='Maximum count of simultaneously running tasks.')
+@click.option('--adaptive', is_flag=True, default=False,
+              help='Adapt count of simultaneously running tasks between --min-batch-size and batch size '
+                   'to throughput and overload errors of the servers.')
+@click.option('--min-batch-size', default=2, show_default=True, callback=validate_batch_size,
+              help='Lowest and initial count of simultaneously running tasks with --adaptive.')
 @click.option('--dry-run', default=False, is_flag=True,
               help='Do not perform any changes on GitLab and Github.')
-def main(config, projects, debug, conflict_policy, tmp_dir, task_timeout, export_all, unique, visibility,
-         batch_size, dry_run):
-    """Tool for exporting projects from FIT CTU GitLab to GitHub"""
-    gitlab = GitLabClient(token=config.gitlab_token)
-    github = GitHubClient(token=config.github_token)
+@click.option('--report', type=click.Path(dir_okay=False, writable=True),
+              help='Write record of each project to this file as soon as its export finishes.')
+@click.option('--report-format', type=click.Choice(['jsonl', 'csv']), default='jsonl', show_default=True,
+              help='Format of the file written by --report.')
+@click.option('--stage-timeout', multiple=True, metavar='STAGE=SECONDS', callback=parse_stage_timeouts,
+              help='Deadline of export stage (resolve, clone, lfs, create, push, verify), 0 disables it. '
+                   'Can be used multiple times.')
+@click.option('--min-transfer-rate', default=StageDeadlines.MIN_RATE, show_default=True,
+              callback=validate_min_transfer_rate,
+              help='Bytes per second, deadlines of clone, lfs and push are prolonged by time needed to transfer '
+                   'known repository size at this rate. 0 disables prolonging.')
+@click.option('--github-api', type=click.Choice(['rest', 'graphql']), default='rest', show_default=True,
+              help='[graphql] check existence and create GitHub repositories in batches.')
+@click.option('--gitlab-api', type=click.Choice(['rest', 'graphql']), default='rest', show_default=True,
+              help='[graphql] look up GitLab projects in batches.')
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              help='Cache GitHub and GitLab API responses in this directory and revalidate them in next runs.')
+@click.option('--log-max-bytes', default=0, show_default=True, callback=validate_log_max_bytes,
+              help='Rotate log file when it would exceed this size, 0 disables rotation.')
+@click.option('--git-backend', type=click.Choice(['gitpython', 'subprocess']), default='gitpython', show_default=True,
+              help='[subprocess] run git commands directly, without helper processes kept open by GitPython.')
+@click.option('--max-bandwidth', multiple=True, metavar='[DIRECTION=]RATE', callback=parse_max_bandwidth,
+              help='Maximum bytes per second of all git transfers together, K, M and G suffixes are accepted. '
+                   'DIRECTION is download or upload, RATE alone limits both. Can be used multiple times.')
+@click.option('--memory-dir', type=click.Path(file_okay=False, exists=True),
+              help='Memory backed directory, eg /dev/shm, for clones of repositories up to --memory-threshold.')
+@click.option('--memory-threshold', default='5M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Largest repository size reported by GitLab cloned to --memory-dir, K, M and G suffixes are '
+                   'accepted.')
+@click.option('--memory-budget', default='512M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Memory used by all clones in --memory-dir at once, repositories which do not fit go to --tmp-dir.')
+@click.option('--verify', is_flag=True, default=False,
+              help='Compare branches, tags and LFS objects of GitHub repository with GitLab after push, '
+                   'without transferring objects.')
+@click.option('--verify-workers', default=4, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneous verifications with --verify.')
+@click.option('--progress', type=click.Choice(['bars', 'panel']), default='bars', show_default=True,
+              help='[panel] show counts by status, rates, running tasks and recent failures in a fixed height '
+                   'view instead of a bar for each task of the batch.')
+def export(config, projects, debug, conflict_policy, tmp_dir, task_timeout, rollback_timeout, export_all, unique,
+           visibility, batch_size, dry_run, report, report_format, stage_timeout, min_transfer_rate, github_api,
+           gitlab_api, cache_dir, log_max_bytes, git_backend, max_bandwidth, adaptive, min_batch_size, verify,
+           verify_workers, progress, memory_dir, memory_threshold, memory_budget):
+    """Export projects from GitLab to GitHub, default command"""
+    from .logic import Exporter
+    from .report import open_report_sink
+    concurrency = make_concurrency(adaptive, min_batch_size, batch_size)
+    gitlab, github = make_clients(config, github_api=github_api, gitlab_api=gitlab_api, cache_dir=cache_dir)
 
     if export_all:
         projects = load_all_gitlab_projects(gitlab)
+    total = project_count(projects)
     if unique:
-        make_unique_projects(projects, random_suffix_length=6)
+        projects = make_unique_projects(projects, random_suffix_length=6)
 
-    normalize_projects(projects, visibility)
+    projects = normalize_projects(projects, visibility)
 
+    report_sink = open_report_sink(report, report_format)
+    logger = ExporterLogger(max_bytes=log_max_bytes)
     exporter = Exporter(
         gitlab=gitlab,
         github=github,
-        logger=ExporterLogger(),
-        debug=debug
+        logger=logger,
+        debug=debug,
+        report_sink=report_sink,
+        git_backend=make_git_backend(git_backend, max_bandwidth),
+        verify_slots=make_verify_slots(verify, verify_workers),
+        progress=make_progress(progress, total=total),
+        staging=make_staging(memory_dir, memory_threshold, memory_budget)
     )
 
-    exporter.run(
+    try:
+        exporter.run(
+            projects=projects,
+            conflict_policy=conflict_policy,
+            tmp_dir=tmp_dir,
+            task_timeout=task_timeout,
+            batch_size=batch_size,
+            dry_run=dry_run,
+            rollback_timeout=rollback_timeout,
+            stage_deadlines=StageDeadlines(stage_timeout, min_transfer_rate),
+            concurrency=concurrency
+        )
+    finally:
+        report_sink.close()
+        logger.close()
+
+
+@main.command()
+@click.option('-c', '--config', type=click.File(mode='r'), callback=load_config_file,
+              help='File containing GitHub and GitLab tokens.', required=True)
+@click.option('-p', '--projects', type=click.File(mode='r', lazy=True), callback=load_projects_file,
+              help='Watch only these projects, all GitLab projects associated with given token are watched '
+                   'by default. See Documentation for format.')
+@click.option('--interval', default=300.0, show_default=True, callback=validate_interval,
+              help='Seconds between polls of GitLab for changed projects, 0 polls only once at start, '
+                   'which is useful with --webhook-port.')
+@click.option('--state-file', type=click.Path(dir_okay=False), default='exporter_state.json', show_default=True,
+              help='File keeping time of the last poll and projects waiting for sync between restarts.')
+@click.option('--workers', default=4, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneously synced projects.')
+@click.option('--conflict-policy', type=click.Choice(['skip', 'overwrite', 'update']), default='update',
+              show_default=True,
+              help='What to do with existing GitHub repository of changed project.')
+@click.option('--visibility', default='private', show_default=True, type=click.Choice(['public', 'private']),
+              help='Visibility of the exported project on GitHub')
+@click.option('--tmp-dir', type=click.Path(), help='Temporary directory to store data during export.',
+              default='tmp', show_default=True)
+@click.option('--report', type=click.Path(dir_okay=False, writable=True),
+              help='Write record of each project to this file as soon as its sync finishes.')
+@click.option('--report-format', type=click.Choice(['jsonl', 'csv']), default='jsonl', show_default=True,
+              help='Format of the file written by --report.')
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              help='Cache GitHub and GitLab API responses in this directory and revalidate them in next polls.')
+@click.option('--webhook-port', type=click.IntRange(0, 65535),
+              help='Listen for GitLab push and tag webhooks on this port and sync the pushed project right away. '
+                   'Requires secret in webhook section of the config file.')
+@click.option('--webhook-host', default='0.0.0.0', show_default=True,
+              help='Address to listen on for GitLab webhooks.')
+@click.option('--debug', default=False, is_flag=True,
+              help='Run application in debug mode.')
+@click.option('--git-backend', type=click.Choice(['gitpython', 'subprocess']), default='gitpython', show_default=True,
+              help='[subprocess] run git commands directly, without helper processes kept open by GitPython.')
+@click.option('--max-bandwidth', multiple=True, metavar='[DIRECTION=]RATE', callback=parse_max_bandwidth,
+              help='Maximum bytes per second of all git transfers together, K, M and G suffixes are accepted. '
+                   'DIRECTION is download or upload, RATE alone limits both. Can be used multiple times.')
+@click.option('--memory-dir', type=click.Path(file_okay=False, exists=True),
+              help='Memory backed directory, eg /dev/shm, for clones of repositories up to --memory-threshold.')
+@click.option('--memory-threshold', default='5M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Largest repository size reported by GitLab cloned to --memory-dir, K, M and G suffixes are '
+                   'accepted.')
+@click.option('--memory-budget', default='512M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Memory used by all clones in --memory-dir at once, repositories which do not fit go to --tmp-dir.')
+@click.option('--verify', is_flag=True, default=False,
+              help='Compare branches, tags and LFS objects of GitHub repository with GitLab after push, '
+                   'without transferring objects.')
+@click.option('--verify-workers', default=4, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneous verifications with --verify.')
+def watch(config, projects, interval, state_file, workers, conflict_policy, visibility, tmp_dir, report,
+          report_format, cache_dir, webhook_port, webhook_host, debug, git_backend,
+          max_bandwidth, verify, verify_workers, memory_dir, memory_threshold, memory_budget):
+    """Keep GitHub mirrors up to date by polling GitLab for changed projects"""
+    from .logic import Exporter
+    from .process import Watchdog
+    from .report import open_report_sink
+    from .watch import Watcher, WatchState
+    from .webhook import WebhookServer
+    if webhook_port is not None and not config.webhook_secret:
+        raise click.BadParameter("No 'secret' in section 'webhook' of the config file", param_hint="'--webhook-port'")
+    gitlab, github = make_clients(config, cache_dir=cache_dir)
+    if projects is not None:
+        projects = list(normalize_projects(projects, visibility))
+
+    report_sink = open_report_sink(report, report_format)
+    logger = ExporterLogger()
+    watchdog = Watchdog(StageDeadlines())
+    watcher = Watcher(
+        exporter=Exporter(gitlab=gitlab, github=github, logger=logger, debug=debug, report_sink=report_sink,
+                          git_backend=make_git_backend(git_backend, max_bandwidth),
+                          verify_slots=make_verify_slots(verify, verify_workers),
+                          staging=make_staging(memory_dir, memory_threshold, memory_budget)),
+        state=WatchState(state_file),
+        interval=interval,
+        workers=workers,
+        conflict_policy=conflict_policy,
+        tmp_dir=ensure_tmp_dir(tmp_dir),
+        visibility=visibility,
         projects=projects,
+        watchdog=watchdog
+    )
+    webhook = None
+    try:
+        if webhook_port is not None:
+            webhook = WebhookServer(watcher, config.webhook_secret, webhook_host, webhook_port)
+            webhook.start()
+        watcher.run()
+    except KeyboardInterrupt:
+        click.secho('===STOPPING===', bold=True)
+    finally:
+        if webhook is not None:
+            webhook.stop()
+        watcher.stop()
+        watchdog.stop()
+        report_sink.close()
+        logger.close()
+
+
+@main.command()
+@click.option('-c', '--config', type=click.File(mode='r'), callback=load_tenants_file, required=True,
+              help='File containing tokens and projects of each tenant. See Documentation for format.')
+@click.option('--workers', default=10, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneously running exports of all tenants.')
+@click.option('--conflict-policy', type=click.Choice(['skip', 'overwrite', 'update']), default='skip',
+              show_default=True,
+              help='What to do with existing GitHub repository.')
+@click.option('--tmp-dir', type=click.Path(), help='Temporary directory to store data during export.',
+              default='tmp', show_default=True)
+@click.option('--rollback-timeout', help='Timeout for undoing exports of each tenant after interruption.',
+              default=30.0, callback=validate_timeout, show_default=True)
+@click.option('--report', type=click.Path(dir_okay=False, writable=True),
+              help='Write record of each project to this file as soon as its export finishes.')
+@click.option('--report-format', type=click.Choice(['jsonl', 'csv']), default='jsonl', show_default=True,
+              help='Format of the file written by --report.')
+@click.option('--stage-timeout', multiple=True, metavar='STAGE=SECONDS', callback=parse_stage_timeouts,
+              help='Deadline of export stage (resolve, clone, lfs, create, push, verify), 0 disables it. '
+                   'Can be used multiple times.')
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              help='Cache GitHub and GitLab API responses of all tenants in this directory.')
+@click.option('--debug', default=False, is_flag=True,
+              help='Run application in debug mode.')
+@click.option('--git-backend', type=click.Choice(['gitpython', 'subprocess']), default='gitpython', show_default=True,
+              help='[subprocess] run git commands directly, without helper processes kept open by GitPython.')
+@click.option('--max-bandwidth', multiple=True, metavar='[DIRECTION=]RATE', callback=parse_max_bandwidth,
+              help='Maximum bytes per second of all git transfers together, K, M and G suffixes are accepted. '
+                   'DIRECTION is download or upload, RATE alone limits both. Can be used multiple times.')
+@click.option('--memory-dir', type=click.Path(file_okay=False, exists=True),
+              help='Memory backed directory, eg /dev/shm, for clones of repositories up to --memory-threshold.')
+@click.option('--memory-threshold', default='5M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Largest repository size reported by GitLab cloned to --memory-dir, K, M and G suffixes are '
+                   'accepted.')
+@click.option('--memory-budget', default='512M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Memory used by all clones in --memory-dir at once, repositories which do not fit go to --tmp-dir.')
+@click.option('--verify', is_flag=True, default=False,
+              help='Compare branches, tags and LFS objects of GitHub repository with GitLab after push, '
+                   'without transferring objects.')
+@click.option('--verify-workers', default=4, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneous verifications with --verify.')
+def multi(config, workers, conflict_policy, tmp_dir, rollback_timeout, report, report_format, stage_timeout, cache_dir,
+          debug, git_backend, max_bandwidth, verify, verify_workers, memory_dir, memory_threshold, memory_budget):
+    """Export projects of many tenants with their own tokens at once"""
+    from .cache import HttpCache
+    from .report import open_report_sink
+    from .tenants import MultiExporter
+    report_sink = open_report_sink(report, report_format)
+    logger = ExporterLogger()
+    exporter = MultiExporter(
+        tenants=config,
+        logger=logger,
+        debug=debug,
+        workers=workers,
+        report_sink=report_sink,
+        cache=HttpCache(cache_dir) if cache_dir else None,
+        git_backend=make_git_backend(git_backend, max_bandwidth),
+        verify_slots=make_verify_slots(verify, verify_workers),
+        staging=make_staging(memory_dir, memory_threshold, memory_budget)
+    )
+    try:
+        exporter.run(conflict_policy=conflict_policy, tmp_dir=tmp_dir, stage_deadlines=StageDeadlines(stage_timeout),
+                     rollback_timeout=rollback_timeout)
+    finally:
+        report_sink.close()
+        logger.close()
+
+
+@main.command()
+@click.option('-c', '--config', type=click.File(mode='r'), callback=load_config_file,
+              help='File containing GitHub and GitLab tokens.', required=True)
+@click.option('--export-all', is_flag=True, default=False,
+              help='Plan export of all GitLab projects associated with given token.')
+@click.option('-p', '--projects', type=click.File(mode='r', lazy=True), callback=load_projects_file,
+              cls=Mutex, help='Project names to export, "-" reads them from stdin. See Documentation for format.',
+              not_required_if=['export-all'])
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), default='exporter_plan.json',
+              show_default=True, help='File to write the plan to.')
+@click.option('--conflict-policy', type=click.Choice(['skip', 'overwrite', 'update']), default='skip',
+              show_default=True,
+              help='What to do with existing GitHub repository.')
+@click.option('--unique', is_flag=True, default=False,
+              help='Prevent GitHub name conflicts by appending random string at the end of exported project name.')
+@click.option('--visibility', default='private', show_default=True, type=click.Choice(['public', 'private']),
+              help='Visibility of the exported project on GitHub')
+@click.option('--batch-size', default=10, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneously running tasks of apply.')
+@click.option('--workers', default=10, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneous lookups.')
+@click.option('--min-transfer-rate', default=StageDeadlines.MIN_RATE, show_default=True,
+              callback=validate_min_transfer_rate,
+              help='Bytes per second used to estimate duration of the export, 0 disables the estimate.')
+@click.option('--github-api', type=click.Choice(['rest', 'graphql']), default='rest', show_default=True,
+              help='[graphql] check existence of GitHub repositories in batches.')
+@click.option('--gitlab-api', type=click.Choice(['rest', 'graphql']), default='rest', show_default=True,
+              help='[graphql] look up GitLab projects in batches.')
+@click.option('--cache-dir', type=click.Path(file_okay=False),
+              help='Cache GitHub and GitLab API responses in this directory and revalidate them in next runs.')
+def plan(config, export_all, projects, output, conflict_policy, unique, visibility, batch_size, workers,
+         min_transfer_rate, github_api, gitlab_api, cache_dir):
+    """Look up projects without changing anything and write plan of their export"""
+    from .plan import Planner
+    gitlab, github = make_clients(config, github_api=github_api, gitlab_api=gitlab_api, cache_dir=cache_dir)
+    if export_all:
+        projects = load_all_gitlab_projects(gitlab)
+    if unique:
+        projects = make_unique_projects(projects, random_suffix_length=6)
+    planned = Planner(gitlab, github, workers=workers).plan(
+        projects=normalize_projects(projects, visibility),
         conflict_policy=conflict_policy,
-        tmp_dir=tmp_dir,
-        task_timeout=task_timeout,
         batch_size=batch_size,
-        dry_run=dry_run
+        min_rate=min_transfer_rate
     )
+    planned.save(output)
+    print_plan(planned)
+    print(f'Plan written to {output}, run it by: exporter apply -c CONFIG {output}')
+
+
+@main.command()
+@click.argument('plan', type=click.File(mode='r'), callback=load_plan_file)
+@click.option('-c', '--config', type=click.File(mode='r'), callback=load_config_file,
+              help='File containing GitHub and GitLab tokens.', required=True)
+@click.option('--debug', default=False, is_flag=True,
+              help='Run application in debug mode. Application is unstable in this mode.')
+@click.option('--tmp-dir', type=click.Path(), help='Temporary directory to store data during export.',
+              default='tmp', show_default=True)
+@click.option('--task-timeout', help='Timeout for unresponding export task.',
+              default=30.0, callback=validate_timeout, show_default=True)
+@click.option('--rollback-timeout', help='Timeout for undoing all exports after interruption or error.',
+              default=30.0, callback=validate_timeout, show_default=True)
+@click.option('--batch-size', type=int, callback=validate_optional_batch_size,
+              help='Maximum count of simultaneously running tasks, taken from the plan by default.')
+@click.option('--adaptive', is_flag=True, default=False,
+              help='Adapt count of simultaneously running tasks between --min-batch-size and batch size '
+                   'to throughput and overload errors of the servers.')
+@click.option('--min-batch-size', default=2, show_default=True, callback=validate_batch_size,
+              help='Lowest and initial count of simultaneously running tasks with --adaptive.')
+@click.option('--report', type=click.Path(dir_okay=False, writable=True),
+              help='Write record of each project to this file as soon as its export finishes.')
+@click.option('--report-format', type=click.Choice(['jsonl', 'csv']), default='jsonl', show_default=True,
+              help='Format of the file written by --report.')
+@click.option('--stage-timeout', multiple=True, metavar='STAGE=SECONDS', callback=parse_stage_timeouts,
+              help='Deadline of export stage (resolve, clone, lfs, create, push, verify), 0 disables it. '
+                   'Can be used multiple times.')
+@click.option('--github-api', type=click.Choice(['rest', 'graphql']), default='rest', show_default=True,
+              help='[graphql] create GitHub repositories in batches.')
+@click.option('--git-backend', type=click.Choice(['gitpython', 'subprocess']), default='gitpython', show_default=True,
+              help='[subprocess] run git commands directly, without helper processes kept open by GitPython.')
+@click.option('--max-bandwidth', multiple=True, metavar='[DIRECTION=]RATE', callback=parse_max_bandwidth,
+              help='Maximum bytes per second of all git transfers together, K, M and G suffixes are accepted. '
+                   'DIRECTION is download or upload, RATE alone limits both. Can be used multiple times.')
+@click.option('--memory-dir', type=click.Path(file_okay=False, exists=True),
+              help='Memory backed directory, eg /dev/shm, for clones of repositories up to --memory-threshold.')
+@click.option('--memory-threshold', default='5M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Largest repository size reported by GitLab cloned to --memory-dir, K, M and G suffixes are '
+                   'accepted.')
+@click.option('--memory-budget', default='512M', show_default=True, metavar='SIZE', callback=parse_size,
+              help='Memory used by all clones in --memory-dir at once, repositories which do not fit go to --tmp-dir.')
+@click.option('--verify', is_flag=True, default=False,
+              help='Compare branches, tags and LFS objects of GitHub repository with GitLab after push, '
+                   'without transferring objects.')
+@click.option('--verify-workers', default=4, show_default=True, callback=validate_batch_size,
+              help='Maximum count of simultaneous verifications with --verify.')
+@click.option('--progress', type=click.Choice(['bars', 'panel']), default='bars', show_default=True,
+              help='[panel] show counts by status, rates, running tasks and recent failures in a fixed height '
+                   'view instead of a bar for each task of the batch.')
+def apply(plan, config, debug, tmp_dir, task_timeout, rollback_timeout, batch_size, report, report_format,
+          stage_timeout, github_api, git_backend, max_bandwidth, adaptive, min_batch_size, verify, verify_workers,
+          progress, memory_dir, memory_threshold, memory_budget):
+    """Export projects of PLAN written by plan command, without looking them up again"""
+    from .logic import Exporter
+    from .report import open_report_sink
+    batch_size = batch_size or plan.batch_size
+    concurrency = make_concurrency(adaptive, min_batch_size, batch_size)
+    gitlab, github = make_clients(config, github_api=github_api)
+    if github.login != plan.github_login:
+        raise click.BadParameter(f'Plan was made for GitHub login {plan.github_login}, not {github.login}.',
+                                 param_hint="'-c' / '--config'")
+    failed = len(plan.projects) - len(plan.runnable())
+    if failed:
+        click.secho(f'{failed} projects with errors in the plan are not exported.', fg='red', bold=True)
+
+    report_sink = open_report_sink(report, report_format)
+    logger = ExporterLogger()
+    exporter = Exporter(gitlab=gitlab, github=github, logger=logger, debug=debug, report_sink=report_sink,
+                        git_backend=make_git_backend(git_backend, max_bandwidth),
+                        verify_slots=make_verify_slots(verify, verify_workers),
+                        progress=make_progress(progress, total=len(plan.runnable())),
+                        staging=make_staging(memory_dir, memory_threshold, memory_budget))
+    try:
+        exporter.run(
+            projects=plan.runnable(),
+            conflict_policy=plan.conflict_policy,
+            tmp_dir=tmp_dir,
+            task_timeout=task_timeout,
+            batch_size=batch_size,
+            dry_run=False,
+            rollback_timeout=rollback_timeout,
+            stage_deadlines=StageDeadlines(stage_timeout, plan.min_rate),
+            concurrency=concurrency
+        )
+    finally:
+        report_sink.close()
+        logger.close()
@@ -1,11 +1,19 @@
 import pathlib
+import tempfile
 
 
 class ExporterConfig:
 
-    def __init__(self, github_token, gitlab_token):
+    def __init__(self, github_token, gitlab_token, webhook_secret=None, github_read_tokens=()):
         self.github_token = github_token
         self.gitlab_token = gitlab_token
+        self.webhook_secret = webhook_secret
+        self.github_read_tokens = list(github_read_tokens)  # additional tokens for read-only GitHub requests
+
+
+def split_tokens(value):
+    """Split tokens separated by commas or whitespace"""
+    return value.replace(',', ' ').split()
 
 
 class ConfigLoader:
@@ -16,7 +24,7 @@ class ConfigLoader:
         Load and validate application configuration for GitHub and GitLab access
 
         :param cfg: :class:`ConfigParser` object containing GitHub and GitLab tokens
-        :return: :class:`ExporterConfig` containing GitHub and Gitlab tokens
+        :return: :class:`ExporterConfig` containing GitHub and Gitlab tokens and optional webhook secret
         """
 
         if not cfg.has_section('github') and not cfg.has_section('gitlab'):
@@ -33,7 +41,89 @@ class ConfigLoader:
 
         return ExporterConfig(
             github_token=cfg.get('github', 'token'),
-            gitlab_token=cfg.get('gitlab', 'token')
+            gitlab_token=cfg.get('gitlab', 'token'),
+            webhook_secret=cfg.get('webhook', 'secret', fallback=None) or None,
+            github_read_tokens=split_tokens(cfg.get('github', 'read_tokens', fallback=''))
+        )
+
+
+class TenantConfig:
+    """Tokens and projects of one tenant of multi-tenant export"""
+
+    def __init__(self, name, config, projects, visibility, max_tasks, requests_per_hour):
+        """
+        :param config: :class:`ExporterConfig` with tokens of the tenant
+        :param projects: parsed lines of projects file, ``None`` exports all projects of the GitLab token
+        :param max_tasks: maximum count of simultaneously running exports of each token of the tenant
+        :param requests_per_hour: API request budget of each token of the tenant
+        """
+        self.name = name
+        self.config = config
+        self.projects = projects
+        self.visibility = visibility
+        self.max_tasks = max_tasks
+        self.requests_per_hour = requests_per_hour
+
+
+class TenantLoader:
+    """Loader of config file with many ``[tenant:NAME]`` sections"""
+
+    PREFIX = 'tenant:'
+    MAX_TASKS = 2
+    REQUESTS_PER_HOUR = 4000  # under 5000 requests per hour allowed for GitHub token
+
+    @classmethod
+    def load(cls, cfg, base_dir='.'):
+        """
+        Load and validate tenants, options missing in tenant section are taken from ``DEFAULT`` section
+
+        :param cfg: :class:`ConfigParser` object containing tenant sections
+        :param base_dir: directory of the config file, relative paths of projects files are resolved from it
+        :return: list of :class:`TenantConfig`
+        """
+        names = [s[len(cls.PREFIX):] for s in cfg.sections() if s.startswith(cls.PREFIX)]
+        if not names:
+            raise ValueError(f"No section: '{cls.PREFIX}NAME'")
+        return [cls._load_tenant(cfg, name, pathlib.Path(base_dir)) for name in names]
+
+    @classmethod
+    def _load_tenant(cls, cfg, name, base_dir):
+        section = cls.PREFIX + name
+        for option in ('gitlab_token', 'github_token'):
+            if not cfg.get(section, option, fallback=None):
+                raise ValueError(f"No '{option}' in section '{section}'")
+
+        projects_file = cfg.get(section, 'projects', fallback=None)
+        export_all = cfg.getboolean(section, 'export_all', fallback=False)
+        if bool(projects_file) == export_all:
+            raise ValueError(f"Section '{section}' must contain either 'projects' or 'export_all'")
+        projects = None
+        if projects_file:
+            with open(base_dir / projects_file) as f:
+                try:
+                    projects = ProjectLoader.load_parsed(f)
+                except ValueError as e:
+                    raise ValueError(f"{e} (section '{section}')") from e
+            if not projects:
+                raise ValueError(f"Projects file of section '{section}' is empty.")
+
+        visibility = cfg.get(section, 'visibility', fallback='private')
+        if visibility not in ('public', 'private'):
+            raise ValueError(f"Invalid visibility specifier '{visibility}' in section '{section}'")
+        max_tasks = cfg.getint(section, 'max_tasks', fallback=cls.MAX_TASKS)
+        requests_per_hour = cfg.getint(section, 'requests_per_hour', fallback=cls.REQUESTS_PER_HOUR)
+        if max_tasks < 1 or requests_per_hour < 1:
+            raise ValueError(f"Invalid 'max_tasks' or 'requests_per_hour' in section '{section}'")
+
+        return TenantConfig(
+            name=name,
+            config=ExporterConfig(github_token=cfg.get(section, 'github_token'),
+                                  gitlab_token=cfg.get(section, 'gitlab_token'),
+                                  github_read_tokens=split_tokens(cfg.get(section, 'github_read_tokens', fallback=''))),
+            projects=projects,
+            visibility=visibility,
+            max_tasks=max_tasks,
+            requests_per_hour=requests_per_hour
         )
 
 
@@ -94,13 +184,53 @@ class LineParser:
             raise ValueError(f"Invalid visibility specifier '{c}'")
 
 
+class UniqueGitHubNames:
+    """Incremental check that every GitHub name is used only once"""
+
+    def __init__(self):
+        self.lines = dict()  # GitHub name -> number of line where it was first used
+
+    def check(self, name, line_number):
+        if name in self.lines:
+            raise ValueError(f"GitHub names must be unique. "
+                             f"Name '{name}' on line {line_number} is already used on line {self.lines[name]}.")
+        self.lines[name] = line_number
+
+
+class ProjectSource:
+    """
+    Validated projects file which is parsed again on each iteration.
+    Parsed projects are produced one at a time, so they are never held in memory all at once.
+    """
+
+    def __init__(self, file, count, owned=False):
+        """:param owned: ``file`` is a temporary copy of the input, which is closed by :func:`close`"""
+        self.file = file
+        self.count = count
+        self.owned = owned
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.file.seek(0)
+        for line in self.file:
+            yield LineParser.parse(line.strip())
+
+    def close(self):
+        """Close temporary copy of the input, the input itself is closed by its owner"""
+        if self.owned:
+            self.file.close()
+
+
 class ProjectLoader:
 
     @staticmethod
-    def _check_unique_values(lines):
-        dst = list(map(lambda x: x[1], lines))
-        if len(dst) != len(set(dst)):
-            raise ValueError("GitHub names must be unique.")
+    def _parse_line(line, line_number):
+        try:
+            return LineParser.parse(line.strip())
+        except ValueError as e:
+            raise ValueError(f'{e} (line {line_number})') from e
 
     @classmethod
     def load_parsed(cls, lines):
@@ -110,25 +240,88 @@ class ProjectLoader:
         :param lines: lines of projects configuration file
         :return: parsed and validated lines of projects configuration
         """
-        lines_parsed = list(map(LineParser.parse, lines))
-        cls._check_unique_values(lines_parsed)
+        unique = UniqueGitHubNames()
+        lines_parsed = []
+        for line_number, line in enumerate(lines, start=1):
+            parsed = cls._parse_line(line, line_number)
+            unique.check(parsed[1], line_number)
+            lines_parsed.append(parsed)
         return lines_parsed
 
     @classmethod
     def load(cls, project_file):
         """
-        Load and validate application projects configuration file
+        Load and validate application projects configuration file.
+        File is validated line by line and only GitHub names are kept in memory.
+        Input which can't be read repeatedly (eg stdin) is copied to temporary file.
 
         :param project_file: text input with projects file
-        :return: same as :func:`load_parsed`
+        :return: :class:`ProjectSource` producing the same lines as :func:`load_parsed`
         """
-        lines = [x.strip() for x in project_file.read().splitlines()]
-        if len(lines) == 0:
-            raise ValueError("File is empty.")
-        return cls.load_parsed(lines)
+        seekable = project_file.seekable()
+        source = project_file if seekable else tempfile.TemporaryFile(mode='w+')
+        unique = UniqueGitHubNames()
+        count = 0
+        try:
+            for count, line in enumerate(project_file, start=1):
+                parsed = cls._parse_line(line, count)
+                unique.check(parsed[1], count)
+                if not seekable:
+                    source.write(line)
+            if count == 0:
+                raise ValueError("File is empty.")
+        except Exception:
+            if not seekable:
+                source.close()
+            raise
+        return ProjectSource(source, count, owned=not seekable)
+
+
+class ProjectSpec:
+    """Specification of one exported project"""
+
+    __slots__ = ('name_gitlab', 'name_github', 'is_private')
+
+    def __init__(self, name_gitlab, name_github, is_private):
+        self.name_gitlab = name_gitlab
+        self.name_github = name_github
+        self.is_private = is_private
+
+    @property
+    def visibility(self):
+        return 'private' if self.is_private else 'public'
+
+    def __iter__(self):
+        """Allow unpacking to GitLab name, GitHub name and visibility"""
+        return iter((self.name_gitlab, self.name_github, self.visibility))
+
+    def __eq__(self, other):
+        return isinstance(other, ProjectSpec) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f'ProjectSpec({self.name_gitlab!r}, {self.name_github!r}, {self.visibility!r})'
 
 
 class ProjectNormalizer:
+
+    @staticmethod
+    def normalize_line(p, visibility):
+        """
+        Add default project visibility to parsed line if it is not already present.
+
+        :param p: parsed line
+        :param visibility: default visibility
+        :return: :class:`ProjectSpec` of the line
+        """
+        if len(p) == 1:
+            return ProjectSpec(p[0], p[0], visibility == 'private')
+        elif len(p) == 2:
+            return ProjectSpec(p[0], p[1], visibility == 'private')
+        elif len(p) == 3:
+            return ProjectSpec(p[0], p[1], p[2] == 'private')
+        else:
+            raise ValueError(f"Line '{p}'")
+
     @classmethod
     def normalize(cls, projects, visibility):
         """
@@ -137,14 +330,13 @@ class ProjectNormalizer:
 
         :param projects: parsed projects file
         :param visibility: default visibility
-        :return: normalized parsed project file, where each projects contains visibility
+        :return: normalized parsed project file, where each project is :class:`ProjectSpec`
         """
         for i, p in enumerate(projects):
-            if len(p) == 1:
-                projects[i] = [p[0], p[0], visibility]
-            elif len(p) == 2:
-                projects[i] = [p[0], p[1], visibility]
-            elif len(p) == 3:
-                pass
-            else:
-                raise ValueError(f"Line '{p}'")
+            projects[i] = cls.normalize_line(p, visibility)
+
+    @classmethod
+    def iter_normalized(cls, projects, visibility):
+        """Same as :func:`normalize`, but lazily produce normalized lines of any iterable"""
+        for p in projects:
+            yield cls.normalize_line(p, visibility)
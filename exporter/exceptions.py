@@ -4,3 +4,28 @@ class MultipleGitLabProjectsExistException(Exception):
 
 class NoGitLabProjectsExistException(Exception):
     pass
+
+
+class StageTimeoutError(TimeoutError):
+    def __init__(self, stage, timeout):
+        super().__init__(f'Stage {stage} has not finished in {timeout:.0f} s')
+        self.stage = stage
+        self.timeout = timeout
+
+
+class GitCommandFailedError(Exception):
+    def __init__(self, command, status, stderr):
+        super().__init__(f'git {command} failed with status {status}: {stderr}')
+        self.command = command
+        self.status = status
+        self.stderr = stderr
+
+
+class VerificationFailedError(Exception):
+    MAX_LISTED = 10  # mismatches listed in the message
+
+    def __init__(self, mismatches):
+        listed = ', '.join(mismatches[:self.MAX_LISTED])
+        more = f' and {len(mismatches) - self.MAX_LISTED} more' if len(mismatches) > self.MAX_LISTED else ''
+        super().__init__(f'GitHub repository differs from GitLab: {listed}{more}')
+        self.mismatches = mismatches
@@ -0,0 +1,241 @@
+import collections
+import os
+import pathlib
+import re
+import subprocess
+import threading
+
+import git  # documentation: https://gitpython.readthedocs.io/en/stable/reference.html
+
+from .exceptions import GitCommandFailedError
+from .process import PROCESSES
+
+# all branches and tags of the clone
+PUSH_REFSPECS = ('refs/remotes/origin/*:refs/heads/*', 'refs/tags/*:refs/tags/*')
+# all branches and tags of the clone, forced where they diverged from the existing remote repository
+UPDATE_REFSPECS = ('+refs/remotes/origin/*:refs/heads/*', '+refs/tags/*:refs/tags/*')
+# flags of refs which have not been pushed, see :class:`git.remote.PushInfo`
+PUSH_FAILED = git.PushInfo.ERROR | git.PushInfo.REJECTED | git.PushInfo.REMOTE_REJECTED | git.PushInfo.REMOTE_FAILURE
+
+
+def push_refspecs(update):
+    """
+    Return refspecs of the pushes done one after another, ``None`` pushes the checked-out branch.
+    New repository gets the checked-out branch first, so GitHub makes it the default branch like on GitLab,
+    the following push of all branches and tags sends only objects which are not there yet.
+    """
+    return [list(UPDATE_REFSPECS)] if update else [None, list(PUSH_REFSPECS)]
+
+
+def proxy_env(proxy):
+    """
+    Return environment variables which make git and git-lfs send HTTP traffic through ``proxy`` URL.
+
+    ``http.proxy`` set by ``GIT_CONFIG_*`` overrides proxy configured by user, but it needs git 2.31 or newer,
+    older git ignores it and uses the proxy environment variables, which are set too.
+    """
+    index = int(os.environ.get('GIT_CONFIG_COUNT', 0))
+    return {
+        'GIT_CONFIG_COUNT': str(index + 1),
+        f'GIT_CONFIG_KEY_{index}': 'http.proxy',
+        f'GIT_CONFIG_VALUE_{index}': proxy,
+        'http_proxy': proxy,
+        'https_proxy': proxy,
+        'HTTPS_PROXY': proxy,
+        'all_proxy': proxy,
+        'no_proxy': '',  # proxy must not be bypassed for any host
+        'NO_PROXY': '',
+    }
+
+
+def parse_refs(output):
+    """Return dictionary of ref and object name listed by ``git ls-remote``"""
+    refs = {}
+    for line in output.splitlines():
+        sha, _, ref = line.partition('\t')
+        if ref:
+            refs[ref] = sha
+    return refs
+
+
+class GitPythonBackend:
+    """
+    Git operations of export tasks done by GitPython.
+
+    Repository is :class:`git.Repo`, which keeps ``git cat-file`` helper processes until :func:`close` is called.
+    """
+
+    NAME = 'gitpython'
+
+    def clone(self, url, path, progress=None, proxy=None):
+        """
+        Clone repository from ``url`` to ``path``
+
+        :param progress: function called with progress messages of the transfer, if the backend reports them
+        :param proxy: URL of HTTP proxy which the transfer goes through
+        :return: repository handle used by other methods
+        """
+        if proxy is None:
+            return git.Repo.clone_from(url, path)
+        return git.Repo.clone_from(url, path, env=proxy_env(proxy))
+
+    def lfs_fetch(self, repo, progress=None, proxy=None):
+        """Fetch all LFS objects of the repository"""
+        command = git.cmd.Git(working_dir=repo.working_dir)
+        if proxy is None:
+            command.execute(['git', 'lfs', 'fetch', '--all'])
+        else:
+            command.execute(['git', 'lfs', 'fetch', '--all'], env=proxy_env(proxy))
+
+    def ls_remote(self, url, proxy=None):
+        """Return dictionary of ref and object name of remote repository, no objects are transferred"""
+        command = git.cmd.Git()
+        if proxy is None:
+            return parse_refs(command.execute(['git', 'ls-remote', url]))
+        return parse_refs(command.execute(['git', 'ls-remote', url], env=proxy_env(proxy)))
+
+    def git_dir(self, repo):
+        return repo.git_dir
+
+    def count_objects(self, repo):
+        """Return output of ``git count-objects -v``"""
+        return repo.git.count_objects('-v')
+
+    def commit_count(self, repo):
+        """Return count of commits reachable from any ref"""
+        return int(repo.git.rev_list('--all', '--count'))
+
+    def push(self, repo, remote_name, url, progress=None, proxy=None, update=False):
+        """
+        Add remote named ``remote_name`` with ``url`` and push all branches and tags to it, see :func:`push_refspecs`
+
+        :param update: push by :data:`UPDATE_REFSPECS` into existing repository, only objects it does not have
+                       are sent
+        """
+        remote = repo.create_remote(remote_name, url)
+        repo.git.remote('set-head', 'origin', '--delete')  # origin/HEAD would be pushed as branch HEAD
+        for refspec in push_refspecs(update):
+            if proxy is None:
+                self._raise_if_rejected(remote.push(refspec=refspec))
+            else:
+                with repo.git.custom_environment(**proxy_env(proxy)):
+                    self._raise_if_rejected(remote.push(refspec=refspec))
+
+    @staticmethod
+    def _raise_if_rejected(infos):
+        """
+        Raise error if any ref has not been pushed, GitPython only logs it
+
+        :param infos: :class:`git.remote.PushInfoList` returned by push
+        :raises exporter.exceptions.GitCommandFailedError: ref rejected by GitHub, eg by protected branch or hook
+        """
+        rejected = [f'{info.remote_ref_string} {info.summary.strip()}' for info in infos if info.flags & PUSH_FAILED]
+        if rejected:
+            raise GitCommandFailedError('push', getattr(infos.error, 'status', 1), ', '.join(rejected))
+
+    def close(self, repo):
+        """Terminate helper processes and release file handles of the repository"""
+        repo.close()
+
+
+class SubprocessRepository:
+    """Cloned repository of :class:`SubprocessBackend`, it holds no process nor open file"""
+
+    __slots__ = ('working_dir',)
+
+    def __init__(self, working_dir):
+        self.working_dir = pathlib.Path(working_dir)
+
+
+class SubprocessBackend:
+    """
+    Git operations of export tasks done by running ``git`` directly.
+
+    Every command is a single process tracked by :data:`exporter.process.PROCESSES`, which is waited for before
+    the method returns, so nothing stays open after the operation. Progress of transfers is streamed line by line
+    and only the last :attr:`STDERR_LINES` lines of error output are kept for the error message.
+    """
+
+    NAME = 'subprocess'
+    STDERR_LINES = 20
+    PROGRESS = re.compile(r'^(?:remote: )?([A-Za-z ]+):\s+(\d+)%')
+    CREDENTIALS = re.compile(r'(://)[^/@\s]+@')
+    ENV = {'GIT_TERMINAL_PROMPT': '0'}  # fail instead of asking for credentials
+
+    def _run(self, args, cwd=None, progress=None, proxy=None):
+        """
+        Run ``git`` with arguments and return its standard output
+
+        :param progress: function called with ``stage percent%`` parsed from progress of the transfer
+        :param proxy: URL of HTTP proxy which the transfer goes through
+        :raises exporter.exceptions.GitCommandFailedError: git exits with non-zero status
+        """
+        env = dict(os.environ, **self.ENV)
+        if proxy is not None:
+            env.update(proxy_env(proxy))
+        process = PROCESSES.popen(['git'] + args, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, env=env)
+        stdout = []
+        reader = threading.Thread(target=lambda: stdout.append(process.stdout.read()), daemon=True)
+        reader.start()
+        stderr = collections.deque(maxlen=self.STDERR_LINES)
+        with process:
+            for line in self._lines(process.stderr):
+                stderr.append(line)
+                match = self.PROGRESS.match(line)
+                if match and progress is not None:
+                    progress(f'{match.group(1)} {match.group(2)}%')
+            reader.join()
+        if process.returncode != 0:
+            message = self.CREDENTIALS.sub(r'\1***@', ' '.join(stderr))
+            raise GitCommandFailedError(args[0], process.returncode, message)
+        return b''.join(stdout).decode(errors='replace')
+
+    @staticmethod
+    def _lines(stream):
+        """Yield lines of binary stream, progress updates ending by carriage return are separate lines"""
+        buffer = b''
+        while True:
+            chunk = stream.read1(8192) if hasattr(stream, 'read1') else stream.read(8192)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = re.split(rb'[\r\n]', buffer)
+            for line in lines:
+                if line:
+                    yield line.decode(errors='replace')
+        if buffer:
+            yield buffer.decode(errors='replace')
+
+    def clone(self, url, path, progress=None, proxy=None):
+        self._run(['clone', '--progress', url, str(path)], progress=progress, proxy=proxy)
+        return SubprocessRepository(path)
+
+    def lfs_fetch(self, repo, progress=None, proxy=None):
+        self._run(['lfs', 'fetch', '--all'], cwd=repo.working_dir, progress=progress, proxy=proxy)
+
+    def ls_remote(self, url, proxy=None):
+        return parse_refs(self._run(['ls-remote', url], proxy=proxy))
+
+    def git_dir(self, repo):
+        return repo.working_dir / '.git'
+
+    def count_objects(self, repo):
+        return self._run(['count-objects', '-v'], cwd=repo.working_dir).strip()
+
+    def commit_count(self, repo):
+        return int(self._run(['rev-list', '--all', '--count'], cwd=repo.working_dir))
+
+    def push(self, repo, remote_name, url, progress=None, proxy=None, update=False):
+        self._run(['remote', 'add', remote_name, url], cwd=repo.working_dir)
+        self._run(['remote', 'set-head', 'origin', '--delete'], cwd=repo.working_dir)
+        for refspecs in push_refspecs(update):
+            self._run(['push', '--progress', '--porcelain', remote_name] + (refspecs or []), cwd=repo.working_dir,
+                      progress=progress, proxy=proxy)
+
+    def close(self, repo):
+        pass
+
+
+GIT_PYTHON = GitPythonBackend()
+GIT_BACKENDS = {backend.NAME: backend for backend in (GIT_PYTHON, SubprocessBackend())}
@@ -1,7 +1,11 @@
+import itertools
 import random
 import pathlib
+import queue
 import shutil
 import string
+import threading
+import time
 
 import click
 
@@ -29,18 +33,147 @@ def ensure_tmp_dir(path):
     return p
 
 
-# credit to Carl F.:  https://stackoverflow.com/a/8290508/6784881
 def split_to_batches(iterable, n=1):
-    """Split iterable to batched of given size"""
-    l = len(iterable)
-    for ndx in range(0, l, n):
-        yield iterable[ndx:min(ndx + n, l)]
-
-
-def flatten(t):
-    """Flatten list of lists"""
-    flat_list = []
-    for sublist in t:
-        for item in sublist:
-            flat_list.append(item)
-    return flat_list
+    """
+    Lazily split iterable to batches (lists) of given size. Next batch is read only when requested.
+
+    :param n: size of batches or function returning size of the next batch
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, n() if callable(n) else n))
+        if not batch:
+            return
+        yield batch
+
+
+def run_concurrently(functions, workers, timeout=None):
+    """
+    Call given functions on at most ``workers`` daemon threads and wait until they finish.
+    Functions which did not finish before ``timeout`` are abandoned, so waiting for them is bounded.
+    Abandoned functions which have not started yet are never called, running ones are left to finish on their own.
+
+    :param functions: list of callables taking no arguments
+    :param workers: maximum count of simultaneously running functions
+    :param timeout: seconds to wait for all functions to finish, ``None`` waits forever
+    :return: list with exception raised by each function (``None`` on success)
+             or :class:`TimeoutError` if function did not finish in time
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    results = [None] * len(functions)
+    finished = [False] * len(functions)
+    unfinished = [len(functions)]
+    abandoned = [False]
+    pending = queue.Queue()
+    for i, fn in enumerate(functions):
+        pending.put((i, fn))
+    cond = threading.Condition()
+
+    def worker():
+        while True:
+            with cond:  # nothing is started once the caller has given up waiting
+                if abandoned[0] or deadline is not None and time.monotonic() >= deadline:
+                    return
+                try:
+                    i, fn = pending.get_nowait()
+                except queue.Empty:
+                    return
+            try:
+                fn()
+                result = None
+            except Exception as e:
+                result = e
+            with cond:
+                results[i] = result
+                finished[i] = True
+                unfinished[0] -= 1
+                cond.notify_all()
+
+    for _ in range(min(workers, len(functions))):
+        threading.Thread(target=worker, daemon=True).start()
+
+    with cond:
+        while unfinished[0]:
+            if deadline is None:
+                cond.wait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                cond.wait(remaining)
+        abandoned[0] = True
+        return [r if f else TimeoutError('Not finished in time') for r, f in zip(results, finished)]
+
+
+class TokenBucket:
+    """
+    Token bucket limiting rate of operations shared by many threads.
+
+    Amount bigger than :attr:`capacity` is taken as soon as the bucket is full and later operations wait
+    until the debt is repaid, so big amounts do not block forever.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: tokens added per second
+        :param capacity: maximum count of tokens which can be taken at once after a pause
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Wait until ``amount`` of tokens is available and take it from the bucket"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                needed = min(amount, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class RequestBudget(TokenBucket):
+    """
+    Token bucket limiting rate of API requests made with one token.
+    Budget is shared by all clients of the token, so their requests together stay under :attr:`per_hour`.
+    """
+
+    def __init__(self, per_hour, burst=None):
+        """
+        :param per_hour: maximum count of requests per hour
+        :param burst: count of requests which can be made at once after a pause, one minute of budget by default
+        """
+        super().__init__(per_hour / 3600, burst if burst is not None else max(1.0, per_hour / 60))
+
+
+class NullRequestBudget:
+    """Budget which does not limit requests"""
+
+    def acquire(self, amount=1):
+        pass
+
+
+NULL_BUDGET = NullRequestBudget()
+
+
+def format_bytes(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def format_duration(seconds):
+    """Return duration rounded to minutes or seconds, eg ``2h 05m``"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}h {minutes:02d}m'
+    return f'{minutes}m {seconds:02d}s' if minutes else f'{seconds}s'
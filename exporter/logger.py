@@ -1,23 +1,57 @@
+import atexit
 import logging
+import logging.handlers
 import pathlib
+import queue
 import time
 
 
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler which only puts records to a queue, formatting is left to the handlers
+    of :class:`logging.handlers.QueueListener`, so logging threads never wait for disk and never spend time formatting.
+    """
+
+    def prepare(self, record):
+        return record
+
+
 class ExporterLogger:
-    """Logging wrapper for saving logs and specifying log format"""
+    """Logging wrapper for saving logs and specifying log format.
+    Logs are written to file by a background thread of :class:`logging.handlers.QueueListener`."""
 
-    def __init__(self, debug=True, log_dir=None, log_file=None):
+    BACKUP_COUNT = 5  # count of kept rotated log files
+
+    def __init__(self, debug=True, log_dir=None, log_file=None, max_bytes=0):
         self.log_dir = pathlib.Path(log_dir or 'logs')
         self.log_file = log_file or time.strftime("%d%m%Y_%H%M%S")
         self.log_dir.mkdir(exist_ok=True, parents=True)
         self.level = logging.DEBUG if debug else logging.INFO
-        logging.basicConfig(
-            filename=(self.log_dir / self.log_file).with_suffix(".log"),
-            filemode='w',
-            level=self.level,
-            format='%(asctime)s: %(message)s',
-            datefmt='%d-%m-%Y %H:%M:%S %Z %z'
+        self.file_handler = logging.handlers.RotatingFileHandler(
+            (self.log_dir / self.log_file).with_suffix(".log"),
+            maxBytes=max_bytes,
+            backupCount=self.BACKUP_COUNT
         )
+        self.file_handler.setFormatter(
+            logging.Formatter(fmt='%(asctime)s: %(message)s', datefmt='%d-%m-%Y %H:%M:%S %Z %z'))
+        log_queue = queue.Queue()
+        self.listener = logging.handlers.QueueListener(log_queue, self.file_handler)
+        self.listener.start()
+        self.handler = DeferredQueueHandler(log_queue)
+        self.closed = False
+        root = logging.getLogger()
+        root.setLevel(self.level)
+        root.addHandler(self.handler)
+        atexit.register(self.close)
 
     def info(self, msg):
         logging.info(msg)
+
+    def close(self):
+        """Write all pending logs, logging after this is ignored"""
+        if self.closed:
+            return
+        self.closed = True
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+        self.file_handler.close()
@@ -0,0 +1,231 @@
+import datetime
+import json
+import os
+import requests
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import ProjectSpec
+from .exceptions import MultipleGitLabProjectsExistException, NoGitLabProjectsExistException
+from .helpers import split_to_batches
+from .logic import Exporter, GitLabProject, TaskFetchGitlabProject
+
+
+class PlannedProject(ProjectSpec):
+    """Project with results of lookups done by :class:`Planner`, so its export does not repeat them"""
+
+    EXPORT = 'export'
+    OVERWRITE = 'overwrite'
+    UPDATE = 'update'
+    SKIP = 'skip'
+    ERROR = 'error'
+
+    __slots__ = ('gitlab_project', 'github_exists', 'error')
+
+    def __init__(self, name_gitlab, name_github, is_private, gitlab_project=None, github_exists=None, error=None):
+        """
+        :param gitlab_project: :class:`exporter.logic.GitLabProject` or ``None`` if it has not been resolved
+        :param github_exists: whether GitHub repository exists, ``None`` if it is not known
+        :param error: why the project can't be exported
+        """
+        super().__init__(name_gitlab, name_github, is_private)
+        self.gitlab_project = gitlab_project
+        self.github_exists = github_exists
+        self.error = error
+
+    def action(self, conflict_policy):
+        """Return what export of the project is going to do"""
+        if self.error is not None:
+            return self.ERROR
+        if self.github_exists:
+            return {'skip': self.SKIP, 'update': self.UPDATE}.get(conflict_policy, self.OVERWRITE)
+        return self.EXPORT
+
+    @property
+    def size(self):
+        """Bytes of repository and LFS objects"""
+        if self.gitlab_project is None:
+            return 0
+        return self.gitlab_project.repository_size + self.gitlab_project.lfs_objects_size
+
+    def as_dict(self):
+        return {
+            'gitlab': self.name_gitlab,
+            'github': self.name_github,
+            'visibility': self.visibility,
+            'github_exists': self.github_exists,
+            'error': self.error,
+            'project': self.gitlab_project.as_dict() if self.gitlab_project is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            name_gitlab=d['gitlab'],
+            name_github=d['github'],
+            is_private=d['visibility'] == 'private',
+            gitlab_project=GitLabProject.from_dict(d['project']) if d.get('project') else None,
+            github_exists=d.get('github_exists'),
+            error=d.get('error')
+        )
+
+
+class Plan:
+    """
+    Projects to export with results of their lookups and estimates of the export.
+
+    Estimates assume each project is transferred twice (clone and push) at ``min_rate`` bytes per second,
+    projects run in batches of ``batch_size`` like in :class:`exporter.logic.Exporter` and clones are kept
+    in the tmp directory until the export ends, with working tree about as big as the repository.
+    """
+
+    VERSION = 1
+
+    def __init__(self, github_login, conflict_policy, batch_size, min_rate, projects, created=None):
+        self.github_login = github_login
+        self.conflict_policy = conflict_policy
+        self.batch_size = batch_size
+        self.min_rate = min_rate
+        self.projects = projects  # list of :class:`PlannedProject`
+        self.created = created or datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def runnable(self):
+        """Return projects which can be exported"""
+        return [p for p in self.projects if p.action(self.conflict_policy) != PlannedProject.ERROR]
+
+    def _transferred(self):
+        return [p for p in self.projects if p.action(self.conflict_policy) in (PlannedProject.EXPORT,
+                                                                               PlannedProject.OVERWRITE,
+                                                                               PlannedProject.UPDATE)]
+
+    @property
+    def total_bytes(self):
+        return sum(p.size for p in self._transferred())
+
+    @property
+    def disk_bytes(self):
+        return 2 * self.total_bytes
+
+    @property
+    def transfer_seconds(self):
+        """Estimated duration of the export, each batch lasts as long as transfer of its biggest project"""
+        if not self.min_rate:
+            return None
+        return sum(max(2 * p.size / self.min_rate for p in batch)
+                   for batch in split_to_batches(self.runnable(), self.batch_size) if batch)
+
+    def actions(self):
+        """Return dictionary of action and count of projects"""
+        counts = {}
+        for p in self.projects:
+            action = p.action(self.conflict_policy)
+            counts[action] = counts.get(action, 0) + 1
+        return counts
+
+    def as_dict(self):
+        return {
+            'version': self.VERSION,
+            'created': self.created,
+            'github_login': self.github_login,
+            'conflict_policy': self.conflict_policy,
+            'batch_size': self.batch_size,
+            'min_rate': self.min_rate,
+            'estimate': {
+                'actions': self.actions(),
+                'bytes': self.total_bytes,
+                'disk_bytes': self.disk_bytes,
+                'transfer_seconds': self.transfer_seconds,
+            },
+            'projects': [dict(p.as_dict(), action=p.action(self.conflict_policy)) for p in self.projects],
+        }
+
+    def save(self, path):
+        """Write plan to JSON file, replacing it at once"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.plan')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, file):
+        """
+        Load plan saved by :func:`save`
+
+        :param file: text input with the plan
+        """
+        d = json.load(file)
+        if d.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported plan version {d.get('version')!r}")
+        return cls(
+            github_login=d['github_login'],
+            conflict_policy=d['conflict_policy'],
+            batch_size=d['batch_size'],
+            min_rate=d['min_rate'],
+            projects=[PlannedProject.from_dict(p) for p in d['projects']],
+            created=d['created']
+        )
+
+
+class Planner:
+    """
+    Make :class:`Plan` without changing anything on GitLab and GitHub.
+
+    GitLab projects are resolved and GitHub names are checked by at most :attr:`workers` threads at once,
+    clients which work in batches resolve and check whole batches at once.
+    """
+
+    def __init__(self, gitlab, github, workers):
+        self.gitlab = gitlab
+        self.github = github
+        self.workers = workers
+        self._local = threading.local()
+
+    def _clients(self):
+        """Return GitLab and GitHub clients owned by the current thread"""
+        if not hasattr(self._local, 'clients'):
+            self._local.clients = (self.gitlab.clone(), self.github.clone())
+        return self._local.clients
+
+    def _resolve(self, project, resolved):
+        """Return GitLab project and error, failed request is an error of the project only"""
+        if project.name_gitlab in resolved:
+            return resolved[project.name_gitlab], None
+        try:
+            return TaskFetchGitlabProject.find_project(self._clients()[0], project.name_gitlab), None
+        except (NoGitLabProjectsExistException, MultipleGitLabProjectsExistException) as e:
+            return None, str(e)
+        except requests.RequestException as e:
+            return None, f'GitLab project {project.name_gitlab} has not been found: {e}'
+
+    def _exists(self, project, owner, exist):
+        """Return whether GitHub repository exists and error, failed request is an error of the project only"""
+        if project.name_github in exist:
+            return exist[project.name_github], None
+        try:
+            return self._clients()[1].repo_exists(project.name_github, owner), None
+        except requests.RequestException as e:
+            return None, f'GitHub repository {project.name_github} has not been checked: {e}'
+
+    def plan(self, projects, conflict_policy, batch_size, min_rate):
+        """
+        :param projects: iterable of :class:`exporter.config.ProjectSpec`
+        :return: :class:`Plan` of the projects
+        """
+        projects = list(projects)
+        owner = self.github.login
+        resolved = Exporter._resolve_gitlab_projects(self.gitlab, projects)
+        exist = {}
+        if getattr(self.github, 'BATCHED', False):
+            exist = self.github.repos_exist([p.name_github for p in projects], owner)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            resolutions = executor.map(lambda p: self._resolve(p, resolved), projects)
+            existences = executor.map(lambda p: self._exists(p, owner, exist), projects)
+            planned = [PlannedProject(p.name_gitlab, p.name_github, p.is_private, gitlab_project=gitlab_project,
+                                      github_exists=exists, error=resolve_error or exists_error)
+                       for p, (gitlab_project, resolve_error), (exists, exists_error)
+                       in zip(projects, resolutions, existences)]
+        return Plan(github_login=owner, conflict_policy=conflict_policy, batch_size=batch_size, min_rate=min_rate,
+                    projects=planned)
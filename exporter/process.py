@@ -0,0 +1,255 @@
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from functools import partial
+
+from .exceptions import StageTimeoutError
+
+log = logging.getLogger(__name__)
+
+
+class ProcessRegistry:
+    """
+    Git subprocesses started by GitPython or :class:`exporter.gitbackend.SubprocessBackend`, grouped by their owner.
+
+    Owner is set for the current thread by :func:`owned_by`, processes started outside of it are not tracked.
+    Tracked processes are started in their own session, so the whole process group including git helpers
+    (``git-remote-https``, ``git-lfs``) can be terminated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._processes = {}  # owner -> list of started processes
+        self._installed = False
+
+    def install(self):
+        """Start tracking processes created by GitPython"""
+        import git  # slow to import, processes are not tracked until some task runs
+        with self._lock:
+            if self._installed:
+                return
+            for name in ('safer_popen', 'Popen'):  # newer GitPython starts processes by safer_popen
+                original = getattr(git.cmd, name, None)
+                if original is not None:
+                    setattr(git.cmd, name, partial(self._popen, original))
+            self._installed = True
+
+    def _popen(self, popen, *args, **kwargs):
+        owner = self.current_owner()
+        if owner is None:
+            return popen(*args, **kwargs)
+        if os.name == 'posix':
+            kwargs.setdefault('start_new_session', True)
+        process = popen(*args, **kwargs)
+        with self._lock:
+            processes = self._processes.setdefault(owner, [])
+            processes[:] = [p for p in processes if p.poll() is None]
+            processes.append(process)
+        return process
+
+    def popen(self, *args, **kwargs):
+        """Start process by :class:`subprocess.Popen`, tracked like processes started by GitPython"""
+        return self._popen(subprocess.Popen, *args, **kwargs)
+
+    def current_owner(self):
+        return getattr(self._local, 'owner', None)
+
+    @contextlib.contextmanager
+    def owned_by(self, owner):
+        """Track processes started by the current thread as processes of ``owner``"""
+        self.install()
+        self._local.owner = owner
+        try:
+            yield
+        finally:
+            self._local.owner = None
+            with self._lock:
+                self._processes.pop(owner, None)
+
+    def running(self, owner):
+        """Return running processes of ``owner``"""
+        with self._lock:
+            return [p for p in self._processes.get(owner, ()) if p.poll() is None]
+
+    @staticmethod
+    def _signal(process, sig):
+        try:
+            if os.name == 'posix':
+                os.killpg(process.pid, sig)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass  # already finished
+
+    def interrupt(self, owner):
+        """Ask running processes of ``owner`` to terminate, without waiting for them"""
+        for p in self.running(owner):
+            self._signal(p, signal.SIGTERM)
+
+    def terminate(self, owners, grace):
+        """
+        Terminate all running processes of ``owners``, processes which do not end in ``grace`` seconds are killed
+
+        :return: count of terminated processes
+        """
+        processes = [p for owner in owners for p in self.running(owner)]
+        for p in processes:
+            self._signal(p, signal.SIGTERM)
+        deadline = time.monotonic() + grace
+        for p in processes:
+            try:
+                p.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self._signal(p, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        return len(processes)
+
+
+PROCESSES = ProcessRegistry()
+
+
+class StageDeadlines:
+    """
+    Maximum durations of task stages in seconds, ``0`` disables the deadline.
+    Deadline of stages transferring data is prolonged by the time needed to transfer known size at :attr:`min_rate`.
+    """
+
+    STAGES = ('resolve', 'clone', 'lfs', 'create', 'push', 'verify')
+    TRANSFER_STAGES = ('clone', 'lfs', 'push')
+    DEFAULTS = {'resolve': 120.0, 'clone': 600.0, 'lfs': 600.0, 'create': 120.0, 'push': 600.0, 'verify': 120.0}
+    MIN_RATE = 100 * 1024  # bytes per second
+
+    def __init__(self, timeouts=None, min_rate=MIN_RATE):
+        """
+        :param timeouts: dictionary of stage name and its deadline, overrides :attr:`DEFAULTS`
+        :param min_rate: bytes per second, ``0`` disables prolonging by size
+        """
+        self.timeouts = dict(self.DEFAULTS)
+        self.timeouts.update(timeouts or {})
+        self.min_rate = min_rate
+
+    def timeout(self, stage, size=0):
+        """
+        :param stage: stage name
+        :param size: bytes transferred by the stage, if known
+        :return: seconds or ``None`` if the stage has no deadline
+        """
+        timeout = self.timeouts.get(stage)
+        if not timeout:
+            return None
+        if size and self.min_rate and stage in self.TRANSFER_STAGES:
+            timeout += size / self.min_rate
+        return timeout
+
+
+class _Watch:
+    __slots__ = ('owner', 'stage', 'timeout', 'expired', 'done')
+
+    def __init__(self, owner, stage, timeout):
+        self.owner = owner
+        self.stage = stage
+        self.timeout = timeout
+        self.expired = False
+        self.done = False
+
+
+class Watchdog:
+    """
+    Thread enforcing deadlines of task stages.
+
+    When a stage exceeds its deadline, git processes of its owner are terminated, so the blocked git command fails
+    and the stage raises :class:`exporter.exceptions.StageTimeoutError` instead of hanging the whole batch.
+    Stages without git processes (HTTP requests) fail by timeout of their requests.
+    """
+
+    GRACE = 5.0  # seconds between SIGTERM and SIGKILL
+
+    def __init__(self, deadlines, processes=PROCESSES):
+        self.deadlines = deadlines
+        self.processes = processes
+        self._heap = []  # (deadline, sequence number, watch)
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    @contextlib.contextmanager
+    def watch(self, stage, size=0):
+        """Enforce deadline of the stage running inside this context"""
+        timeout = self.deadlines.timeout(stage, size)
+        if timeout is None:
+            yield
+            return
+        watch = _Watch(self.processes.current_owner(), stage, timeout)
+        self._add(time.monotonic() + timeout, watch)
+        try:
+            yield
+        except Exception as e:
+            if watch.expired:
+                raise StageTimeoutError(stage, timeout) from e
+            raise
+        finally:
+            watch.done = True
+
+    def _add(self, deadline, watch):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='watchdog', daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (deadline, next(self._counter), watch))
+            self._condition.notify()
+
+    def _next_expired(self):
+        """Wait for the next expired stage, return ``None`` when stopped"""
+        with self._condition:
+            while not self._stopped:
+                while self._heap and self._heap[0][2].done:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay <= 0:
+                    return heapq.heappop(self._heap)[2]
+                self._condition.wait(delay)
+            return None
+
+    def _run(self):
+        while True:
+            watch = self._next_expired()
+            if watch is None:
+                return
+            watch.expired = True
+            log.warning('%s: %s exceeded deadline of %.0f s', watch.owner and watch.owner.id, watch.stage,
+                        watch.timeout)
+            if watch.owner is not None:
+                threading.Thread(target=self.processes.terminate, args=((watch.owner,), self.GRACE),
+                                 daemon=True).start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class NullWatchdog:
+    """Watchdog which does not enforce any deadline"""
+
+    @contextlib.contextmanager
+    def watch(self, stage, size=0):
+        yield
+
+    def stop(self):
+        pass
+
+
+NULL_WATCHDOG = NullWatchdog()
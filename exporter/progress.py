@@ -0,0 +1,186 @@
+import collections
+import itertools
+import threading
+import time
+
+from .helpers import format_bytes, format_duration
+from .logic import TaskBase, TaskProgressBarPool
+
+SUCCESS_MESSAGES = ('DONE', 'SKIPPED')  # final messages of tasks which did not fail
+
+
+class PanelBar:
+    """Progress bar API of one task shown by :class:`ProgressPanel`, every call is a constant time update"""
+
+    __slots__ = ('panel', 'batch', 'name', 'count', 'total', 'finished')
+
+    def __init__(self, panel, batch, name, total):
+        self.panel = panel
+        self.batch = batch
+        self.name = name
+        self.count = 0
+        self.total = total
+        self.finished = False
+
+    def update(self):
+        self.count = min(self.count + 1, self.total)
+
+    def set_msg(self, msg):
+        self.panel._set_active(self, msg)
+
+    def set_msg_and_update(self, msg):
+        self.set_msg(msg)
+        self.update()
+
+    def set_msg_and_finish(self, msg):
+        self.panel._finish(self, msg)
+
+    def set_finished(self):
+        self.panel._finish(self, None)
+
+    def is_finished(self):
+        return self.finished
+
+    def add_bytes(self, count):
+        self.panel._add_bytes(count)
+
+    def refresh(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ProgressPanel:
+    """
+    Fixed height progress view of the whole export, which does not grow with count of tasks.
+
+    It shows counts of finished tasks by their final message, rates of exported repositories and bytes with ETA
+    if the total is known, messages of the first :attr:`active_lines` running tasks and the last
+    :attr:`failure_lines` failures. Tasks update only counters and dictionaries, the view is redrawn at most
+    once per :attr:`INTERVAL` by :class:`TaskProgressPanel`.
+    """
+
+    INTERVAL = 0.2  # seconds between redraws
+
+    def __init__(self, total=None, active_lines=10, failure_lines=5):
+        """
+        :param total: count of projects which will be exported, ``None`` if not known
+        :param active_lines: count of lines showing running tasks
+        :param failure_lines: count of lines showing recent failures
+        """
+        import enlighten  # slow to import, only exports with progress view need it
+        self.total = total
+        self.active_lines = active_lines
+        self.manager = enlighten.get_manager()
+        self.lines = [self.manager.status_bar('', leave=False) for _ in range(1 + active_lines + 1 + failure_lines)]
+        self.statuses = collections.Counter()  # final message -> count of tasks
+        self.active = {}  # running :class:`PanelBar` -> its last message, in order of start
+        self.failures = collections.deque(maxlen=failure_lines)  # (task name, final message)
+        self.finished = 0
+        self.bytes = 0
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def register(self, name, total, initial_message, batch=None):
+        """Return :class:`PanelBar` of new task, it is not shown until it gets message other than the initial"""
+        return PanelBar(self, batch, name, total)
+
+    def batch(self):
+        """Return :class:`TaskProgressPanel` of the next batch"""
+        return TaskProgressPanel(self)
+
+    def _set_active(self, bar, msg):
+        with self._lock:
+            if not bar.finished:
+                self.active[bar] = msg
+
+    def _finish(self, bar, msg):
+        with self._lock:
+            if bar.finished:
+                return
+            bar.finished = True
+            bar.count = bar.total
+            msg = msg or self.active.get(bar) or 'DONE'
+            self.active.pop(bar, None)
+            self.statuses[msg] += 1
+            self.finished += 1
+            if msg not in SUCCESS_MESSAGES:
+                self.failures.append((bar.name, msg))
+            if bar.batch is not None:
+                bar.batch.finished()
+
+    def _add_bytes(self, count):
+        with self._lock:
+            self.bytes += count
+
+    def render(self):
+        """Return lines of the view"""
+        with self._lock:
+            statuses = list(self.statuses.items())
+            active = list(itertools.islice(self.active.items(), self.active_lines))
+            running = len(self.active)
+            failures = list(self.failures)
+            finished, transferred = self.finished, self.bytes
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        summary = [f'{finished}/{self.total}' if self.total is not None else f'{finished}', f'running {running}']
+        summary += [f'{msg} {count}' for msg, count in statuses]
+        summary += [f'{finished / elapsed * 60:.1f} repos/min', f'{format_bytes(transferred / elapsed)}/s']
+        if self.total is not None and finished:
+            summary.append(f'ETA {format_duration((self.total - finished) * elapsed / finished)}')
+        lines = [' | '.join(summary)]
+        lines += [f'  {bar.name} {bar.count}/{bar.total} {msg}' for bar, msg in active]
+        if running > self.active_lines:
+            lines[-1] = f'  ... and {running - self.active_lines + 1} more'
+        lines += [''] * (1 + self.active_lines - len(lines))
+        lines.append('Recent failures:' if failures else '')
+        lines += [f'  {name} {msg}' for name, msg in reversed(failures)]
+        return lines + [''] * (len(self.lines) - len(lines))
+
+    def refresh(self):
+        """Redraw the view, its cost depends only on its height"""
+        for line, text in zip(self.lines, self.render()):
+            line.update(text, force=True)
+
+    def close(self):
+        self.refresh()
+        for line in self.lines:
+            line.close()
+        self.manager.stop()
+
+
+class TaskProgressPanel(TaskBase):
+    """Task redrawing :class:`ProgressPanel` until all tasks of its batch are finished"""
+
+    ID = TaskProgressBarPool.ID
+    id = ID
+
+    __slots__ = ('panel', 'unfinished', '_done')
+
+    def __init__(self, panel):
+        super().__init__()
+        self.panel = panel
+        self.unfinished = 0
+        self._done = threading.Event()
+
+    def register(self, name, total, initial_message):
+        """Return :class:`PanelBar` of new task of the batch"""
+        self.unfinished += 1
+        return self.panel.register(name, total, initial_message, batch=self)
+
+    def finished(self):
+        """Called by bar of the batch when its task finishes, under lock of the panel"""
+        self.unfinished -= 1
+        if self.unfinished <= 0:
+            self._done.set()
+
+    def run(self):
+        self.running = True
+        self.panel.refresh()
+        while self.unfinished > 0 and self.running and not self._done.wait(self.panel.INTERVAL):
+            self.panel.refresh()
+        self.panel.refresh()
+
+    def stop(self):
+        super().stop()
+        self._done.set()
@@ -0,0 +1,126 @@
+import csv
+import json
+import threading
+import time
+
+from abc import ABC, abstractmethod
+
+from .logic import NullReportSink, TaskStatus
+
+STAGES = ('check', 'delete', 'resolve', 'clone', 'lfs', 'create', 'push', 'verify', 'rollback')
+
+
+class ReportSink(ABC):
+    """
+    Machine readable report of the export.
+    Record of each task is written and flushed as soon as the task finishes, so the report can be followed
+    while the export is running and it is not lost when the export dies.
+
+    Task gets a ``run`` record when its export finishes and another ``rollback`` record if it is rollbacked.
+    Projects which have not been started get a ``run`` record with ``NOT_RUNNED`` status.
+    """
+
+    FIELDS = ('time', 'event', 'gitlab', 'github', 'status', 'durations', 'bytes', 'exception_type', 'exception')
+
+    def __init__(self, file):
+        self.file = file
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def record(task, event):
+        """
+        Make report record of the task
+
+        :param task: :class:`exporter.logic.TaskExportProject`
+        :param event: ``run`` or ``rollback``
+        :return: dictionary with :attr:`FIELDS`
+        """
+        e = task.exception
+        return {
+            'time': time.time(),
+            'event': event,
+            'gitlab': task.name_gitlab,
+            'github': task.name_github,
+            'status': TaskStatus.names(task.status),
+            'durations': {stage: round(duration, 3) for stage, duration in task.durations.items()},
+            'bytes': task.size,
+            'exception_type': type(e).__name__ if e is not None else None,
+            'exception': str(e) if e is not None else None,
+        }
+
+    @staticmethod
+    def not_runned_record(project):
+        """Make report record of :class:`exporter.config.ProjectSpec` whose export has not been started"""
+        return {
+            'time': time.time(),
+            'event': 'run',
+            'gitlab': project.name_gitlab,
+            'github': project.name_github,
+            'status': ['NOT_RUNNED'],
+            'durations': {},
+            'bytes': 0,
+            'exception_type': None,
+            'exception': None,
+        }
+
+    def write(self, task, event='run'):
+        self._write_flushed(self.record(task, event))
+
+    def write_not_runned(self, project):
+        self._write_flushed(self.not_runned_record(project))
+
+    def _write_flushed(self, record):
+        with self.lock:
+            self._write(record)
+            self.file.flush()
+
+    @abstractmethod
+    def _write(self, record):
+        pass
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesReportSink(ReportSink):
+    """Report with one JSON object per line"""
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+
+class CsvReportSink(ReportSink):
+    """Report with one CSV row per record, statuses are separated by ``:`` and each stage has its own column"""
+
+    def __init__(self, file):
+        super().__init__(file)
+        columns = [f for f in self.FIELDS if f != 'durations'] + [f'duration_{stage}' for stage in STAGES]
+        self.writer = csv.DictWriter(file, fieldnames=columns)
+        self.writer.writeheader()
+        self.file.flush()
+
+    def _write(self, record):
+        durations = record.pop('durations')
+        record['status'] = ':'.join(record['status'])
+        for stage in STAGES:
+            record[f'duration_{stage}'] = durations.get(stage)
+        self.writer.writerow(record)
+
+
+FORMATS = {
+    'jsonl': JsonLinesReportSink,
+    'csv': CsvReportSink,
+}
+
+
+def open_report_sink(path, report_format):
+    """
+    Open report file
+
+    :param path: path of the report file, ``None`` disables the report
+    :param report_format: one of :data:`FORMATS`
+    :return: report sink
+    """
+    if path is None:
+        return NullReportSink()
+    return FORMATS[report_format](open(path, 'w', newline='' if report_format == 'csv' else None))
@@ -0,0 +1,74 @@
+import logging
+import pathlib
+import shutil
+import tempfile
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class MemoryStaging:
+    """
+    Placement of clones of small repositories in memory backed directory, eg tmpfs mounted at ``/dev/shm``.
+
+    Repository goes to memory if its size reported by GitLab is known and at most :attr:`threshold` bytes and
+    its estimated space fits to what is left of :attr:`budget`. Other repositories go to the temporary directory
+    on disk. Clone needs more space than the reported size, because the working tree is checked out next
+    to the objects, so :attr:`SIZE_FACTOR` times the size is reserved.
+    """
+
+    SIZE_FACTOR = 3
+
+    def __init__(self, directory, threshold, budget):
+        """
+        :param directory: memory backed directory, clones are placed in its new subdirectory
+        :param threshold: bytes of the largest repository placed in memory
+        :param budget: bytes of memory used by all clones at once, lowered to free space of ``directory``
+        """
+        free = shutil.disk_usage(directory).free
+        if budget > free:
+            log.warning('Memory staging budget %d B lowered to free space %d B of %s', budget, free, directory)
+        self.directory = pathlib.Path(tempfile.mkdtemp(prefix='exporter-', dir=directory))
+        self.threshold = threshold
+        self.budget = min(budget, free)
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def place(self, size):
+        """
+        Return directory for clone of repository and bytes reserved for it, ``None`` directory if it goes to disk
+
+        :param size: bytes of repository including LFS objects reported by GitLab, ``0`` if not known
+        """
+        reserved = size * self.SIZE_FACTOR
+        if not 0 < size <= self.threshold:
+            return None, 0
+        with self._lock:
+            if self.used + reserved > self.budget:
+                return None, 0
+            self.used += reserved
+        return self.directory, reserved
+
+    def release(self, reserved):
+        """Return space of removed clone to the budget"""
+        with self._lock:
+            self.used -= reserved
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class DiskStaging:
+    """Placement of all clones in the temporary directory on disk"""
+
+    def place(self, size):
+        return None, 0
+
+    def release(self, reserved):
+        pass
+
+    def close(self):
+        pass
+
+
+DISK_STAGING = DiskStaging()
@@ -0,0 +1,192 @@
+import itertools
+import logging
+import shutil
+
+import click
+from requests.adapters import HTTPAdapter
+
+from .cache import CachingAdapter
+from .config import ProjectLoader, ProjectNormalizer
+from .gitbackend import GIT_PYTHON
+from .helpers import RequestBudget, ensure_tmp_dir
+from .logic import Exporter, ExporterPrinter, GitHubClient, GitHubTokenPool, GitLabClient, NULL_REPORT_SINK
+from .process import StageDeadlines, Watchdog
+from .staging import DISK_STAGING
+from .watch import SyncScheduler
+
+log = logging.getLogger(__name__)
+
+
+def token_groups(config):
+    """Return scheduler groups of GitLab and GitHub token of :class:`exporter.config.TenantConfig`"""
+    return ('gitlab', config.config.gitlab_token), ('github', config.config.github_token)
+
+
+class Tenant:
+    """Exporter of one tenant with projects to export and results of finished exports"""
+
+    def __init__(self, config, exporter):
+        """
+        :param config: :class:`exporter.config.TenantConfig`
+        :param exporter: :class:`exporter.logic.Exporter` with clients of the tenant tokens
+        """
+        self.config = config
+        self.exporter = exporter
+        self.groups = token_groups(config)
+        self.tasks = []  # started tasks
+        self.not_runned = []  # projects whose export has not been started
+        self.error = None  # exception raised while listing projects of the tenant
+
+    @property
+    def name(self):
+        return self.config.name
+
+    def projects(self):
+        """Lazily yield normalized projects of the tenant, all projects of GitLab token are listed if needed"""
+        projects = self.config.projects
+        if projects is None:
+            owned = self.exporter.gitlab.get_all_owned_projects()
+            projects = ProjectLoader.load_parsed(p['path'] for p in owned)
+        for p in projects:
+            yield ProjectNormalizer.normalize_line(p, self.config.visibility)
+
+
+class MultiExporter:
+    """
+    Export projects of many tenants by one :class:`exporter.watch.SyncScheduler`.
+
+    Each GitLab and GitHub token runs at most ``max_tasks`` exports at once and makes at most ``requests_per_hour``
+    API requests, also when it is used by several tenants. All clients share one connection pool and the HTTP cache,
+    whose entries are keyed by token.
+    """
+
+    PENDING_PER_WORKER = 2  # projects waiting in the scheduler per worker, so projects are listed lazily
+
+    def __init__(self, tenants, logger, debug, workers, report_sink=None, cache=None, git_backend=GIT_PYTHON,
+                 verify_slots=None, staging=DISK_STAGING):
+        """
+        :param tenants: list of :class:`exporter.config.TenantConfig`
+        :param workers: maximum count of simultaneously running exports of all tenants
+        :param cache: :class:`exporter.cache.HttpCache` shared by all tenants
+        :param git_backend: git backend of :mod:`exporter.gitbackend` used by all tenants
+        :param verify_slots: semaphore bounding verifications of pushed repositories of all tenants
+        :param staging: :class:`exporter.staging.MemoryStaging` whose budget is shared by all tenants
+        """
+        self.logger = logger
+        self.workers = workers
+        self.report_sink = report_sink or NULL_REPORT_SINK
+        self.cache = cache
+        adapter = CachingAdapter(cache, pool_maxsize=workers) if cache is not None else HTTPAdapter(
+            pool_maxsize=workers)
+        self.limits = {}  # (service, token) -> maximum count of running exports
+        requests_per_hour = {}  # (service, token) -> API request budget
+        for config in tenants:
+            for group in token_groups(config):  # token shared by more tenants keeps the lowest limits
+                self.limits[group] = min(self.limits.get(group, config.max_tasks), config.max_tasks)
+                requests_per_hour[group] = min(requests_per_hour.get(group, config.requests_per_hour),
+                                               config.requests_per_hour)
+        budgets = {group: RequestBudget(rate) for group, rate in requests_per_hour.items()}
+
+        self.tenants = []
+        for config in tenants:
+            gitlab_group, github_group = token_groups(config)
+            read_tokens = config.config.github_read_tokens
+            pool = GitHubTokenPool([config.config.github_token] + read_tokens) if read_tokens else None
+            exporter = Exporter(
+                gitlab=GitLabClient(config.config.gitlab_token, cache=cache, adapter=adapter,
+                                    budget=budgets[gitlab_group]),
+                github=GitHubClient(config.config.github_token, cache=cache, adapter=adapter,
+                                    budget=budgets[github_group], pool=pool),
+                logger=logger,
+                debug=debug,
+                report_sink=self.report_sink,
+                git_backend=git_backend,
+                verify_slots=verify_slots,
+                staging=staging
+            )
+            self.tenants.append(Tenant(config, exporter))
+
+    def _scheduled(self):
+        """Lazily yield pairs of tenant and project, taking projects of tenants in turns"""
+        queues = [(tenant, tenant.projects()) for tenant in self.tenants]
+        while queues:
+            for tenant, projects in list(queues):
+                try:
+                    project = next(projects)
+                except StopIteration:
+                    queues.remove((tenant, projects))
+                    continue
+                except Exception as e:
+                    tenant.error = e
+                    log.warning('%s: listing of projects failed: %s', tenant.name, e)
+                    queues.remove((tenant, projects))
+                    continue
+                yield tenant, project
+
+    def run(self, conflict_policy, tmp_dir, stage_deadlines=None, rollback_timeout=30.0):
+        """
+        Export projects of all tenants.
+        At most :attr:`PENDING_PER_WORKER` projects per worker wait in the scheduler, the others are not listed yet.
+        Interruption stops running exports and their git processes and rollbacks exports of each tenant,
+        like :class:`exporter.logic.Exporter` does.
+
+        :param stage_deadlines: :class:`exporter.process.StageDeadlines` enforced for all tenants
+        :param rollback_timeout: seconds given to rollback of exports of each tenant
+        """
+        tmp_dir = ensure_tmp_dir(tmp_dir)
+        watchdog = Watchdog(stage_deadlines or StageDeadlines())
+
+        def export(item):
+            tenant, project = item
+            tenant.exporter.export_one(project, conflict_policy=conflict_policy, tmp_dir=tmp_dir, watchdog=watchdog,
+                                       started=tenant.tasks)
+
+        scheduler = SyncScheduler(export, workers=self.workers, limits=self.limits)
+        scheduled = self._scheduled()
+        interrupted = False
+        try:
+            for tenant, project in scheduled:
+                scheduler.schedule((tenant.name, project.name_github), (tenant, project), groups=tenant.groups)
+                scheduler.wait_pending(self.PENDING_PER_WORKER * self.workers)
+            scheduler.wait_idle()
+        except KeyboardInterrupt:
+            click.secho('===STOPPING===', bold=True)
+            interrupted = True
+            scheduler.close()
+            Exporter._stop_execution(tasks=[t for tenant in self.tenants for t in tenant.tasks], threads=(),
+                                     task_timeout=0)
+        finally:
+            self._stop_scheduler(scheduler, scheduled)
+            if interrupted:
+                for tenant in self.tenants:
+                    tenant.exporter._rollback(tasks=tenant.tasks, debug=tenant.exporter.debug, workers=self.workers,
+                                              timeout=rollback_timeout, report_sink=self.report_sink)
+            watchdog.stop()
+            self.report()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _stop_scheduler(scheduler, scheduled):
+        """Wait for running exports, projects which have not been started are not runned"""
+        for tenant, project in scheduler.stop():
+            tenant.not_runned.append(project)
+        for tenant, project in scheduled:
+            tenant.not_runned.append(project)
+
+    def report(self):
+        """Print results of each tenant"""
+        printer = ExporterPrinter(logger=self.logger)
+        for tenant in self.tenants:
+            click.secho(f'=== {tenant.name} ===', bold=True)
+            self.logger.info(f'=== {tenant.name} ===')
+            if tenant.error is not None:
+                click.secho(f'ERROR: {tenant.error}', fg='red', bold=True)
+                self.logger.info(f'ERROR: {tenant.error}')
+            printer.report(tasks=tenant.tasks, not_runned_projects=self._report_not_runned(tenant.not_runned))
+        if self.cache is not None:
+            printer.report(tasks=(), cache=self.cache)
+
+    def _report_not_runned(self, projects):
+        for p in projects:
+            self.report_sink.write_not_runned(p)
+            yield p
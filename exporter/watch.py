@@ -0,0 +1,250 @@
+import collections
+import datetime
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+
+from .config import ProjectNormalizer, ProjectSpec
+from .logic import ExporterPrinter, GitLabProject, NULL_WATCHDOG, TaskStatus
+from .plan import PlannedProject
+
+log = logging.getLogger(__name__)
+
+
+class SyncScheduler:
+    """
+    Run syncs of keyed items by at most :attr:`workers` threads.
+
+    Scheduling an item which is already waiting replaces it. Item scheduled while its previous sync is running
+    waits until the sync finishes. So a burst of changes of one project results in at most one waiting sync.
+
+    Item can belong to groups with limited count of simultaneously running syncs (eg syncs using one token),
+    item waits while any of its groups is full and items of other groups run meanwhile.
+    """
+
+    def __init__(self, sync, workers, limits=None):
+        """
+        :param sync: function called with the scheduled item
+        :param workers: maximum count of simultaneously running syncs
+        :param limits: dictionary of group and maximum count of its simultaneously running syncs
+        """
+        self.sync = sync
+        self.limits = limits or {}
+        self._pending = collections.OrderedDict()  # key -> (item, groups), in order of scheduling
+        self._running = {}  # key -> groups of running syncs
+        self._active = collections.Counter()  # group -> count of its running syncs
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._threads = [threading.Thread(target=self._work, name=f'sync-{i}', daemon=True) for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def schedule(self, key, item, groups=()):
+        with self._condition:
+            self._pending[key] = (item, tuple(groups))
+            self._condition.notify_all()
+
+    def is_scheduled(self, key):
+        with self._condition:
+            return key in self._pending or key in self._running
+
+    def _can_run(self, key, groups):
+        if key in self._running:
+            return False
+        return all(g not in self.limits or self._active[g] < self.limits[g] for g in groups)
+
+    def _take(self):
+        with self._condition:
+            while not self._stopped:
+                for key, (item, groups) in self._pending.items():
+                    if self._can_run(key, groups):
+                        del self._pending[key]
+                        self._running[key] = groups
+                        self._active.update(groups)
+                        return key, item
+                self._condition.wait()
+            return None
+
+    def _work(self):
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            key, item = taken
+            try:
+                self.sync(item)
+            except Exception:
+                log.exception('Sync of %s failed', key)
+            finally:
+                with self._condition:
+                    self._active.subtract(self._running.pop(key))
+                    self._condition.notify_all()
+
+    def wait_pending(self, limit):
+        """Wait until fewer than ``limit`` items are waiting or scheduler is stopped"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._pending) < limit or self._stopped)
+
+    def wait_idle(self, timeout=None):
+        """Wait until nothing is waiting nor running, return ``False`` on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def close(self):
+        """Do not start any other sync, running ones go on"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def stop(self):
+        """
+        Do not start any other sync and wait for running ones
+
+        :return: items which were waiting and have not been synced
+        """
+        self.close()
+        for t in self._threads:
+            t.join()
+        with self._condition:
+            return [item for item, _ in self._pending.values()]
+
+
+class WatchState:
+    """
+    State of :class:`Watcher` persisted in JSON file between restarts.
+
+    It keeps time of the last poll, projects whose sync has not succeeded yet and result of the last sync
+    of each project.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.last_poll = None  # ISO 8601 time of the last poll
+        self.pending = {}  # GitLab name -> [GitLab name, GitHub name, visibility]
+        self.synced = {}  # GitLab name -> {'time': ISO 8601, 'status': [status names]}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            state = json.loads(self.path.read_text())
+            self.last_poll = state.get('last_poll')
+            self.pending = state.get('pending', {})
+            self.synced = state.get('synced', {})
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'last_poll': self.last_poll, 'pending': self.pending, 'synced': self.synced})
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f'.{self.path.name}')
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+
+    def add_pending(self, project):
+        with self._lock:
+            self.pending[project.name_gitlab] = list(project)
+
+    def finish(self, project, status):
+        """Record result of project sync, successfully synced project is not pending anymore"""
+        with self._lock:
+            self.synced[project.name_gitlab] = {'time': now(), 'status': TaskStatus.names(status)}
+            if TaskStatus.SUCCESS in status:
+                self.pending.pop(project.name_gitlab, None)
+
+    def pending_projects(self):
+        with self._lock:
+            return [ProjectNormalizer.normalize_line(p, 'private') for p in self.pending.values()]
+
+
+def now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class Watcher:
+    """
+    Keep GitHub mirrors of GitLab projects up to date.
+
+    GitLab is polled every :attr:`interval` seconds for projects with activity after the previous poll,
+    changed projects are synced by :class:`SyncScheduler`. Projects whose sync has not succeeded are retried
+    with each poll, also after restart.
+    """
+
+    def __init__(self, exporter, state, interval, workers, conflict_policy, tmp_dir, visibility, projects=None,
+                 watchdog=NULL_WATCHDOG):
+        """
+        :param exporter: :class:`exporter.logic.Exporter`
+        :param state: :class:`WatchState`
+        :param interval: seconds between polls, ``0`` polls only once
+        :param workers: maximum count of simultaneously synced projects
+        :param visibility: visibility of GitHub repositories of projects which are not in :attr:`projects`
+        :param projects: :class:`exporter.config.ProjectSpec` of watched projects, all owned projects if ``None``
+        """
+        self.exporter = exporter
+        self.state = state
+        self.interval = interval
+        self.conflict_policy = conflict_policy
+        self.tmp_dir = pathlib.Path(tmp_dir)
+        self.visibility = visibility
+        self.projects = None if projects is None else {p.name_gitlab: p for p in projects}
+        self.watchdog = watchdog
+        self.scheduler = SyncScheduler(self.sync, workers)
+        self.stopped = threading.Event()
+        self._print_lock = threading.Lock()
+
+    def project_by_path(self, full_path):
+        """
+        Return :class:`exporter.config.ProjectSpec` of watched project by full path of GitLab project or ``None``
+
+        Watched project may be named by its full path or, in namespace of the token owner, only by its path.
+        Without projects file the project is named by its full path, so projects of the same path in different
+        namespaces are not mistaken for each other.
+        """
+        path = full_path.rsplit('/', 1)[-1]
+        if self.projects is None:
+            return ProjectSpec(full_path, path, self.visibility == 'private')
+        for name in (full_path, full_path.lower(), path):
+            if name in self.projects:
+                return self.projects[name]
+        return None
+
+    def enqueue(self, project):
+        """Persist that project needs sync and schedule it"""
+        self.state.add_pending(project)
+        self.scheduler.schedule(project.name_gitlab, project)
+
+    def poll(self):
+        """Schedule sync of projects changed after the previous poll and of projects whose sync has not succeeded"""
+        started = now()
+        for project in self.state.pending_projects():
+            if not self.scheduler.is_scheduled(project.name_gitlab):
+                self.scheduler.schedule(project.name_gitlab, project)
+        for json in self.exporter.gitlab.get_owned_projects_active_after(self.state.last_poll):
+            project = self.project_by_path(json['path_with_namespace'])
+            if project is not None:  # project is already fetched, its export does not search for it again
+                self.enqueue(PlannedProject(project.name_gitlab, project.name_github, project.is_private,
+                                            gitlab_project=GitLabProject.from_rest(json)))
+        self.state.last_poll = started
+        self.state.save()
+
+    def sync(self, project):
+        task = self.exporter.export_one(project, conflict_policy=self.conflict_policy, tmp_dir=self.tmp_dir,
+                                        watchdog=self.watchdog)
+        self.state.finish(project, task.status)
+        self.state.save()
+        with self._print_lock:
+            ExporterPrinter(logger=self.exporter.logger).report(tasks=[task])
+
+    def run(self):
+        """Poll until :func:`stop` is called, with zero :attr:`interval` poll only once"""
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:  # GitLab is not available, try again with the next poll
+                log.warning('Poll failed: %s', e)
+            self.stopped.wait(self.interval or None)
+
+    def stop(self):
+        """Stop polling and wait for running syncs"""
+        self.stopped.set()
+        self.scheduler.stop()
+        self.state.save()
@@ -0,0 +1,101 @@
+import hmac
+import json
+import logging
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+log = logging.getLogger(__name__)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """
+    Handler of GitLab webhook requests.
+
+    Push and tag push events of watched projects schedule their sync,
+    other events and projects are acknowledged and ignored.
+    """
+
+    EVENTS = ('Push Hook', 'Tag Push Hook')
+    MAX_BODY = 16 * 1024 * 1024
+
+    def do_POST(self):
+        if not hmac.compare_digest(self.headers.get('X-Gitlab-Token', '').encode(), self.server.secret.encode()):
+            self._respond(401, 'Invalid token')
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._respond(400, 'Invalid Content-Length')
+            return
+        if length > self.MAX_BODY:  # checked before reading, so large body is never read into memory
+            self._respond(413, 'Payload too large')
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+            full_path = payload['project']['path_with_namespace']
+        except (ValueError, KeyError, TypeError):
+            self._respond(400, 'Invalid payload')
+            return
+        if self.headers.get('X-Gitlab-Event') not in self.EVENTS:
+            self._respond(200, 'Event ignored')
+            return
+        project = self.server.watcher.project_by_path(full_path)
+        if project is None:
+            self._respond(200, 'Project not watched')
+            return
+        self.server.watcher.enqueue(project)
+        self.server.watcher.state.save()
+        log.info('%s: sync scheduled by %s', project.name_gitlab, self.headers.get('X-Gitlab-Event'))
+        self._respond(202, 'Sync scheduled')
+
+    def _respond(self, code, message):
+        body = message.encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug('%s %s', self.address_string(), format % args)
+
+
+class WebhookServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server receiving GitLab push and tag webhooks and scheduling sync of the changed project
+    by :class:`exporter.watch.Watcher`.
+
+    Requests must carry ``X-Gitlab-Token`` header equal to the secret token configured in GitLab.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, watcher, secret, host='', port=0):
+        """
+        :param watcher: :class:`exporter.watch.Watcher` syncing the projects
+        :param secret: secret token of the webhook
+        :param port: ``0`` selects a free port, see :attr:`port`
+        """
+        super().__init__((host, port), WebhookHandler)
+        self.watcher = watcher
+        self.secret = secret
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve requests in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='webhook', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
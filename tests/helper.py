@@ -1,12 +1,16 @@
+import json
 import pathlib
 import shlex
 import subprocess
 import sys
 
+import requests
+
 fixtures_dir = pathlib.Path(__file__).parent / 'fixtures'
 configs_dir = fixtures_dir / 'config'
 projects_dir = fixtures_dir / 'projects'
 dummy_dir = fixtures_dir / 'dummy'
+webhook_dir = fixtures_dir / 'webhook'
 
 
 def config(name):
@@ -21,6 +25,10 @@ def dummy(name):
     return dummy_dir / name
 
 
+def webhook(name):
+    return webhook_dir / name
+
+
 def run_ok(*args, **kwargs):
     cp = run(*args, **kwargs)
     print(cp.stdout, end='')
@@ -43,3 +51,39 @@ def run(line, entrypoint=False, **kwargs):
                           stderr=subprocess.PIPE,
                           universal_newlines=True,
                           **kwargs)
+
+
+def response(status_code=200, body=None, headers=None):
+    r = requests.Response()
+    r.status_code = status_code
+    r.headers.update(headers or {})
+    r._content = json.dumps(body if body is not None else {}).encode()
+    return r
+
+
+class FakeSession:
+    """Session returning prepared responses in order and recording requests"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.payloads = []  # JSON bodies of the requests
+        self.tokens = []  # tokens the requests were authorized with
+        self.headers = {}
+        self.auth = None
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        self.payloads.append(kwargs.get('json'))
+        if kwargs.get('auth') is not None:
+            self.tokens.append(kwargs['auth'](requests.Request(headers={})).headers['Authorization'])
+        r = self.responses.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
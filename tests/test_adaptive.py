@@ -0,0 +1,74 @@
+import pytest
+from flexmock import flexmock
+
+from exporter.adaptive import AdaptiveConcurrency, OverloadCounter, overloaded
+from exporter.exceptions import GitCommandFailedError
+from exporter.helpers import split_to_batches
+
+
+def tasks(count, size=1000, create=0.1, exception=None):
+    return [flexmock(size=size, durations={'clone': 5.0, 'create': create}, exception=exception)
+            for _ in range(count)]
+
+
+@pytest.fixture
+def overloads():
+    return OverloadCounter()
+
+
+def test_concurrency_grows_while_throughput_improves(overloads):
+    concurrency = AdaptiveConcurrency(minimum=2, maximum=4, overloads=overloads)
+    sizes = []
+    for _ in range(5):
+        sizes.append(concurrency.next_size())
+        concurrency.observe(tasks(concurrency.next_size()), duration=1.0)
+    assert sizes == [2, 3, 4, 4, 4]
+
+
+def test_concurrency_holds_when_throughput_does_not_improve(overloads):
+    concurrency = AdaptiveConcurrency(minimum=2, maximum=10, overloads=overloads)
+    concurrency.observe(tasks(2), duration=1.0)
+    concurrency.observe(tasks(3), duration=2.0)
+    assert concurrency.next_size() == 3
+    assert [size for _, size, _ in concurrency.history] == [2, 3]
+
+
+def test_overloaded_responses_halve_concurrency(overloads):
+    concurrency = AdaptiveConcurrency(minimum=1, maximum=20, overloads=overloads)
+    concurrency.size = 8
+    overloads.record(flexmock(status_code=429, headers={}))
+    overloads.record(flexmock(status_code=200, headers={}))
+    concurrency.observe(tasks(8), duration=1.0)
+    assert concurrency.next_size() == 4
+
+    concurrency.observe(tasks(4, size=10 ** 6), duration=1.0)  # counted responses are not counted again
+    assert concurrency.next_size() == 5
+
+
+def test_git_http_errors_back_off_to_minimum(overloads):
+    concurrency = AdaptiveConcurrency(minimum=3, maximum=20, overloads=overloads)
+    concurrency.size = 4
+    error = GitCommandFailedError('push', 128, 'fatal: The requested URL returned error: 502')
+    concurrency.observe(tasks(3) + tasks(1, exception=error), duration=1.0)
+    assert concurrency.next_size() == 3
+
+
+def test_rising_api_latency_backs_off(overloads):
+    concurrency = AdaptiveConcurrency(minimum=1, maximum=20, overloads=overloads)
+    concurrency.observe(tasks(1, create=0.3), duration=1.0)
+    concurrency.observe(tasks(2, size=10 ** 6, create=0.5), duration=1.0)  # within tolerance
+    assert concurrency.next_size() == 3
+    concurrency.observe(tasks(3, size=10 ** 7, create=2.0), duration=1.0)
+    assert concurrency.next_size() == 1
+
+
+def test_rate_limit_responses_are_overloads():
+    assert overloaded(flexmock(status_code=503, headers={}))
+    assert overloaded(flexmock(status_code=403, headers={'Retry-After': '60'}))
+    assert not overloaded(flexmock(status_code=403, headers={}))
+    assert not overloaded(flexmock(status_code=404, headers={}))
+
+
+def test_batches_follow_size_function():
+    sizes = iter([1, 3, 2])
+    assert list(split_to_batches(range(7), lambda: next(sizes, 5))) == [[0], [1, 2, 3], [4, 5], [6]]
@@ -0,0 +1,127 @@
+import base64
+import http.client
+import http.server
+import socket
+import socketserver
+import subprocess
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+from exporter import gitbackend
+from exporter.bandwidth import ThrottledGitBackend, ThrottlingProxy, Transfer
+from exporter.gitbackend import SubprocessBackend
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """Handler of files in :attr:`root` instead of the current directory"""
+
+    root = None
+
+    def translate_path(self, path):
+        return str(self.root / urllib.parse.unquote(urllib.parse.urlsplit(path).path).lstrip('/'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    """HTTP server of files in tmp_path"""
+    handler = type('TmpPathHandler', (QuietHandler,), {'root': tmp_path})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def proxy(request):
+    limits = getattr(request, 'param', {})
+    proxy = ThrottlingProxy(**limits)
+    proxy.start()
+    yield proxy
+    proxy.stop()
+
+
+def get(proxy, url, key):
+    connection = http.client.HTTPConnection('127.0.0.1', proxy.port, timeout=10)
+    auth = base64.b64encode(f'{key}:x'.encode()).decode()
+    connection.request('GET', url, headers={'Proxy-Authorization': f'Basic {auth}'})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+@pytest.mark.parametrize('proxy', [{'download': 64 * 1024}], indirect=True)
+def test_download_is_throttled(proxy, server, tmp_path):
+    """Data over the burst of one second are relayed at the download rate"""
+
+    data = bytes(range(256)) * 640  # 160 KiB
+    (tmp_path / 'data').write_bytes(data)
+    with proxy.transfer() as transfer:
+        start = time.monotonic()
+        status, body = get(proxy, f'{server}/data', transfer.key)
+        duration = time.monotonic() - start
+    assert status == 200
+    assert body == data
+    assert transfer.downloaded > len(data)
+    assert transfer.uploaded > 0
+    assert duration > 1.2
+
+
+def test_connection_without_transfer_is_refused(proxy, server):
+    status, _ = get(proxy, f'{server}/data', 'unknown')
+    assert status == 407
+    assert proxy.transfers == {}
+
+
+def test_connect_is_tunnelled(proxy, server, tmp_path):
+    (tmp_path / 'data').write_bytes(b'tunnelled')
+    host = server.split('//')[1]
+    with proxy.transfer() as transfer:
+        auth = base64.b64encode(f'{transfer.key}:x'.encode()).decode()
+        with socket.create_connection(('127.0.0.1', proxy.port), timeout=10) as s:
+            s.sendall(f'CONNECT {host} HTTP/1.1\r\nProxy-Authorization: Basic {auth}\r\n\r\n'.encode())
+            assert s.recv(1024).startswith(b'HTTP/1.1 200')
+            s.sendall(f'GET /data HTTP/1.0\r\nHost: {host}\r\n\r\n'.encode())
+            response = b''
+            while True:
+                chunk = s.recv(1024)
+                if not chunk:
+                    break
+                response += chunk
+    assert response.endswith(b'tunnelled')
+    assert transfer.downloaded == len(response)
+
+
+@pytest.mark.parametrize('old_git', [False, True])
+def test_clone_goes_through_proxy(proxy, server, tmp_path, monkeypatch, old_git):
+    """Git clones over HTTP through the proxy and progress messages report the rate of the transfer"""
+
+    monkeypatch.setattr(Transfer, 'INTERVAL', 0.0)
+    if old_git:  # git older than 2.31 ignores GIT_CONFIG_COUNT, proxy environment variables have to be enough
+        monkeypatch.setattr(gitbackend, 'proxy_env', lambda url, proxy_env=gitbackend.proxy_env: {
+            key: value for key, value in proxy_env(url).items() if not key.startswith('GIT_CONFIG_')})
+    origin = tmp_path / 'origin'
+    git = ['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com']
+    subprocess.run(git + ['init', '-q', str(origin)], check=True)
+    (origin / 'file.txt').write_text('content\n')
+    subprocess.run(git + ['add', 'file.txt'], cwd=origin, check=True)
+    subprocess.run(git + ['commit', '-q', '-m', 'commit'], cwd=origin, check=True)
+    subprocess.run(git + ['clone', '-q', '--bare', str(origin), str(tmp_path / 'repo.git')], check=True)
+    subprocess.run(['git', 'update-server-info'], cwd=tmp_path / 'repo.git', check=True)  # dumb HTTP
+
+    messages = []
+    backend = ThrottledGitBackend(SubprocessBackend(), proxy)
+    repo = backend.clone(f'{server}/repo.git', tmp_path / 'clone', progress=messages.append)
+    assert backend.commit_count(repo) == 1
+    assert any(m.endswith('/s') for m in messages)
+    assert proxy.transfers == {}
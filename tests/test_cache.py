@@ -0,0 +1,78 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from exporter.cache import HttpCache, make_session
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves the path as body with ETag, answers matching If-None-Match by 304"""
+
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append((self.path, self.headers.get('If-None-Match'), self.headers.get('Private-Token')))
+        etag = f'"{self.path}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = self.path.encode() * 10
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def server():
+    Handler.requests = []
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(cache, url, token='XXX'):
+    return make_session(cache).get(url, headers={'Private-Token': token})
+
+
+def test_not_modified_response_is_answered_from_cache(server, tmp_path):
+    """Second run sends conditional request and gets the body from the disk"""
+
+    get(HttpCache(tmp_path), f'{server}/projects')
+    cache = HttpCache(tmp_path)
+    r = get(cache, f'{server}/projects')
+
+    assert r.status_code == 200
+    assert r.text == '/projects' * 10
+    assert Handler.requests[1][1] == '"/projects"'
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_cache_is_not_shared_between_tokens(server, tmp_path):
+    cache = HttpCache(tmp_path)
+    get(cache, f'{server}/user', token='XXX')
+    get(cache, f'{server}/user', token='YYY')
+
+    assert [r[1] for r in Handler.requests] == [None, None]
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert not any(b'XXX' in p.read_bytes() for p in tmp_path.iterdir())
+
+
+def test_least_recently_used_entries_are_evicted(server, tmp_path):
+    cache = HttpCache(tmp_path, max_bytes=400)
+    for path in ('/a', '/b', '/a', '/c'):
+        get(cache, f'{server}{path}')
+
+    assert cache._total <= 400
+    get(cache, f'{server}/b')
+    assert Handler.requests[-1][1] is None  # evicted
+    assert cache.hits == 1
@@ -0,0 +1,240 @@
+import threading
+import time
+
+import pytest
+import requests
+from flexmock import flexmock
+
+from exporter.logic import GitHubClient, GitHubGraphQLClient, GitHubPurger, GitHubTokenPool, RepositoryCreationBatcher
+from helper import FakeSession, response
+
+
+@pytest.fixture()
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(time, 'sleep', lambda x: slept.append(x))
+    return slept
+
+
+def test_transient_errors_are_retried(sleeps):
+    """Server errors and connection errors are retried with growing delay"""
+
+    session = FakeSession([response(502), requests.ConnectionError(), response(200, {'login': 'YYY'})])
+    github = GitHubClient('XXX', session=session)
+    assert github.login == 'YYY'
+    assert len(session.requests) == 3
+    assert sleeps == [GitHubClient.RETRY_BACKOFF, 2 * GitHubClient.RETRY_BACKOFF]
+
+
+def test_exhausted_rate_limit_waits_until_reset(sleeps, monkeypatch):
+    """Request is repeated after rate limit reset when rate limit is exhausted"""
+
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    session = FakeSession([
+        response(403, headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '1042'}),
+        response(204)
+    ])
+    GitHubClient('XXX', session=session).delete_repo('repo', 'YYY')
+    assert sleeps == [42.0]
+
+
+def test_client_errors_are_not_retried(sleeps):
+    """Error caused by the request itself is raised immediately"""
+
+    session = FakeSession([response(404)])
+    with pytest.raises(requests.HTTPError):
+        GitHubClient('XXX', session=session).delete_repo('repo', 'YYY')
+    assert len(session.requests) == 1
+    assert not sleeps
+
+
+def test_writes_are_not_repeated_after_server_errors(sleeps):
+    """Creation whose response was lost may have been done, so it is not sent again, unless it was rate limited"""
+
+    for error in (response(502), requests.Timeout()):
+        session = FakeSession([error])
+        with pytest.raises((requests.HTTPError, requests.Timeout)):
+            GitHubClient('XXX', session=session).create_repo('repo', is_private=True)
+        assert len(session.requests) == 1
+    assert not sleeps
+
+    session = FakeSession([response(429, headers={'Retry-After': '3'}), response(201)])
+    GitHubClient('XXX', session=session).create_repo('repo', is_private=True)
+    assert len(session.requests) == 2
+    assert sleeps == [3.0]
+
+
+def test_repos_are_listed_lazily():
+    """Next page is requested only when previous page is consumed"""
+
+    session = FakeSession([
+        response(200, [{'name': 'a'}], headers={'Link': '<https://api.github.com/user/repos?page=2>; rel="next"'}),
+        response(200, [{'name': 'b'}]),
+    ])
+    repos = GitHubClient('XXX', session=session).iter_repos()
+    assert next(repos)['name'] == 'a'
+    assert len(session.requests) == 1
+    assert [r['name'] for r in repos] == ['b']
+    assert session.requests[1][1] == 'https://api.github.com/user/repos?page=2'
+
+
+def repo(name):
+    return {'name': name, 'full_name': f'YYY/{name}', 'owner': {'login': 'YYY'}}
+
+
+def test_purge_deletes_all_repos_and_reports_failures():
+    """Every listed repository is deleted, failures are collected instead of stopping the purge"""
+
+    listed = [repo(f'repo{i}') for i in range(50)]
+    deleted = []
+
+    def delete_repo(repo_name, owner):
+        if repo_name == 'repo7':
+            raise RuntimeError('ABC')
+        deleted.append(repo_name)
+
+    client = flexmock(delete_repo=delete_repo)
+    github = flexmock(iter_repos=lambda: iter(listed), clone=lambda: client)
+    purger = GitHubPurger(github, workers=4)
+    assert purger.run() == 50
+    assert len(purger.deleted) == 49
+    assert sorted(deleted) == sorted(r['name'] for r in listed if r['name'] != 'repo7')
+    assert [(name, str(e)) for name, e in purger.failed] == [('YYY/repo7', 'ABC')]
+
+
+def test_purge_relists_repos_skipped_by_shifted_pagination():
+    """Repositories which were not listed because deletion shifted pages are deleted by the next listing"""
+
+    remaining = [repo(f'repo{i}') for i in range(6)]
+    listings = [remaining[::2], remaining[1::2], []]
+    github = flexmock(iter_repos=lambda: iter(listings.pop(0)),
+                      clone=lambda: flexmock(delete_repo=lambda repo_name, owner: None))
+    purger = GitHubPurger(github, workers=2)
+    assert purger.run() == 6
+    assert len(purger.deleted) == 6
+    assert not purger.failed
+
+
+def test_purge_deletes_only_confirmed_repos():
+    """Repository which appeared after the user confirmed the listed ones is left"""
+
+    listed = [repo('a'), repo('b'), repo('new')]
+    client = flexmock(delete_repo=lambda repo_name, owner: None)
+    purger = GitHubPurger(flexmock(iter_repos=lambda: iter(listed), clone=lambda: client), workers=2)
+    assert purger.run(only={'YYY/a', 'YYY/b'}) == 2
+    assert sorted(purger.deleted) == ['YYY/a', 'YYY/b']
+
+
+def test_existence_of_repos_is_checked_by_single_query():
+    """Missing repositories are recognized from the query, other errors are checked by REST API"""
+
+    session = FakeSession([
+        response(200, {
+            'data': {'r0': {'id': 'A'}, 'r1': None, 'r2': None},
+            'errors': [{'type': 'NOT_FOUND', 'path': ['r1']}, {'type': 'FORBIDDEN', 'path': ['r2']}]
+        }),
+        response(200, {'name': 'c'}),
+    ])
+    github = GitHubGraphQLClient('XXX', session=session)
+    assert github.repos_exist(['a', 'b', 'c'], 'YYY') == {'a': True, 'b': False, 'c': True}
+    assert session.requests == [('POST', GitHubGraphQLClient.GRAPHQL), ('GET', f'{GitHubClient.API}/repos/YYY/c')]
+
+
+def test_concurrent_creations_are_sent_in_one_mutation(monkeypatch):
+    """Repositories requested by concurrent threads are created together, failed ones are created by REST API"""
+
+    monkeypatch.setattr(RepositoryCreationBatcher, 'WINDOW', 0.5)
+    session = FakeSession([
+        response(200, {
+            'data': {'c0': {'repository': {'id': 'A'}}, 'c1': None, 'c2': {'repository': {'id': 'C'}}},
+            'errors': [{'type': 'UNPROCESSABLE', 'path': ['c1']}]
+        }),
+        response(201),
+    ])
+    batcher = RepositoryCreationBatcher(batch_size=10)
+    github = GitHubGraphQLClient('XXX', session=session, batcher=batcher)
+    threads = [threading.Thread(target=github.create_repo, args=(name,), kwargs={'is_private': True})
+               for name in ('a', 'b', 'c')]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert session.requests == [('POST', GitHubGraphQLClient.GRAPHQL), ('POST', f'{GitHubClient.API}/user/repos')]
+
+
+def test_reads_use_token_with_most_remaining_requests(sleeps, monkeypatch):
+    """Existence checks go to the token with the most remaining requests, writes stay on the owner token"""
+
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    remaining = {'X-RateLimit-Reset': '2000'}
+    session = FakeSession([
+        response(200, headers=dict(remaining, **{'X-RateLimit-Remaining': '10'})),
+        response(404, headers=dict(remaining, **{'X-RateLimit-Remaining': '50'})),
+        response(404, headers=dict(remaining, **{'X-RateLimit-Remaining': '40'})),
+        response(201),
+    ])
+    github = GitHubClient('owner', session=session, pool=GitHubTokenPool(['owner', 'read']))
+    assert github.repo_exists('a', 'YYY')
+    assert not github.repo_exists('b', 'YYY')
+    assert not github.repo_exists('c', 'YYY')
+    github.create_repo('c', is_private=True)
+    assert session.tokens == ['token owner', 'token read', 'token read', 'token owner']
+
+
+def test_exhausted_read_token_is_replaced(sleeps, monkeypatch):
+    """Rate limited read is repeated right away with another token instead of waiting for reset"""
+
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    session = FakeSession([
+        response(403, headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '2000'}),
+        response(401),
+        response(200, headers={'X-RateLimit-Remaining': '5', 'X-RateLimit-Reset': '2000'}),
+    ])
+    github = GitHubClient('owner', session=session, pool=GitHubTokenPool(['owner', 'bad', 'read']))
+    assert github.repo_exists('a', 'YYY')
+    assert session.tokens == ['token owner', 'token bad', 'token read']
+    assert not sleeps
+
+
+def test_rate_limits_of_rest_and_graphql_are_tracked_separately(monkeypatch):
+    """Token exhausted for GraphQL is still picked for REST reads, which have their own rate limit"""
+
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    pool = GitHubTokenPool(['a', 'b'])
+    pool.update('a', response(200, headers={'X-RateLimit-Resource': 'graphql', 'X-RateLimit-Remaining': '0',
+                                            'X-RateLimit-Reset': '2000'}), resource='graphql')
+    pool.update('b', response(200, headers={'X-RateLimit-Remaining': '5', 'X-RateLimit-Reset': '2000'}))
+    assert pool.pick('graphql') == 'b'
+    assert pool.pick() == 'a'
+    pool.update('b', response(200, headers={'X-RateLimit-Resource': 'graphql', 'X-RateLimit-Remaining': '0',
+                                            'X-RateLimit-Reset': '2000'}))
+    assert not pool.has_available('graphql')
+    assert pool.has_available()
+    assert GitHubClient._rate_limit_resource(GitHubGraphQLClient.GRAPHQL) == 'graphql'
+    assert GitHubClient._rate_limit_resource(f'{GitHubClient.API}/repos/a/b') == 'core'
+
+
+def test_switching_tokens_does_not_use_up_retries(sleeps):
+    """Read answered 401 by every token of a big pool ends with the last response instead of running out of attempts"""
+
+    tokens = ['owner'] + [f'read{i}' for i in range(8)]
+    session = FakeSession([response(401) for _ in tokens])
+    github = GitHubClient('owner', session=session, pool=GitHubTokenPool(tokens))
+    assert not github.repo_exists('a', 'YYY')
+    assert len(session.requests) == len(tokens)
+    assert not sleeps
+
+
+def test_missing_lfs_objects_are_asked_in_batches(monkeypatch):
+    """LFS objects without download action or with error are missing, others exist on GitHub"""
+
+    monkeypatch.setattr(GitHubClient, 'LFS_BATCH_SIZE', 2)
+    session = FakeSession([
+        response(200, {'login': 'YYY'}),
+        response(200, {'objects': [{'oid': 'a', 'actions': {'download': {}}}, {'oid': 'b', 'error': {'code': 404}}]}),
+        response(200, {'objects': [{'oid': 'c'}]}),
+    ])
+    github = GitHubClient('XXX', session=session)
+    assert github.missing_lfs_objects('repo', 'YYY', {'c': 3, 'a': 1, 'b': 2}) == ['b', 'c']
+    assert session.requests[1:] == [('POST', 'https://github.com/YYY/repo.git/info/lfs/objects/batch')] * 2
+    assert session.tokens[-1] == 'Basic WVlZOlhYWA=='
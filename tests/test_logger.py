@@ -0,0 +1,55 @@
+import logging
+
+from flexmock import flexmock
+
+from exporter.logger import ExporterLogger
+from exporter.logic import TaskBase
+
+
+def test_stage_transitions_are_logged_with_task_id(tmp_path):
+    """Start and end of each stage is in the log file after the logger is closed"""
+
+    logger = ExporterLogger(log_dir=tmp_path, log_file='test')
+    task = TaskBase()
+    flexmock(TaskBase).should_receive('id').and_return('TEST_GITLAB -> TEST_GITHUB')
+    with task.stage('clone'):
+        pass
+    try:
+        with task.stage('push'):
+            raise ValueError('ABC')
+    except ValueError:
+        pass
+    logger.close()
+
+    lines = (tmp_path / 'test.log').read_text().splitlines()
+    assert lines[0].endswith(': TEST_GITLAB -> TEST_GITHUB: clone started')
+    assert ': TEST_GITLAB -> TEST_GITHUB: clone finished after ' in lines[1]
+    assert lines[2].endswith(': TEST_GITLAB -> TEST_GITHUB: push started')
+    assert ': TEST_GITLAB -> TEST_GITHUB: push failed after ' in lines[3]
+
+
+def test_records_are_formatted_by_listener_thread(tmp_path):
+    """Logging thread only queues the record, it is formatted when the listener writes it"""
+
+    logger = ExporterLogger(log_dir=tmp_path, log_file='test')
+    record = logging.makeLogRecord({'msg': 'record%s', 'args': (1,), 'levelno': logging.INFO})
+    assert logger.handler.prepare(record) is record
+    logging.getLogger().handle(record)
+    logger.close()
+
+    assert (tmp_path / 'test.log').read_text().endswith(': record1\n')
+
+
+def test_log_file_is_rotated(tmp_path):
+    """Log file is rotated before exceeding the size and only given count of old files is kept"""
+
+    flexmock(ExporterLogger, BACKUP_COUNT=2)
+    logger = ExporterLogger(log_dir=tmp_path, log_file='test', max_bytes=40)
+    for i in range(5):
+        logging.info(f'record{i}')
+    logger.close()
+
+    assert (tmp_path / 'test.log').read_text().endswith(': record4\n')
+    assert (tmp_path / 'test.log.1').read_text().endswith(': record3\n')
+    assert (tmp_path / 'test.log.2').read_text().endswith(': record2\n')
+    assert not (tmp_path / 'test.log.3').exists()
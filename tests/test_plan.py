@@ -0,0 +1,128 @@
+import io
+
+import pytest
+import requests
+from flexmock import flexmock
+
+from exporter.config import ProjectSpec
+from exporter.logic import Exporter, GitLabProject, TaskExportProject
+from exporter.plan import Plan, PlannedProject, Planner
+from helper import config, run
+
+MIB = 1024 * 1024
+
+
+def rest_project(name, size):
+    return {
+        'path_with_namespace': f'user/{name}',
+        'http_url_to_repo': f'https://gitlab.fit.cvut.cz/user/{name}.git',
+        'owner': {'username': 'user'},
+        'lfs_enabled': True,
+        'statistics': {'repository_size': size, 'lfs_objects_size': MIB},
+    }
+
+
+@pytest.fixture
+def clients():
+    found = {'a': [rest_project('a', MIB)], 'b': [rest_project('b', 3 * MIB)], 'c': [], 'd': [{}, {}]}
+    gitlab = flexmock(search_owned_projects=lambda name: found[name])
+    github = flexmock(login='owner', repo_exists=lambda name, owner: name == 'B')
+    gitlab.clone = lambda: gitlab
+    github.clone = lambda: github
+    return gitlab, github
+
+
+def make_plan(clients, conflict_policy='skip', batch_size=1):
+    projects = [ProjectSpec('a', 'A', True), ProjectSpec('b', 'B', False), ProjectSpec('c', 'C', True),
+                ProjectSpec('d', 'D', True)]
+    return Planner(*clients, workers=4).plan(projects, conflict_policy, batch_size=batch_size, min_rate=MIB)
+
+
+def test_plan_resolves_projects_and_checks_conflicts(clients):
+    plan = make_plan(clients, conflict_policy='overwrite')
+
+    assert [p.action(plan.conflict_policy) for p in plan.projects] == ['export', 'overwrite', 'error', 'error']
+    assert plan.projects[0].gitlab_project.http_url == 'https://gitlab.fit.cvut.cz/user/a.git'
+    assert plan.projects[2].error == 'No project found for c'
+    assert plan.projects[3].error == 'Multiple projects found for d'
+    assert plan.total_bytes == 6 * MIB
+    assert plan.disk_bytes == 12 * MIB
+    assert plan.transfer_seconds == 2 * 2 + 2 * 4  # each batch of one project is transferred twice
+
+    plan.conflict_policy = 'update'
+    assert [p.action(plan.conflict_policy) for p in plan.projects] == ['export', 'update', 'error', 'error']
+    assert plan.total_bytes == 6 * MIB
+
+
+def test_failed_request_is_error_of_single_project(clients):
+    """Project whose lookup fails gets an error, the other projects are planned"""
+
+    gitlab, github = clients
+    found = gitlab.search_owned_projects
+
+    def search_owned_projects(name):
+        if name == 'a':
+            raise requests.ConnectionError('ABC')
+        return found(name)
+
+    def repo_exists(name, owner):
+        raise requests.HTTPError('DEF')
+
+    gitlab.search_owned_projects = search_owned_projects
+    github.repo_exists = repo_exists
+    plan = make_plan(clients, conflict_policy='overwrite')
+
+    assert [p.action(plan.conflict_policy) for p in plan.projects] == ['error', 'error', 'error', 'error']
+    assert plan.projects[0].error == 'GitLab project a has not been found: ABC'
+    assert plan.projects[1].error == 'GitHub repository B has not been checked: DEF'
+    assert plan.projects[1].gitlab_project is not None
+    assert plan.projects[2].error == 'No project found for c'
+
+
+def test_skipped_projects_are_not_transferred(clients):
+    plan = make_plan(clients, conflict_policy='skip', batch_size=10)
+
+    assert plan.actions() == {'export': 1, 'skip': 1, 'error': 2}
+    assert plan.total_bytes == 2 * MIB
+    assert [p.name_gitlab for p in plan.runnable()] == ['a', 'b']
+
+
+def test_saved_plan_is_loaded(clients, tmp_path):
+    plan = make_plan(clients)
+    plan.save(tmp_path / 'plan.json')
+    with open(tmp_path / 'plan.json') as f:
+        loaded = Plan.load(f)
+
+    assert loaded.as_dict() == plan.as_dict()
+    assert loaded.projects == plan.projects
+    with pytest.raises(ValueError, match='Unsupported plan version'):
+        Plan.load(io.StringIO('{"version": 0}'))
+
+
+def test_planned_projects_are_not_looked_up_again(tmp_path):
+    """Tasks of planned projects get resolved GitLab project and existence of GitHub repository from the plan"""
+
+    gitlab = flexmock(BATCHED=True, clone=lambda: None)
+    gitlab.should_receive('resolve_projects').never()
+    project = GitLabProject('user/a', 'https://gitlab.fit.cvut.cz/user/a.git', 'user')
+    tasks = Exporter._prepare_tasks(
+        gitlab=gitlab,
+        github=flexmock(clone=lambda: None),
+        projects=[PlannedProject('a', 'A', True, gitlab_project=project, github_exists=False)],
+        tmp_dir=tmp_path,
+        conflict_policy='skip',
+        debug=False,
+        suppress_exceptions=True,
+        resolve=True
+    )
+    task = tasks[0]
+    assert isinstance(task, TaskExportProject)
+    assert task.gitlab_project is project
+    assert task.github_repo_existed is False
+
+
+def test_apply_rejects_invalid_plan(tmp_path):
+    (tmp_path / 'plan.json').write_text('{"version": 0}')
+    cp = run(f'apply -c "{config("ok_example_config.cfg")}" "{tmp_path / "plan.json"}"')
+    assert cp.returncode != 0
+    assert "Invalid value for 'PLAN': Unsupported plan version 0" in cp.stderr
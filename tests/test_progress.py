@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from exporter.cli import make_progress, project_count
+from exporter.config import ProjectLoader
+from exporter.helpers import format_duration
+from exporter.progress import ProgressPanel
+
+
+@pytest.fixture
+def panel():
+    panel = ProgressPanel(total=100, active_lines=3, failure_lines=2)
+    yield panel
+    panel.close()
+
+
+def finish(batch, name, msg):
+    bar = batch.register(name, total=5, initial_message='WAITING')
+    bar.set_msg('Cloning GitLab repo')
+    bar.set_msg_and_finish(msg)
+    return bar
+
+
+def test_view_has_fixed_height(panel):
+    """Running tasks over the height of the view are summarized, finished ones are only counted"""
+
+    batch = panel.batch()
+    bars = [batch.register(f'[project_{i}]', total=5, initial_message='WAITING') for i in range(50)]
+    for bar in bars[:10]:
+        bar.set_msg_and_update('Cloning GitLab repo')
+    for bar in bars[10:20]:
+        bar.add_bytes(1024)
+        bar.set_msg_and_finish('DONE')
+    lines = panel.render()
+    assert len(lines) == len(panel.lines) == 1 + 3 + 1 + 2
+    assert lines[0].startswith('10/100 | running 10 | DONE 10 |')
+    assert 'ETA' in lines[0]
+    assert lines[1:4] == ['  [project_0] 1/5 Cloning GitLab repo', '  [project_1] 1/5 Cloning GitLab repo',
+                          '  ... and 8 more']
+    assert lines[4:] == ['', '', '']
+    assert panel.bytes == 10 * 1024
+
+
+def test_recent_failures_are_listed(panel):
+    batch = panel.batch()
+    finish(batch, '[a]', 'RUN ERROR')
+    finish(batch, '[b]', 'SKIPPED')
+    finish(batch, '[c]', 'TIMED OUT')
+    finish(batch, '[d]', 'VERIFY FAILED')
+    lines = panel.render()
+    assert 'RUN ERROR 1 | SKIPPED 1 | TIMED OUT 1 | VERIFY FAILED 1' in lines[0]
+    assert lines[-3:] == ['Recent failures:', '  [d] VERIFY FAILED', '  [c] TIMED OUT']
+
+
+def test_batch_task_ends_when_its_tasks_finish(panel):
+    panel.INTERVAL = 0.01
+    batch = panel.batch()
+    bars = [batch.register(f'[project_{i}]', total=5, initial_message='WAITING') for i in range(3)]
+    thread = threading.Thread(target=batch.run)
+    thread.start()
+    for bar in bars:
+        bar.set_msg_and_finish('DONE')
+        bar.set_msg_and_finish('DONE')  # counted once
+    thread.join(5)
+    assert not thread.is_alive()
+    assert panel.statuses == {'DONE': 3}
+    assert batch.id == 'PROGRESS_BAR'
+
+
+def test_durations_are_formatted():
+    assert format_duration(7) == '7s'
+    assert format_duration(125) == '2m 05s'
+    assert format_duration(3 * 3600 + 60 * 7 + 5) == '3h 07m'
+
+
+def test_panel_of_export_knows_total_of_projects_file(tmp_path):
+    """Export shows ETA of projects file, count of lazily produced projects is not known in advance"""
+
+    path = tmp_path / 'projects.txt'
+    path.write_text('a\nb\nc\n')
+    with open(path) as f:
+        panel = make_progress('panel', total=project_count(ProjectLoader.load(f)))
+    assert panel.total == 3
+    panel.close()
+    assert project_count(p for p in ['a']) is None
+    assert make_progress('bars', total=3) is None
@@ -1,5 +1,9 @@
+import io
+import tracemalloc
+
 import pytest
 
+from exporter.config import ProjectLoader
 from helper import run_ok, run, dummy, projects
 
 
@@ -129,3 +133,55 @@ def test_incorrect_repo_separator(projects_file, dummy_config_file):
     assert (
             "Error: Invalid value for '-p' / '--projects': Invalid visibility specifier" in cp.stderr
     )
+
+
+def test_projects_from_stdin(dummy_config_file):
+    """"Projects can be piped to the application"""
+
+    cp = run_ok(f'-p - '
+                f'-c "{dummy(dummy_config_file)}" '
+                f'--dry-run', input='my_project\nother_project -> renamed private\n')
+    assert 'my_project->my_project' in cp.stdout
+    assert 'other_project->renamed' in cp.stdout
+
+
+def test_error_contains_line_number(dummy_config_file):
+    """"Invalid line is reported with its number"""
+
+    cp = run(f'-p - '
+             f'-c "{dummy(dummy_config_file)}" '
+             f'--dry-run', input='a\nb\na -> b\n')
+    assert cp.returncode != 0
+    assert "Name 'b' on line 3 is already used on line 2." in cp.stderr
+
+
+def test_projects_are_parsed_lazily():
+    """"Projects are validated in advance, but parsed lines are produced one at a time"""
+
+    lines = ''.join(f'project_{i} -> renamed_{i} private\n' for i in range(100000))
+    source = ProjectLoader.load(io.StringIO(lines))
+    assert len(source) == 100000
+
+    tracemalloc.start()
+    for i, project in enumerate(source):
+        assert project == [f'project_{i}', f'renamed_{i}', 'private']
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 100 * 1024
+
+
+def test_copy_of_unseekable_input_is_closed():
+    """Temporary copy of stdin is closed with the source, seekable input is left to its owner"""
+
+    class Stdin(io.StringIO):
+        def seekable(self):
+            return False
+
+    source = ProjectLoader.load(Stdin('a\nb\n'))
+    assert [p[0] for p in source] == ['a', 'b']
+    source.close()
+    assert source.file.closed
+
+    file = io.StringIO('a\n')
+    ProjectLoader.load(file).close()
+    assert not file.closed
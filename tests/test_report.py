@@ -0,0 +1,123 @@
+import csv
+import json
+
+import pytest
+from flexmock import flexmock
+
+from exporter.config import ProjectSpec
+from exporter.logic import Exporter, NULL_BAR, TaskExportProject, TaskFetchGitlabProject, TaskPushToGitHub
+from exporter.report import CsvReportSink, JsonLinesReportSink
+from helper import run_ok, dummy
+
+
+@pytest.fixture()
+def task(tmp_path):
+    github = flexmock(token='XXX', login='YYY', repo_exists=lambda x, y: False, close=lambda: None)
+    return TaskExportProject(
+        gitlab=None,
+        github=github,
+        name_gitlab='TEST_GITLAB',
+        name_github='TEST_GITHUB',
+        is_github_private=False,
+        base_dir=tmp_path,
+        bar=NULL_BAR,
+        conflict_policy='skip',
+        suppress_exceptions=True,
+        debug=False
+    )
+
+
+def test_record_is_written_as_soon_as_task_finishes(task, tmp_path):
+    """Record is flushed right after the task finishes, so it can be read while export is still running"""
+
+    def fail(self):
+        self.timings = {'clone': 1.5}
+        self.add_exception(ValueError('ABC'))
+        raise self.exc[-1]
+
+    flexmock(TaskFetchGitlabProject, run=lambda: fail(task.subtasks[0]))
+    path = tmp_path / 'report.jsonl'
+    sink = JsonLinesReportSink(open(path, 'w'))
+    Exporter._run_and_report(task, sink)
+
+    record = json.loads(path.read_text())
+    assert record['event'] == 'run'
+    assert record['gitlab'] == 'TEST_GITLAB'
+    assert record['github'] == 'TEST_GITHUB'
+    assert record['status'] == ['ERROR']
+    assert set(record['durations']) == {'check', 'clone'}
+    assert record['durations']['clone'] == 1.5
+    assert record['exception_type'] == 'ValueError'
+    assert record['exception'] == 'ABC'
+    sink.close()
+
+
+def test_released_task_keeps_durations_bytes_and_exception_for_rollback_record(task, tmp_path):
+    """Rollback record is written after the task is released, so it still has to describe the export"""
+
+    def fail(self):
+        self.timings = {'clone': 1.5}
+        self.size = 2048
+        self.add_exception(ValueError('ABC'))
+        raise self.exc[-1]
+
+    flexmock(TaskFetchGitlabProject, run=lambda: fail(task.subtasks[0]))
+    path = tmp_path / 'report.jsonl'
+    sink = JsonLinesReportSink(open(path, 'w'))
+    Exporter._run_and_report(task, sink)
+    task.release()
+    sink.write(task, event='rollback')
+    sink.close()
+
+    run, rollback = [json.loads(line) for line in path.read_text().splitlines()]
+    assert rollback['event'] == 'rollback'
+    assert rollback['durations'] == run['durations']
+    assert rollback['bytes'] == run['bytes'] == 2048
+    assert rollback['exception_type'] == 'ValueError'
+    assert rollback['exception'] == 'ABC'
+
+
+def test_csv_record_has_column_for_each_stage(task, tmp_path):
+    """CSV report has fixed columns, so stages which did not run are empty"""
+
+    flexmock(TaskFetchGitlabProject, run=lambda: None)
+    flexmock(TaskPushToGitHub, run=lambda: None)
+    path = tmp_path / 'report.csv'
+    sink = CsvReportSink(open(path, 'w', newline=''))
+    Exporter._run_and_report(task, sink)
+    sink.close()
+
+    rows = list(csv.DictReader(open(path, newline='')))
+    assert len(rows) == 1
+    assert rows[0]['status'] == 'FETCHED:SUCCESS'
+    assert rows[0]['duration_check'] != ''
+    assert rows[0]['duration_clone'] == ''
+
+
+def test_dry_run_writes_record_for_each_project(tmp_path):
+    """Every project from projects file has its record in the report"""
+
+    path = tmp_path / 'report.jsonl'
+    run_ok(f'-p - -c "{dummy("dummy_config.cfg")}" --dry-run --report "{path}"', input='a\nb -> c private\n')
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(r['gitlab'], r['github'], r['status']) for r in records] == [
+        ('a', 'a', ['DRY_RUN']),
+        ('b', 'c', ['DRY_RUN']),
+    ]
+
+
+def test_batch_whose_tasks_failed_to_prepare_is_reported_as_not_runned(tmp_path, monkeypatch):
+    """Projects already taken for a batch are not lost when preparing its tasks fails"""
+
+    def raise_(*args, **kwargs):
+        raise RuntimeError('ABC')
+
+    monkeypatch.setattr(Exporter, '_prepare_tasks', raise_)
+    path = tmp_path / 'report.jsonl'
+    with open(path, 'w') as file:
+        exporter = Exporter(gitlab=None, github=flexmock(), logger=flexmock(info=lambda msg: None), debug=False,
+                            report_sink=JsonLinesReportSink(file))
+        exporter.run(projects=[ProjectSpec(f'p{i}', f'p{i}', True) for i in range(5)], conflict_policy='skip',
+                     tmp_dir=tmp_path / 'tmp', task_timeout=1.0, batch_size=2, dry_run=True)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(r['gitlab'], r['status']) for r in records] == [(f'p{i}', ['NOT_RUNNED']) for i in range(5)]
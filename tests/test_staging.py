@@ -0,0 +1,84 @@
+import pytest
+from flexmock import flexmock
+
+from exporter.logic import NULL_BAR, GitLabProject, TaskFetchGitlabProject
+from exporter.staging import MemoryStaging
+
+KB = 1024
+
+
+@pytest.fixture()
+def memory_dir(tmp_path):
+    directory = tmp_path / 'memory'
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture()
+def staging(memory_dir):
+    staging = MemoryStaging(memory_dir, threshold=10 * KB, budget=100 * KB)
+    yield staging
+    staging.close()
+
+
+def test_small_repositories_are_placed_in_memory_within_budget(staging):
+    """Repositories up to the threshold go to memory until their reserved space exceeds the budget"""
+
+    directory, reserved = staging.place(10 * KB)
+    assert directory == staging.directory
+    assert reserved == 10 * KB * MemoryStaging.SIZE_FACTOR
+    assert staging.place(11 * KB) == (None, 0)
+    assert staging.place(0) == (None, 0)  # size is not known
+
+    placed = [staging.place(10 * KB) for _ in range(3)]
+    assert [d for d, _ in placed] == [staging.directory, staging.directory, None]
+    assert staging.used == 90 * KB
+
+    staging.release(reserved)
+    assert staging.place(10 * KB)[0] == staging.directory
+
+
+def test_budget_is_lowered_to_free_space(memory_dir):
+    """Budget never exceeds what the memory backed directory can hold"""
+
+    staging = MemoryStaging(memory_dir, threshold=10 * KB, budget=2 ** 62)
+    try:
+        assert staging.budget < 2 ** 62
+    finally:
+        staging.close()
+    assert not staging.directory.exists()
+
+
+def test_fetch_places_small_clone_in_memory_and_unstages_it(staging, tmp_path):
+    """Clone of small repository goes to memory, its space is returned when it is not needed anymore"""
+
+    disk = tmp_path / 'disk'
+    disk.mkdir()
+    paths = []
+
+    def clone(url, path, progress=None):
+        path.mkdir()
+        paths.append(path)
+        return path
+
+    backend = flexmock(clone=clone, git_dir=lambda repo: repo, count_objects=lambda repo: '')
+    task = TaskFetchGitlabProject(
+        gitlab=flexmock(token='XXX'),
+        name_gitlab='project',
+        base_dir=disk,
+        bar=NULL_BAR,
+        suppress_exceptions=False,
+        debug=False,
+        project=GitLabProject('group/project', 'https://gitlab.com/group/project.git', 'owner',
+                              repository_size=2 * KB, lfs_enabled=False),
+        git_backend=backend,
+        staging=staging
+    )
+    task.run()
+
+    assert paths[0].parent == staging.directory
+    assert staging.used == 2 * KB * MemoryStaging.SIZE_FACTOR
+    task.unstage()
+    assert not paths[0].exists()
+    assert staging.used == 0
+    assert list(disk.iterdir()) == []
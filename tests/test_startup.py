@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime is available since Python 3.7')
+
+HEAVY_MODULES = ('git', 'requests', 'enlighten')
+IMPORT_BUDGET_US = 150_000  # generous for slow CI machines, it takes about 50 ms locally
+
+
+def imported_modules(*args):
+    """Return dictionary of module imported by ``python -X importtime *args`` and its cumulative import time in us"""
+    cp = subprocess.run([sys.executable, '-X', 'importtime', *args], stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE, universal_newlines=True)
+    modules = {}
+    for line in cp.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('package'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.mark.parametrize('args', [
+    ['--version'],
+    ['--help'],
+    ['export', '--help'],
+    ['-c', 'missing.cfg', '-p', 'missing.txt'],
+])
+def test_cli_does_not_import_heavy_modules(args):
+    """Help, version and validation errors do not load GitPython, requests and enlighten"""
+
+    modules = imported_modules('-m', 'exporter', *args)
+    assert 'exporter.cli' in modules
+    assert not [m for m in HEAVY_MODULES if m in modules]
+
+
+def test_cli_import_time_budget():
+    modules = imported_modules('-c', 'import exporter.cli')
+    assert modules['exporter.cli'] < IMPORT_BUDGET_US
@@ -1,7 +1,14 @@
+import gc
+import threading
+import time
+import tracemalloc
+
 import pytest
 from flexmock import flexmock
 
-from exporter.logic import ProgressBarWrapper, TaskExportProject, TaskFetchGitlabProject, TaskPushToGitHub
+from exporter.exceptions import VerificationFailedError
+from exporter.logic import Exporter, GitHubClient, GitLabClient, NULL_BAR, ProgressBarWrapper, TaskExportProject, \
+    TaskFetchGitlabProject, TaskPushToGitHub, TaskVerifyPush
 
 
 def blank_fn(*args, **kwargs):
@@ -36,6 +43,21 @@ def bar():
     return ProgressBarWrapper(bar=fake_bar, initial_message='TEST')
 
 
+def instance_kwargs(instance):
+    return dict(
+        gitlab=instance.gitlab,
+        github=instance.github,
+        name_gitlab=instance.name_gitlab,
+        name_github=instance.name_github,
+        is_github_private=instance.is_github_private,
+        base_dir=instance.base_dir,
+        bar=instance.bar,
+        conflict_policy=instance.conflict_policy,
+        suppress_exceptions=instance.suppress_exceptions,
+        debug=instance.debug
+    )
+
+
 @pytest.fixture()
 def instance(github, gitlab, bar, tmp_path):
     return TaskExportProject(
@@ -82,12 +104,28 @@ def test_if_overwrite_happens_when_repo_exists_and_policy_is_overwrite(instance,
     assert len(instance.exc) == 0
 
 
+def test_existing_repo_is_updated_in_place_when_policy_is_update(instance, monkeypatch):
+    """When conflict policy is set to 'update', existing GitHub project is kept and pushed into"""
+
+    instance.conflict_policy = 'update'
+    monkeypatch.setattr(instance.github, 'repo_exists', lambda x, y: True)
+    flexmock(instance.github).should_receive('delete_repo').never()
+    flexmock(TaskFetchGitlabProject, run=lambda: None)
+    flexmock(TaskPushToGitHub, run=lambda: None)
+    instance.run()
+    assert instance.subtasks[1].update
+    assert TaskExportProject.UPDATED in instance.status
+    assert TaskExportProject.OVERWRITTEN not in instance.status
+    assert TaskExportProject.SUCCESS in instance.status
+
+
 def test_if_rollback_deletes_repo_if_it_did_not_existed_before(instance, monkeypatch):
     """Rollback should undone everything, including deleting created GitHub repository if it did not existed before"""
 
     instance.github_repo_existed = False
-    monkeypatch.setattr(instance.github, 'repo_exists', lambda x, y: True)
+    instance.status |= TaskExportProject.CREATED
     monkeypatch.setattr(instance.github, 'delete_repo', lambda x, y: None)
+    flexmock(instance.github).should_receive('repo_exists').never()
     flexmock(instance.github).should_receive('delete_repo').once()
     instance.rollback()
     assert TaskExportProject.ROLLBACKED in instance.status
@@ -100,8 +138,18 @@ def test_if_rollback_doesnt_delete_repo_if_it_existed_before(instance, monkeypat
         raise Exception('ABC')
 
     instance.github_repo_existed = True
-    monkeypatch.setattr(instance.github, 'repo_exists', lambda x, y: False)
-    monkeypatch.setattr(instance.github, 'delete_repo', lambda x, y: raise_)
+    instance.status |= TaskExportProject.CREATED
+    monkeypatch.setattr(instance.github, 'delete_repo', raise_)
+    instance.rollback()
+    assert TaskExportProject.ROLLBACKED in instance.status
+
+
+def test_if_rollback_doesnt_delete_repo_if_it_was_not_created(instance, monkeypatch):
+    """Rollback should not touch GitHub when the export did not get to creating the repository"""
+
+    instance.github_repo_existed = False
+    flexmock(instance.github).should_receive('repo_exists').never()
+    flexmock(instance.github).should_receive('delete_repo').never()
     instance.rollback()
     assert TaskExportProject.ROLLBACKED in instance.status
 
@@ -113,7 +161,8 @@ def test_rollback_error_is_detected(instance, monkeypatch):
         raise Exception('ABC')
 
     instance.github_repo_existed = False
-    monkeypatch.setattr(instance.github, 'repo_exists', raise_)
+    instance.status |= TaskExportProject.CREATED
+    monkeypatch.setattr(instance.github, 'delete_repo', raise_)
     with pytest.raises(Exception, match='ABC'):
         instance.rollback()
 
@@ -129,3 +178,110 @@ def test_subtasks_are_added_to_subtask_list(instance, monkeypatch):
     instance.run()
     assert len(instance.subtasks) == 2
     assert TaskExportProject.SUCCESS in instance.status
+
+
+def test_failed_verification_is_reported(instance, monkeypatch):
+    """Export whose pushed repository differs from GitLab does not succeed and has its own status"""
+
+    def raise_(*args, **kwargs):
+        raise VerificationFailedError(['refs/tags/v1 missing'])
+
+    instance.verify_slots = threading.BoundedSemaphore(1)
+    flexmock(TaskFetchGitlabProject, run=lambda: None)
+    flexmock(TaskPushToGitHub, run=lambda: None)
+    monkeypatch.setattr(TaskVerifyPush, 'run', raise_)
+    monkeypatch.setattr(instance.github, 'repo_exists', lambda x, y: False)
+    instance.run()
+    assert len(instance.subtasks) == 3
+    assert TaskExportProject.VERIFY_FAILED in instance.status
+    assert TaskExportProject.SUCCESS not in instance.status
+    assert 'refs/tags/v1 missing' in str(instance.exception)
+
+
+def test_rollback_runs_concurrently_and_respects_deadline(instance):
+    """Rollback of many tasks is done in parallel and rollback which does not finish in time is reported"""
+
+    def make_task(name, delete_delay):
+        task = TaskExportProject(**{**instance_kwargs(instance), 'name_github': name,
+                                    'github': flexmock(login='YYY', delete_repo=lambda x, y: time.sleep(delete_delay))})
+        task.github_repo_existed = False
+        task.status |= TaskExportProject.CREATED
+        return task
+
+    hung = make_task('HUNG', delete_delay=5)
+    tasks = [hung] + [make_task(f'TASK_{i}', delete_delay=0.2) for i in range(20)]
+
+    start = time.monotonic()
+    Exporter._rollback(tasks, debug=False, workers=10, timeout=1.0)
+    assert time.monotonic() - start < 2
+    assert TaskExportProject.ROLLBACKED_ERROR in hung.status
+    assert isinstance(hung.exc[0], TimeoutError)
+    assert all(TaskExportProject.ROLLBACKED in task.status for task in tasks[1:])
+
+
+def test_abandoned_rollback_does_not_change_task(instance):
+    """Rollback finishing after the deadline keeps the error and rollback not started in time deletes nothing"""
+
+    unblock, deleted = threading.Event(), []
+
+    def delete_repo(name, login):
+        if name == 'HUNG':
+            unblock.wait(5)
+        deleted.append(name)
+
+    tasks = []
+    for name in ('HUNG', 'WAITING'):
+        task = TaskExportProject(**{**instance_kwargs(instance), 'name_github': name,
+                                    'github': flexmock(login='YYY', delete_repo=delete_repo)})
+        task.github_repo_existed = False
+        task.status |= TaskExportProject.CREATED
+        tasks.append(task)
+
+    Exporter._rollback(tasks, debug=False, workers=1, timeout=0.5)
+    unblock.set()
+    time.sleep(0.2)
+    assert deleted == ['HUNG']
+    for task in tasks:
+        assert TaskExportProject.ROLLBACKED_ERROR in task.status
+        assert TaskExportProject.ROLLBACKED not in task.status
+        assert isinstance(task.exc[0], TimeoutError)
+
+
+def test_finished_task_is_compact(tmp_path):
+    """Finished task keeps only a few hundred bytes, so very large runs don't run out of memory"""
+
+    count = 2000
+    gitlab, github = GitLabClient('XXX'), GitHubClient('YYY')
+    names = [(f'gitlab_{i}', f'github_{i}') for i in range(count)]
+    tasks = []
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for name_gitlab, name_github in names:
+        task = TaskExportProject(gitlab=gitlab.clone(), github=github.clone(), name_gitlab=name_gitlab,
+                                 name_github=name_github, is_github_private=True, base_dir=tmp_path, bar=NULL_BAR,
+                                 conflict_policy='skip', suppress_exceptions=True, debug=False)
+        task.status |= TaskExportProject.SUCCESS | TaskExportProject.CREATED
+        task.release()
+        tasks.append(task)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert (after - before) / count < 400
+    assert all(task.github_repo_created for task in tasks)
+
+
+@pytest.mark.parametrize('created, existed, kept', [(True, False, True), (False, False, False), (True, True, False)])
+def test_released_task_keeps_github_client_only_for_rollback(created, existed, kept, tmp_path):
+    task = TaskExportProject(gitlab=GitLabClient('XXX'), github=GitHubClient('YYY'), name_gitlab='gitlab',
+                             name_github='github', is_github_private=True, base_dir=tmp_path, bar=NULL_BAR,
+                             conflict_policy='skip', suppress_exceptions=True, debug=False)
+    task.github_repo_existed = existed
+    task.github._login = 'YYY'
+    flexmock(GitHubClient).should_receive('delete_repo').with_args('github', 'YYY').times(int(kept))
+    if created:
+        task.status |= TaskExportProject.CREATED
+    task.release()
+    assert (task.github is not None) == kept
+    task.rollback()
+    assert TaskExportProject.ROLLBACKED in task.status
@@ -1,6 +1,6 @@
 import git
 import pytest
-import flexmock
+from flexmock import flexmock
 
 from exporter.exceptions import MultipleGitLabProjectsExistException, NoGitLabProjectsExistException
 from exporter.logic import TaskFetchGitlabProject, ProgressBarWrapper
@@ -61,6 +61,15 @@ def test_no_gitlab_project_exist_raises_exception(instance, monkeypatch):
         instance.run()
 
 
+def test_full_path_finds_only_project_of_that_path():
+    """Search by full path matches also longer paths, eg ``user/api`` matches ``user/api-docs``"""
+
+    found = [dict(SEARCH_OWNED_PROJECTS_RESPONSE[0], path_with_namespace=path)
+             for path in ('User/api', 'user/api-docs')]
+    gitlab = flexmock(search_owned_projects=lambda name: found)
+    assert TaskFetchGitlabProject.find_project(gitlab, 'user/api').full_path == 'User/api'
+
+
 def test_error_during_cloning_gitlab_repo_raises_exception_and_sets_flags(instance, monkeypatch):
     """Test flags and state after errors raised by cloning GitLab project"""
 
@@ -99,3 +108,17 @@ def test_error_during_git_lfs_cloning(instance, monkeypatch):
     assert not instance.running
     assert len(instance.exc) == 1
     assert str(instance.exc[0]) == 'ABC'
+
+
+def test_partial_clone_is_removed(instance, monkeypatch, tmp_path):
+    """Directory of failed or interrupted clone is removed right away"""
+
+    def clone_from(url, path):
+        path.mkdir()
+        raise git.GitCommandError('clone', -15)
+
+    monkeypatch.setattr(instance.gitlab, 'search_owned_projects', lambda x: SEARCH_OWNED_PROJECTS_RESPONSE)
+    monkeypatch.setattr(git.Repo, 'clone_from', clone_from)
+    with pytest.raises(git.GitCommandError):
+        instance.run()
+    assert list(tmp_path.iterdir()) == []
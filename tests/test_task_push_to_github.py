@@ -1,5 +1,5 @@
 import pytest
-import flexmock
+from flexmock import flexmock
 
 from exporter.logic import ProgressBarWrapper, TaskPushToGitHub
 
@@ -34,7 +34,7 @@ def instance(github, bar, tmp_path):
     return TaskPushToGitHub(
         github=github,
         git_cmd=flexmock(create_remote=lambda: None, rev_list=lambda: None,
-                         git=flexmock(rev_list=lambda: None)),
+                         git=flexmock(rev_list=lambda: None, remote=blank_fn)),
         name_github='TEST',
         is_private=False,
         bar=bar,
@@ -62,10 +62,10 @@ def test_error_during_creating_github_repo(instance, monkeypatch):
 def test_push_happens_when_fetched_repo_has_commits(instance, monkeypatch):
     """Test if push is called when repository is correctly fetched and contains at least one commit"""
 
-    fake_remote = flexmock(push=lambda: None)
+    fake_remote = flexmock(push=blank_fn)
     monkeypatch.setattr(instance.git_cmd, 'create_remote', fake_remote)
     monkeypatch.setattr(instance.git_cmd.git, 'rev_list', lambda x, y: 1)
-    flexmock(fake_remote).should_receive("push").once()
+    flexmock(fake_remote).should_receive("push").and_return([]).twice()  # checked-out branch, then all refs
     instance.run()
     assert not instance.running
 
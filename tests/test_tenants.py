@@ -0,0 +1,155 @@
+import configparser
+import threading
+import time
+
+import pytest
+from flexmock import flexmock
+
+from exporter.config import ProjectNormalizer, TenantLoader
+from exporter.helpers import RequestBudget
+from exporter.logic import Exporter, TaskStatus
+from exporter.tenants import MultiExporter
+from exporter.watch import SyncScheduler
+
+
+def tenants_config(tmp_path, text):
+    (tmp_path / 'alice.txt').write_text('a\nb -> c public\n')
+    cfg = configparser.ConfigParser()
+    cfg.read_string(text)
+    return TenantLoader.load(cfg, base_dir=tmp_path)
+
+
+def test_tenants_are_loaded(tmp_path):
+    """Options missing in tenant section are taken from DEFAULT, projects file is relative to config file"""
+
+    alice, bob = tenants_config(tmp_path, '''
+        [DEFAULT]
+        max_tasks = 3
+
+        [tenant:alice]
+        gitlab_token = gl-a
+        github_token = gh-a
+        projects = alice.txt
+
+        [tenant:bob]
+        gitlab_token = gl-b
+        github_token = gh-b
+        export_all = yes
+        max_tasks = 1
+        visibility = public
+    ''')
+    assert (alice.name, alice.config.gitlab_token, alice.config.github_token) == ('alice', 'gl-a', 'gh-a')
+    assert alice.projects == [['a', 'a'], ['b', 'c', 'public']]
+    assert (alice.max_tasks, alice.visibility) == (3, 'private')
+    assert alice.requests_per_hour == TenantLoader.REQUESTS_PER_HOUR
+    assert bob.projects is None
+    assert (bob.max_tasks, bob.visibility) == (1, 'public')
+
+
+@pytest.mark.parametrize('text, error', [
+    ('[github]\ntoken = x', "No section: 'tenant:NAME'"),
+    ('[tenant:a]\ngitlab_token = x\nexport_all = yes', "No 'github_token' in section 'tenant:a'"),
+    ('[tenant:a]\ngitlab_token = x\ngithub_token = y', "must contain either 'projects' or 'export_all'"),
+    ('[tenant:a]\ngitlab_token = x\ngithub_token = y\nexport_all = yes\nprojects = alice.txt',
+     "must contain either 'projects' or 'export_all'"),
+])
+def test_invalid_tenants(tmp_path, text, error):
+    with pytest.raises(ValueError, match=error):
+        tenants_config(tmp_path, text)
+
+
+def test_tokens_run_limited_count_of_exports(tmp_path, monkeypatch):
+    """GitHub token shared by two tenants runs at most max_tasks exports of both of them"""
+
+    tenants = tenants_config(tmp_path, '''
+        [DEFAULT]
+        github_token = shared
+        max_tasks = 2
+        projects = alice.txt
+
+        [tenant:alice]
+        gitlab_token = gl-a
+
+        [tenant:bob]
+        gitlab_token = gl-b
+
+        [tenant:carol]
+        gitlab_token = gl-c
+        github_token = own
+    ''')
+    lock = threading.Lock()
+    running = {'shared': 0, 'own': 0}
+    maximum = dict(running)
+
+    def export_one(self, project, conflict_policy, tmp_dir, watchdog, started):
+        token = self.github.token
+        with lock:
+            running[token] += 1
+            maximum[token] = max(maximum[token], running[token])
+        time.sleep(0.05)
+        with lock:
+            running[token] -= 1
+        task = flexmock(id=project.name_github, status=TaskStatus.SUCCESS, exc=())
+        started.append(task)
+        return task
+
+    monkeypatch.setattr(Exporter, 'export_one', export_one)
+    exporter = MultiExporter(tenants, logger=flexmock(info=lambda msg: None), debug=False, workers=10)
+    exporter.run(conflict_policy='skip', tmp_dir=tmp_path / 'tmp')
+
+    assert maximum == {'shared': 2, 'own': 2}
+    assert [len(t.tasks) for t in exporter.tenants] == [2, 2, 2]
+    assert exporter.tenants[0].exporter.github.budget is exporter.tenants[1].exporter.github.budget
+    assert not (tmp_path / 'tmp').exists()
+
+
+def test_interruption_stops_and_rollbacks_running_exports(tmp_path, monkeypatch):
+    """Interrupted export stops running tasks and rollbacks them, projects are listed only when there is room"""
+
+    (tmp_path / 'many.txt').write_text(''.join(f'p{i}\n' for i in range(20)))
+    tenants = tenants_config(tmp_path, '''
+        [tenant:alice]
+        gitlab_token = gl-a
+        github_token = gh-a
+        projects = many.txt
+    ''')
+    started_event, stopped = threading.Event(), threading.Event()
+    listed = []
+    interrupted = []  # count of listed projects when the export is interrupted
+    rollbacked = []
+
+    def export_one(self, project, conflict_policy, tmp_dir, watchdog, started):
+        task = flexmock(id=project.name_github, status=TaskStatus.NONE, exc=(), stop=stopped.set)
+        started.append(task)
+        started_event.set()
+        assert stopped.wait(5)
+        return task
+
+    def wait_pending(self, limit):
+        if len(listed) > 2:
+            assert started_event.wait(5)
+            interrupted.append(len(listed))
+            raise KeyboardInterrupt()
+
+    normalize_line = ProjectNormalizer.normalize_line
+    monkeypatch.setattr(ProjectNormalizer, 'normalize_line', lambda *args: listed.append(1) or normalize_line(*args))
+    monkeypatch.setattr(Exporter, 'export_one', export_one)
+    monkeypatch.setattr(SyncScheduler, 'wait_pending', wait_pending)
+    monkeypatch.setattr(Exporter, '_rollback', staticmethod(lambda tasks, **kwargs: rollbacked.extend(tasks)))
+    exporter = MultiExporter(tenants, logger=flexmock(info=lambda msg: None), debug=False, workers=1)
+    exporter.run(conflict_policy='skip', tmp_dir=tmp_path / 'tmp')
+
+    tenant = exporter.tenants[0]
+    assert stopped.is_set()
+    assert [t.id for t in tenant.tasks] == [t.id for t in rollbacked] == ['p0']
+    assert [p.name_github for p in tenant.not_runned] == [f'p{i}' for i in range(1, 20)]
+    assert interrupted == [3]
+    assert len(listed) == 20
+
+
+def test_budget_delays_requests_over_rate():
+    budget = RequestBudget(per_hour=3600 * 50, burst=1)  # one request per 20 ms
+    start = time.monotonic()
+    for _ in range(4):
+        budget.acquire()
+    assert time.monotonic() - start >= 0.05
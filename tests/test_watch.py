@@ -0,0 +1,115 @@
+import threading
+
+from flexmock import flexmock
+
+from exporter.config import ProjectSpec
+from exporter.logic import TaskStatus
+from exporter.watch import SyncScheduler, Watcher, WatchState
+
+
+def test_changes_of_running_project_are_coalesced():
+    """Project changed many times during its sync is synced only once more"""
+
+    synced = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def sync(item):
+        synced.append(item)
+        if item == 'a1':
+            started.set()
+            release.wait()
+
+    scheduler = SyncScheduler(sync, workers=2)
+    scheduler.schedule('a', 'a1')
+    started.wait()
+    for item in ('a2', 'a3', 'a4'):
+        scheduler.schedule('a', item)
+    scheduler.schedule('b', 'b1')
+    release.set()
+    assert scheduler.wait_idle(timeout=5)
+    scheduler.stop()
+
+    assert sorted(synced) == ['a1', 'a4', 'b1']
+
+
+def fake_exporter(changed, results):
+    calls = []
+
+    def get_owned_projects_active_after(timestamp):
+        calls.append(timestamp)
+        return [{'path': name.rsplit('/', 1)[-1], 'path_with_namespace': name if '/' in name else f'user/{name}',
+                 'http_url_to_repo': f'https://gitlab.com/user/{name}.git', 'owner': {'username': 'user'}}
+                for name in changed.pop(0)]
+
+    def export_one(project, conflict_policy, tmp_dir, watchdog):
+        calls.append(project)
+        return flexmock(id=project.name_gitlab, status=results.get(project.name_gitlab, TaskStatus.SUCCESS), exc=())
+
+    exporter = flexmock(
+        gitlab=flexmock(get_owned_projects_active_after=get_owned_projects_active_after),
+        export_one=export_one,
+        logger=flexmock(info=lambda msg: None)
+    )
+    return exporter, calls
+
+
+def watcher(exporter, state, tmp_path, projects=None):
+    return Watcher(exporter=exporter, state=state, interval=1, workers=2, conflict_policy='overwrite',
+                   tmp_dir=tmp_path, visibility='public', projects=projects)
+
+
+def test_only_changed_projects_are_synced(tmp_path):
+    """Second poll asks only for activity after the first poll, projects outside projects file are ignored"""
+
+    exporter, calls = fake_exporter(changed=[['a', 'b', 'x'], ['b']], results={})
+    state = WatchState(tmp_path / 'state.json')
+    w = watcher(exporter, state, tmp_path, projects=[ProjectSpec('a', 'a', True), ProjectSpec('b', 'c', False)])
+    w.poll()
+    w.scheduler.wait_idle()
+    w.poll()
+    w.stop()
+
+    timestamps = [call for call in calls if not isinstance(call, ProjectSpec)]
+    assert timestamps[0] is None
+    assert timestamps[1] is not None and timestamps[1] <= state.last_poll
+    assert set(state.synced) == {'a', 'b'}
+    assert state.pending == {}
+
+
+def test_failed_sync_is_retried_after_restart(tmp_path):
+    exporter, _ = fake_exporter(changed=[['a', 'b']], results={'user/a': TaskStatus.ERROR})
+    w = watcher(exporter, WatchState(tmp_path / 'state.json'), tmp_path)
+    w.poll()
+    w.scheduler.wait_idle()
+    w.stop()
+
+    synced = []
+    exporter, _ = fake_exporter(changed=[[]], results={})
+    exporter.export_one = lambda project, **kwargs: synced.append(project) or flexmock(
+        id=project.name_gitlab, status=TaskStatus.SUCCESS, exc=())
+    state = WatchState(tmp_path / 'state.json')
+    w = watcher(exporter, state, tmp_path)
+    w.poll()
+    w.scheduler.wait_idle()
+    w.stop()
+
+    assert synced == [ProjectSpec('user/a', 'a', False)]
+    assert state.pending == {}
+    assert state.synced['user/a']['status'] == ['SUCCESS']
+
+
+def test_projects_of_same_path_are_synced_without_searching_them(tmp_path):
+    """Without projects file projects are named by full path, polled project is exported as it was fetched"""
+
+    exporter, calls = fake_exporter(changed=[['user/api', 'group/api']], results={})
+    state = WatchState(tmp_path / 'state.json')
+    w = watcher(exporter, state, tmp_path)
+    w.poll()
+    w.scheduler.wait_idle()
+    w.stop()
+
+    synced = sorted((p for p in calls if isinstance(p, ProjectSpec)), key=lambda p: p.name_gitlab)
+    assert [(p.name_gitlab, p.name_github) for p in synced] == [('group/api', 'api'), ('user/api', 'api')]
+    assert [p.gitlab_project.full_path for p in synced] == ['group/api', 'user/api']
+    assert set(state.synced) == {'group/api', 'user/api'}
@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+
+import git
+import pytest
+from flexmock import flexmock
+
+from exporter.exceptions import StageTimeoutError
+from exporter.logic import Exporter, NULL_BAR, NULL_REPORT_SINK, TaskBase, TaskExportProject, TaskFetchGitlabProject
+from exporter.process import PROCESSES, StageDeadlines, Watchdog
+from helper import run, dummy
+
+
+class Owner:
+    id = 'TEST'
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses sleep command')
+def test_hung_git_process_is_terminated_after_deadline():
+    """Process of a stage exceeding its deadline is terminated and the stage fails with timeout"""
+
+    watchdog = Watchdog(StageDeadlines({'clone': 0.5}))
+    start = time.monotonic()
+    try:
+        with PROCESSES.owned_by(Owner()):
+            with pytest.raises(StageTimeoutError):
+                with watchdog.watch('clone'):
+                    git.cmd.Git().execute(['sleep', '30'])
+    finally:
+        watchdog.stop()
+    assert time.monotonic() - start < Watchdog.GRACE
+
+
+def test_stage_finished_in_time_is_not_affected():
+    """Finished stages are dropped by watchdog"""
+
+    watchdog = Watchdog(StageDeadlines({'push': 0.1}))
+    with watchdog.watch('push'):
+        pass
+    time.sleep(0.3)
+    watchdog.stop()
+    assert not watchdog._heap
+
+
+def test_deadline_is_prolonged_by_size_of_transferred_stages():
+    deadlines = StageDeadlines({'clone': 10, 'resolve': 0}, min_rate=1000)
+    assert deadlines.timeout('clone') == 10
+    assert deadlines.timeout('clone', size=5000) == 15
+    assert deadlines.timeout('create', size=5000) == StageDeadlines.DEFAULTS['create']
+    assert deadlines.timeout('resolve') is None
+
+
+def test_timed_out_task_has_timed_out_status(tmp_path):
+    task = TaskExportProject(
+        gitlab=None,
+        github=flexmock(token='XXX', login='YYY', repo_exists=lambda x, y: False),
+        name_gitlab='TEST_GITLAB',
+        name_github='TEST_GITHUB',
+        is_github_private=False,
+        base_dir=tmp_path,
+        bar=NULL_BAR,
+        conflict_policy='skip',
+        suppress_exceptions=False,
+        debug=False
+    )
+    flexmock(TaskFetchGitlabProject).should_receive('run').and_raise(StageTimeoutError('clone', 600))
+    task.run()
+    assert task.status == TaskExportProject.TIMED_OUT
+    assert isinstance(task.exception, StageTimeoutError)
+
+
+def test_unknown_stage_timeout_is_rejected():
+    cp = run(f'-p - -c "{dummy("dummy_config.cfg")}" --dry-run --stage-timeout fetch=10', input='a\n')
+    assert cp.returncode != 0
+    assert "Unknown stage 'fetch'" in cp.stderr
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses sleep command')
+def test_stop_terminates_git_processes_of_running_task():
+    """Stopped task does not wait for its git process, so rollback can start right away"""
+
+    class SleepingTask(TaskBase):
+        __slots__ = ()
+
+        def run(self):
+            with pytest.raises(git.GitCommandError):
+                git.cmd.Git().execute(['sleep', '30'])
+
+    task = SleepingTask()
+    thread = threading.Thread(target=Exporter._run_and_report, args=(task, NULL_REPORT_SINK))
+    thread.start()
+    while not PROCESSES.running(task):
+        time.sleep(0.01)
+
+    start = time.monotonic()
+    Exporter._stop_execution(tasks=[task], threads=[thread], task_timeout=30)
+    assert not thread.is_alive()
+    assert time.monotonic() - start < 1
+
+
+def test_task_stopped_during_git_command_is_interrupted(tmp_path):
+    """Failure of git process terminated by stop is not reported as an error"""
+
+    task = TaskExportProject(
+        gitlab=None,
+        github=flexmock(token='XXX', login='YYY', repo_exists=lambda x, y: False),
+        name_gitlab='TEST_GITLAB',
+        name_github='TEST_GITHUB',
+        is_github_private=False,
+        base_dir=tmp_path,
+        bar=NULL_BAR,
+        conflict_policy='skip',
+        suppress_exceptions=False,
+        debug=False
+    )
+
+    def terminated():
+        task.stop()
+        raise git.GitCommandError('clone', -15)
+
+    flexmock(TaskFetchGitlabProject).should_receive('run').replace_with(terminated)
+    task.run()
+    assert task.status == TaskExportProject.INTERRUPTED
@@ -0,0 +1,78 @@
+import http.client
+
+import pytest
+import requests
+from flexmock import flexmock
+
+from exporter.config import ProjectSpec
+from exporter.watch import Watcher, WatchState
+from exporter.webhook import WebhookHandler, WebhookServer
+from helper import webhook
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    """Watcher of two projects whose syncs are recorded instead of run"""
+
+    w = Watcher(exporter=flexmock(), state=WatchState(tmp_path / 'state.json'), interval=0, workers=1,
+                conflict_policy='overwrite', tmp_dir=tmp_path, visibility='private',
+                projects=[ProjectSpec('diaspora', 'diaspora', True), ProjectSpec('group/example', 'example', False)])
+    w.scheduled = []
+    flexmock(w.scheduler).should_receive('schedule').replace_with(lambda key, item: w.scheduled.append(item))
+    return w
+
+
+@pytest.fixture
+def server(watcher):
+    s = WebhookServer(watcher, secret='s3cret', host='127.0.0.1')
+    s.start()
+    yield s
+    s.stop()
+
+
+def post(server, fixture, event, token='s3cret'):
+    return requests.post(f'http://127.0.0.1:{server.port}/', data=webhook(fixture).read_bytes(),
+                         headers={'X-Gitlab-Event': event, 'X-Gitlab-Token': token}, timeout=5)
+
+
+@pytest.mark.parametrize('fixture, event, project', [
+    ('push_hook.json', 'Push Hook', ProjectSpec('diaspora', 'diaspora', True)),
+    ('tag_push_hook.json', 'Tag Push Hook', ProjectSpec('group/example', 'example', False)),
+])
+def test_push_schedules_sync(server, watcher, fixture, event, project):
+    """Pushed project is scheduled and persisted as pending"""
+
+    r = post(server, fixture, event)
+    assert r.status_code == 202
+    assert watcher.scheduled == [project]
+    assert list(WatchState(watcher.state.path).pending) == [project.name_gitlab]
+
+
+@pytest.mark.parametrize('token', ['', 'wrong'])
+def test_invalid_token_is_rejected(server, watcher, token):
+    r = post(server, 'push_hook.json', 'Push Hook', token=token)
+    assert r.status_code == 401
+    assert watcher.scheduled == []
+
+
+def test_other_events_and_projects_are_ignored(server, watcher):
+    watcher.projects.pop('diaspora')
+    assert post(server, 'push_hook.json', 'Push Hook').status_code == 200
+    assert post(server, 'tag_push_hook.json', 'Merge Request Hook').status_code == 200
+    assert watcher.scheduled == []
+
+
+@pytest.mark.parametrize('length, status', [('abc', 400), ('-1', 400), ('1e3', 400),
+                                           (str(WebhookHandler.MAX_BODY + 1), 413)])
+def test_invalid_or_too_large_content_length_is_rejected(server, watcher, length, status):
+    """Content-Length is checked before the body is read"""
+
+    connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+    connection.putrequest('POST', '/')
+    connection.putheader('X-Gitlab-Token', 's3cret')
+    connection.putheader('X-Gitlab-Event', 'Push Hook')
+    connection.putheader('Content-Length', length)
+    connection.endheaders()
+    assert connection.getresponse().status == status
+    connection.close()
+    assert watcher.scheduled == []